@@ -2,4 +2,4 @@
 Пакет weather — логика получения погоды, работа с кешем,
 API open-meteo и поддержка CLI-команд.
 """
-__all__ = ["api", "cache", "commands", "parser"]
+__all__ = ["aio", "api", "batch", "cache", "client", "commands", "daemon", "geo", "geocoding", "history_writer", "lazy", "metrics", "parser", "refresh", "replay", "retention", "server"]
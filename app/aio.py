@@ -0,0 +1,94 @@
+"""
+Асинхронные варианты команд для параллельной загрузки погоды.
+
+Функции повторяют :func:`app.commands.weather_by_city` и
+:func:`app.commands.weather_by_coords` (тот же кэш и та же запись
+в историю), но не блокируют цикл событий: синхронные вызовы
+выполняются в пуле потоков поверх общего HTTP-клиента с keep-alive,
+а число одновременных запросов ограничено семафором.
+
+Пример::
+
+    results = asyncio.run(async_weather_many(cities=["Москва", "Казань"]))
+"""
+import asyncio
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+from . import commands
+
+DEFAULT_CONCURRENCY = 10
+
+_concurrency = DEFAULT_CONCURRENCY
+_executor: Optional[ThreadPoolExecutor] = None
+_semaphores = weakref.WeakKeyDictionary()  # цикл событий -> семафор
+
+
+def set_concurrency(limit: int) -> None:
+    """Задаёт максимальное число одновременных запросов.
+
+    Чтобы соединения не открывались заново, размер пула HTTP-клиента
+    (``pool_maxsize`` в :func:`app.client.configure_client`) должен быть
+    не меньше ``limit``.
+    """
+    global _concurrency, _executor
+    _concurrency = limit
+    _semaphores.clear()
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=_concurrency, thread_name_prefix="weather-aio")
+    return _executor
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    sem = _semaphores.get(loop)
+    if sem is None:
+        sem = _semaphores[loop] = asyncio.Semaphore(_concurrency)
+    return sem
+
+
+async def _run(func, *args):
+    async with _get_semaphore():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), func, *args)
+
+
+async def async_weather_by_city(city: str) -> dict:
+    """Асинхронный вариант :func:`app.commands.weather_by_city`."""
+    return await _run(commands.weather_by_city, city)
+
+
+async def async_weather_by_coords(lat: float, lon: float) -> dict:
+    """Асинхронный вариант :func:`app.commands.weather_by_coords`."""
+    return await _run(commands.weather_by_coords, lat, lon)
+
+
+async def async_weather_many(
+    cities: Sequence[str] = (),
+    points: Sequence[Tuple[float, float]] = ()
+) -> List[dict]:
+    """Параллельно получает погоду для списка городов и координат.
+
+    Args:
+        cities: Названия городов.
+        points: Пары (широта, долгота).
+
+    Returns:
+        Результаты в порядке: сначала ``cities``, затем ``points``.
+        Исключение отдельного запроса возвращается как ``{"error": ...}``.
+    """
+    tasks = [async_weather_by_city(city) for city in cities]
+    tasks += [async_weather_by_coords(lat, lon) for lat, lon in points]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    return [
+        {"source": "error", "result": {"error": str(r)}} if isinstance(r, Exception) else r
+        for r in results
+    ]
@@ -1,50 +1,90 @@
 """
 Модуль для работы с API open-meteo: геокодирование и получение погоды.
+
+Все запросы идут через общий клиент :mod:`app.client`, поэтому ответы
+можно записать в файл и воспроизвести без сети (см. :mod:`app.replay`)::
+
+    configure_client(record="responses.db")   # или WEATHER_RECORD=...
+    configure_client(replay="responses.db", replay_latency=1.0)
 """
-import requests
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlencode
+
+from . import metrics
+from .client import get_client
+from .lazy import lazy_import
+
+requests = lazy_import("requests")
 
 BASE_URL = "https://api.open-meteo.com/v1/forecast"
 GEOCODING_URL = "https://geocoding-api.open-meteo.com/v1/search"
+GEOCODING_LANGUAGE = "ru"
 
+# Параметры прогноза, общие для одиночных и пакетных запросов
+FORECAST_PARAMS = {
+    "current_weather": True,
+    "hourly": "temperature_2m,relative_humidity_2m,pressure_msl,weather_code",
+    "daily": "weather_code,temperature_2m_max,temperature_2m_min,precipitation_sum",
+    "timezone": "auto",
+    "forecast_days": 1
+}
 
-def geocode_city(city_name: str):
-    """Ищет координаты города по имени."""
-    params = {"name": city_name, "count": 1, "language": "ru", "format": "json"}
+# Ограничения пакетного запроса: длина URL и число точек в одном запросе
+MAX_URL_LENGTH = 2000
+MAX_BATCH_POINTS = 100
+
+# Неудачные запросы к open-meteo по видам: geocode, forecast, forecast_batch
+UPSTREAM_ERRORS = metrics.counter("weather_api_errors_total", "Ошибки запросов к open-meteo")
+
+
+@metrics.timed("weather_api_geocode_seconds", "Время запроса к геокодеру")
+def search_city(city_name: str, language: str = GEOCODING_LANGUAGE):
+    """Ищет координаты города по имени.
+
+    В отличие от :func:`geocode_city` не перехватывает сетевые ошибки,
+    поэтому ``None`` означает именно «город не найден».
+
+    Raises:
+        requests.RequestException: Ошибка запроса к геокодеру.
+    """
+    params = {"name": city_name, "count": 1, "language": language, "format": "json"}
     try:
-        resp = requests.get(GEOCODING_URL, params=params, timeout=10)
+        resp = get_client().get(GEOCODING_URL, params=params)
         resp.raise_for_status()
         data = resp.json()
-        results = data.get("results")
-        if not results:
-            return None
-        r = results[0]
-        return {
-            "name": r.get("name"),
-            "latitude": r.get("latitude"),
-            "longitude": r.get("longitude"),
-            "country": r.get("country"),
-            "admin1": r.get("admin1")  # Регион
-        }
+    except requests.RequestException:
+        UPSTREAM_ERRORS.inc(endpoint="geocode")
+        raise
+    results = data.get("results")
+    if not results:
+        return None
+    r = results[0]
+    return {
+        "name": r.get("name"),
+        "latitude": r.get("latitude"),
+        "longitude": r.get("longitude"),
+        "country": r.get("country"),
+        "admin1": r.get("admin1")  # Регион
+    }
+
+
+def geocode_city(city_name: str):
+    """Ищет координаты города по имени."""
+    try:
+        return search_city(city_name)
     except requests.RequestException as e:
         print(f"Ошибка геокодирования: {e}")
         return None
 
 
+@metrics.timed("weather_api_forecast_seconds", "Время запроса прогноза по координатам")
 def get_weather_by_coordinates(lat: float, lon: float) -> dict:
     """Получает данные о погоде по координатам."""
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "current_weather": True,
-        "hourly": "temperature_2m,relative_humidity_2m,pressure_msl,weather_code",
-        "daily": "weather_code,temperature_2m_max,temperature_2m_min,precipitation_sum",
-        "timezone": "auto",
-        "forecast_days": 1
-    }
+    params = {"latitude": lat, "longitude": lon, **FORECAST_PARAMS}
     
     try:
-        resp = requests.get(BASE_URL, params=params, timeout=10)
+        resp = get_client().get(BASE_URL, params=params)
         resp.raise_for_status()
         data = resp.json()
         
@@ -53,10 +93,123 @@ def get_weather_by_coordinates(lat: float, lon: float) -> dict:
         
         return data
     except requests.RequestException as e:
+        UPSTREAM_ERRORS.inc(endpoint="forecast")
         print(f"Ошибка получения погоды: {e}")
         return {"error": f"Ошибка запроса: {e}"}
 
 
+def _chunk_points(points: Sequence[Tuple[float, float]]) -> List[List[Tuple[float, float]]]:
+    """Разбивает точки на группы, URL запроса каждой из которых не длиннее MAX_URL_LENGTH."""
+    base = len(BASE_URL) + 1 + len(urlencode({"latitude": "", "longitude": "", **FORECAST_PARAMS}))
+    sep = len("%2C") * 2
+
+    chunks, chunk, length = [], [], base
+    for lat, lon in points:
+        cost = len(str(lat)) + len(str(lon)) + (sep if chunk else 0)
+        if chunk and (length + cost > MAX_URL_LENGTH or len(chunk) >= MAX_BATCH_POINTS):
+            chunks.append(chunk)
+            chunk, length = [], base
+            cost -= sep
+        chunk.append((lat, lon))
+        length += cost
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+@metrics.timed("weather_api_forecast_batch_seconds", "Время пакетного запроса прогноза")
+def get_weather_by_coordinates_batch(points: Sequence[Tuple[float, float]]) -> List[dict]:
+    """Получает погоду для нескольких точек минимальным числом запросов.
+
+    open-meteo принимает списки широт и долгот через запятую и отвечает
+    массивом прогнозов в том же порядке. Длинные списки делятся на
+    несколько запросов, чтобы не превысить допустимую длину URL.
+
+    Args:
+        points: Последовательность пар (широта, долгота).
+
+    Returns:
+        Список ответов в порядке ``points``. Если запрос группы не удался,
+        для каждой её точки возвращается ``{"error": ...}``.
+    """
+    results = []
+    for chunk in _chunk_points(points):
+        params = {
+            "latitude": ",".join(str(lat) for lat, _ in chunk),
+            "longitude": ",".join(str(lon) for _, lon in chunk),
+            **FORECAST_PARAMS
+        }
+        try:
+            resp = get_client().get(BASE_URL, params=params)
+            resp.raise_for_status()
+            data = resp.json()
+            # Для одной точки open-meteo возвращает объект, а не массив
+            if isinstance(data, dict):
+                data = [data]
+            if len(data) != len(chunk):
+                raise ValueError(f"ожидалось {len(chunk)} точек, получено {len(data)}")
+
+            fetched_at = datetime.now(timezone.utc).isoformat()
+            for item in data:
+                item['fetched_at'] = fetched_at
+            results.extend(data)
+        except (requests.RequestException, ValueError) as e:
+            UPSTREAM_ERRORS.inc(endpoint="forecast_batch")
+            print(f"Ошибка получения погоды: {e}")
+            results.extend({"error": f"Ошибка запроса: {e}"} for _ in chunk)
+    return results
+
+
+def _utc(local_time: str, offset: int) -> str:
+    """Местное время ответа ('2025-01-01T12:00') в UTC ('2025-01-01 09:00:00')."""
+    return (datetime.fromisoformat(local_time) - timedelta(seconds=offset)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _series(block: dict, names: Sequence[str]) -> List[tuple]:
+    """Строки (время, значения...) из блока hourly/daily ответа."""
+    times = block.get("time") or []
+    columns = [block.get(name) or [None] * len(times) for name in names]
+    return list(zip(times, *columns))
+
+
+def hourly_records(data: dict) -> List[tuple]:
+    """Почасовой прогноз ответа как строки
+    (время UTC, температура, влажность, давление, код погоды)."""
+    offset = data.get("utc_offset_seconds") or 0
+    rows = _series(data.get("hourly") or {},
+                   ("temperature_2m", "relative_humidity_2m", "pressure_msl", "weather_code"))
+    return [(_utc(time, offset), *values) for time, *values in rows]
+
+
+def daily_records(data: dict) -> List[tuple]:
+    """Дневной прогноз ответа как строки
+    (местная дата, код погоды, максимум, минимум, осадки)."""
+    return _series(data.get("daily") or {},
+                   ("weather_code", "temperature_2m_max", "temperature_2m_min", "precipitation_sum"))
+
+
+def current_conditions(data: dict) -> Dict[str, Optional[float]]:
+    """Текущая погода ответа, дополненная влажностью и давлением
+    из почасового прогноза за текущий час."""
+    current = data.get("current_weather") or {}
+    conditions = {
+        "humidity": None,
+        "pressure": None,
+        "weather_code": current.get("weathercode", current.get("weather_code")),
+        "is_day": current.get("is_day"),
+    }
+    hourly = data.get("hourly") or {}
+    times = hourly.get("time") or []
+    hour = (current.get("time") or "")[:13] + ":00"
+    if hour in times:
+        i = times.index(hour)
+        for key, name in (("humidity", "relative_humidity_2m"), ("pressure", "pressure_msl")):
+            values = hourly.get(name) or []
+            if i < len(values) and values[i] is not None:
+                conditions[key] = round(values[i])
+    return conditions
+
+
 def get_weather_by_city(city_name: str) -> dict:
     """Получает погоду по названию города."""
     geo = geocode_city(city_name)
@@ -0,0 +1,123 @@
+"""
+Пакетный режим CLI: погода для списка локаций из файла или stdin.
+
+Каждая строка входа — название города или координаты ``широта,долгота``
+(допускается и пробел в качестве разделителя); пустые строки и строки,
+начинающиеся с ``#``, пропускаются. Локации обрабатываются пулом потоков,
+а результаты пишутся в NDJSON по мере готовности, не дожидаясь остальных.
+"""
+import json
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, Optional, TextIO, Tuple
+
+from . import commands
+from .parser import DEFAULT_WORKERS
+
+# Сколько задач на поток держать в очереди пула: вход читается
+# постепенно, поэтому длинный файл не занимает память целиком
+_PENDING_PER_WORKER = 4
+
+
+def parse_location(line: str) -> Optional[Tuple]:
+    """
+    Разобрать строку входа
+
+    Returns:
+        ("coords", широта, долгота), ("city", название) или None
+        для пустой строки и комментария
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    parts = line.replace(",", " ").split()
+    if len(parts) == 2:
+        try:
+            return "coords", float(parts[0]), float(parts[1])
+        except ValueError:
+            pass
+    return "city", line
+
+
+def read_locations(stream: TextIO) -> Iterator[Tuple[str, Tuple]]:
+    """Пары (исходная строка, разобранная локация) из потока"""
+    for line in stream:
+        location = parse_location(line)
+        if location is not None:
+            yield line.strip(), location
+
+
+def fetch_location(location: Tuple) -> Dict:
+    """Погода для разобранной локации через :mod:`app.commands`"""
+    if location[0] == "coords":
+        return commands.weather_by_coords(location[1], location[2])
+    return commands.weather_by_city(location[1])
+
+
+def _process(query: str, location: Tuple) -> Dict:
+    try:
+        response = fetch_location(location)
+    except Exception as e:
+        return {"query": query, "error": str(e)}
+    result = response.get("result") or {}
+    if "error" in result:
+        return {"query": query, "source": response.get("source"), "error": result["error"]}
+    return {"query": query, "source": response.get("source"), "result": result}
+
+
+def run_batch(
+    locations: Iterable[Tuple[str, Tuple]],
+    workers: int = DEFAULT_WORKERS,
+    out: TextIO = None,
+    err: TextIO = None
+) -> Dict:
+    """
+    Получить погоду для всех локаций пулом из ``workers`` потоков
+
+    Каждый результат сразу пишется в ``out`` строкой NDJSON
+    (``{"query", "source", "result"}`` или ``{"query", "error"}``),
+    в порядке завершения, а не входа. Итоговая сводка пишется в ``err``.
+
+    Returns:
+        Сводка: total, failed, cache_hits, hit_ratio, elapsed_s, per_s
+    """
+    out = out or sys.stdout
+    err = err or sys.stderr
+    summary = {"total": 0, "failed": 0, "cache_hits": 0}
+
+    def emit(record: Dict) -> None:
+        summary["total"] += 1
+        if "error" in record:
+            summary["failed"] += 1
+        elif record["source"] != "api":
+            summary["cache_hits"] += 1
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+
+    start = time.perf_counter()
+    max_pending = max(1, workers) * _PENDING_PER_WORKER
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="batch") as pool:
+        pending = set()
+        for query, location in locations:
+            pending.add(pool.submit(_process, query, location))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    emit(future.result())
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                emit(future.result())
+
+    elapsed = time.perf_counter() - start
+    succeeded = summary["total"] - summary["failed"]
+    summary["hit_ratio"] = round(summary["cache_hits"] / succeeded, 3) if succeeded else 0.0
+    summary["elapsed_s"] = round(elapsed, 3)
+    summary["per_s"] = round(summary["total"] / elapsed, 1) if elapsed > 0 else 0.0
+    print(
+        f"Обработано {summary['total']} локаций за {summary['elapsed_s']} с "
+        f"({summary['per_s']}/с), из кэша {summary['hit_ratio']:.0%}, ошибок {summary['failed']}",
+        file=err
+    )
+    return summary
@@ -1,29 +1,421 @@
 """
-Модуль для работы с временным кэшем в памяти
+Модуль для работы с кэшем: быстрый кэш в памяти процесса и постоянный
+кэш в SQLite, общий для всех процессов и переживающий перезапуск.
 """
-from typing import Optional, Dict, Any
-from datetime import datetime, timedelta
-from .database import save_to_history
+import heapq
+import itertools
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Callable, List, Tuple
+from datetime import timedelta
+from . import metrics
+from .api import current_conditions
+from .database import save_to_history, cache_get, cache_set, cache_purge, cache_clear
+from .geo import geohash_encode, snap_to_grid
 
-# Простой кэш в памяти
-_memory_cache = {}
 _CACHE_TTL = timedelta(minutes=30)
+_CACHE_MAX_ENTRIES = 1000
+_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Раз в столько записей в постоянный кэш из него удаляются просроченные
+_PURGE_EVERY = 500
 
 
+class MemoryCache:
+    """
+    Ограниченный кэш в памяти с вытеснением LRU и временем жизни записей.
+
+    Args:
+        max_entries: Максимальное число записей
+        max_bytes: Максимальный суммарный размер записей (по длине JSON)
+        ttl: Время жизни записи
+        stale_ttl: Сколько ещё после ttl хранить запись, чтобы отдавать её
+            как устаревшую, пока она обновляется в фоне (0 — не хранить)
+    """
+
+    def __init__(self, max_entries: int = _CACHE_MAX_ENTRIES,
+                 max_bytes: int = _CACHE_MAX_BYTES, ttl: timedelta = _CACHE_TTL,
+                 stale_ttl: timedelta = timedelta(0)):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._lru = OrderedDict()      # ключ -> (данные, время записи, размер), порядок — по обращению
+        self._by_age = OrderedDict()   # ключ -> время записи, порядок — по записи
+        self._requests = {}            # ключ -> число обращений, для поиска «горячих» записей
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._lru
+
+    def _expired(self, stored_at: float, now: float) -> bool:
+        return now - stored_at >= (self.ttl + self.stale_ttl).total_seconds()
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self._lru.pop(key)
+        del self._by_age[key]
+        self._requests.pop(key, None)
+        self._bytes -= size
+
+    def _sweep(self, now: float) -> int:
+        """Удалить просроченные записи. Записи в _by_age упорядочены по времени
+        записи, поэтому просмотр останавливается на первой живой (запись из
+        постоянного кэша может дождаться удаления чуть дольше, но get всё
+        равно проверяет срок каждой записи)."""
+        removed = 0
+        while self._by_age:
+            key, stored_at = next(iter(self._by_age.items()))
+            if not self._expired(stored_at, now):
+                break
+            self._remove(key)
+            removed += 1
+        self.expirations += removed
+        return removed
+
+    def get(self, key: str) -> Optional[Any]:
+        """Получить запись или None, если её нет или она просрочена"""
+        data, state = self.get_entry(key, allow_stale=False)
+        return data
+
+    def get_entry(self, key: str, allow_stale: bool = True) -> Tuple[Optional[Any], Optional[str]]:
+        """
+        Получить запись вместе с её состоянием
+
+        Returns:
+            Пара (данные, "fresh" | "stale") или (None, None) при промахе
+        """
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, None
+            data, stored_at, _ = entry
+            now = time.monotonic()
+            if self._expired(stored_at, now):
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None, None
+            state = "fresh" if now - stored_at < self.ttl.total_seconds() else "stale"
+            if state == "stale" and not allow_stale:
+                self.misses += 1
+                return None, None
+            self._lru.move_to_end(key)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            if state == "fresh":
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            return data, state
+
+    def hot_keys_expiring(self, within: float, top_n: int) -> List[str]:
+        """
+        Ключи из top_n самых запрашиваемых записей, свежесть которых
+        закончится в ближайшие within секунд (или уже закончилась)
+        """
+        with self._lock:
+            hot = heapq.nlargest(top_n, self._requests.items(), key=lambda kv: kv[1])
+            now = time.monotonic()
+            ttl = self.ttl.total_seconds()
+            return [
+                key for key, _ in hot
+                if key in self._lru and now - self._lru[key][1] >= ttl - within
+            ]
+
+    def set(self, key: str, data: Any, age: float = 0.0) -> None:
+        """Сохранить запись, при необходимости вытеснив самые старые по обращению
+
+        Args:
+            age: Сколько секунд запись уже прожила (для записей из постоянного кэша)
+        """
+        size = len(json.dumps(data, ensure_ascii=False, default=str))
+        now = time.monotonic()
+        stored_at = now - age
+        with self._lock:
+            requests_count = self._requests.get(key, 0)
+            if key in self._lru:
+                self._remove(key)
+            self._sweep(now)
+            if size > self.max_bytes:
+                return
+            self._lru[key] = (data, stored_at, size)
+            self._by_age[key] = stored_at
+            if requests_count:
+                self._requests[key] = requests_count
+            self._bytes += size
+            while len(self._lru) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._lru)))
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        """Удалить запись"""
+        with self._lock:
+            if key in self._lru:
+                self._remove(key)
+
+    def clear(self) -> None:
+        """Удалить все записи и сбросить счётчики"""
+        with self._lock:
+            self._lru.clear()
+            self._by_age.clear()
+            self._requests.clear()
+            self._bytes = 0
+            self.hits = self.stale_hits = self.misses = self.evictions = self.expirations = 0
+
+    def sweep(self) -> int:
+        """Удалить все просроченные записи, вернуть их количество"""
+        with self._lock:
+            return self._sweep(time.monotonic())
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики кэша"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._lru),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# Кэш в памяти
+_memory_cache = MemoryCache()
+
+# Второй уровень — постоянный кэш в таблице cache базы данных
+_persistent_enabled = True
+_persistent_writes = itertools.count(1)
+
+# Квантование координат в ключах кэша: None (точные координаты), "grid" или "geohash"
+_coords_mode = None
+_coords_resolution = 0.1
+_coords_precision = 6
+
+# Обращения к кэшу: result = hit | stale | miss, tier = memory | disk
+CACHE_LOOKUPS = metrics.counter("weather_cache_lookups_total", "Обращения к кэшу погоды")
+
+# Запросы к API, выполняющиеся прямо сейчас: ключ кэша -> _InFlight
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+@metrics.timed("weather_cache_get_seconds", "Время чтения из кэша погоды")
 def get_from_cache(key: str) -> Optional[Dict]:
-    """Получить данные из кэша памяти"""
-    if key in _memory_cache:
-        data, timestamp = _memory_cache[key]
-        if datetime.now() - timestamp < _CACHE_TTL:
-            return data
-        else:
-            del _memory_cache[key]  # Удалить просроченный кэш
-    return None
+    """Получить данные из кэша памяти, а при промахе — из постоянного кэша"""
+    data = _memory_cache.get(key)
+    if data is not None:
+        CACHE_LOOKUPS.inc(result="hit", tier="memory")
+        return data
+    if not _persistent_enabled:
+        CACHE_LOOKUPS.inc(result="miss", tier="memory")
+        return None
+    
+    found = _get_persistent(key)
+    if found is None:
+        CACHE_LOOKUPS.inc(result="miss", tier="disk")
+        return None
+    CACHE_LOOKUPS.inc(result="hit", tier="disk")
+    data, age = found
+    _memory_cache.set(key, data, age=age)
+    return data
+
+
+_LOOKUP_RESULTS = {"fresh": "hit", "stale": "stale", None: "miss"}
+
+
+@metrics.timed("weather_cache_get_seconds", "Время чтения из кэша погоды")
+def get_cache_entry(key: str) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    Получить данные из кэша вместе с их состоянием
+    
+    Если включён режим stale-while-revalidate (``configure_cache(stale_ttl=...)``),
+    просроченная не более чем на stale_ttl запись возвращается
+    с состоянием "stale", и вызывающий может обновить её в фоне.
+    
+    Returns:
+        Пара (данные, "fresh" | "stale") или (None, None)
+    """
+    data, state = _memory_cache.get_entry(key)
+    if state == "fresh" or not _persistent_enabled:
+        CACHE_LOOKUPS.inc(result=_LOOKUP_RESULTS[state], tier="memory")
+        return data, state
+    
+    # Постоянный кэш мог обновить другой процесс
+    found = _get_persistent(key)
+    if found is None:
+        CACHE_LOOKUPS.inc(result=_LOOKUP_RESULTS[state], tier="disk")
+        return data, state
+    CACHE_LOOKUPS.inc(result="hit", tier="disk")
+    fresh, age = found
+    _memory_cache.set(key, fresh, age=age)
+    return fresh, "fresh"
 
 
 def set_to_cache(key: str, data: Dict) -> None:
-    """Сохранить данные в кэш памяти"""
-    _memory_cache[key] = (data, datetime.now())
+    """Сохранить данные в кэш памяти и в постоянный кэш"""
+    _memory_cache.set(key, data)
+    # Ошибки API держим только в памяти процесса
+    if _persistent_enabled and "error" not in data:
+        set(key, data)
+
+
+def _get_persistent(key: str) -> Optional[Tuple[Dict, float]]:
+    try:
+        return cache_get(key, _memory_cache.ttl.total_seconds())
+    except sqlite3.Error as e:
+        print(f"Ошибка чтения постоянного кэша: {e}")
+        return None
+
+
+def get(key: str) -> Optional[Dict]:
+    """Получить данные из постоянного кэша (SQLite), если они не просрочены"""
+    found = _get_persistent(key)
+    return found[0] if found else None
+
+
+def set(key: str, data: Dict) -> None:
+    """Сохранить данные в постоянный кэш (SQLite)"""
+    try:
+        cache_set(key, data)
+        if next(_persistent_writes) % _PURGE_EVERY == 0:
+            # Записи, которые уже не отдаются даже как устаревшие
+            cache_purge((_memory_cache.ttl + _memory_cache.stale_ttl).total_seconds())
+    except sqlite3.Error as e:
+        print(f"Ошибка записи в постоянный кэш: {e}")
+
+
+def coords_key(lat: float, lon: float) -> str:
+    """
+    Ключ кэша для координат с учётом режима квантования
+    
+    В режимах "grid" и "geohash" все точки одной ячейки получают
+    один ключ и делят одну запись кэша.
+    """
+    if _coords_mode == "grid":
+        lat, lon = snap_to_grid(lat, lon, _coords_resolution)
+    elif _coords_mode == "geohash":
+        return f"coords:gh:{geohash_encode(lat, lon, _coords_precision)}"
+    return f"coords:{lat},{lon}"
+
+
+def configure_coords_key(mode: Optional[str] = None, resolution: float = 0.1, precision: int = 6) -> None:
+    """
+    Настроить квантование координат в ключах кэша
+    
+    Args:
+        mode: None — точные координаты, "grid" — округление до сетки,
+            "geohash" — ячейка geohash
+        resolution: Шаг сетки в градусах для режима "grid"
+            (например, 0.1 — примерно сетка модели open-meteo)
+        precision: Длина geohash для режима "geohash"
+    """
+    global _coords_mode, _coords_resolution, _coords_precision
+    if mode not in (None, "grid", "geohash"):
+        raise ValueError(f"Неизвестный режим квантования координат: {mode}")
+    _coords_mode = mode
+    _coords_resolution = resolution
+    _coords_precision = precision
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Получить статистику кэша: попадания, промахи, вытеснения, размер"""
+    return _memory_cache.stats()
+
+
+def configure_cache(max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                    ttl: Optional[timedelta] = None, persistent: Optional[bool] = None,
+                    stale_ttl: Optional[timedelta] = None) -> None:
+    """Изменить ограничения кэша памяти. Лишние записи вытесняются при следующей записи.
+
+    Args:
+        persistent: Включить или выключить постоянный кэш в SQLite
+        stale_ttl: Сколько после истечения ttl отдавать устаревшие данные,
+            обновляя их в фоне (timedelta(0) — выключить stale-while-revalidate)
+    """
+    global _persistent_enabled
+    if persistent is not None:
+        _persistent_enabled = persistent
+    if max_entries is not None:
+        _memory_cache.max_entries = max_entries
+    if max_bytes is not None:
+        _memory_cache.max_bytes = max_bytes
+    if ttl is not None:
+        _memory_cache.ttl = ttl
+    if stale_ttl is not None:
+        _memory_cache.stale_ttl = stale_ttl
+
+
+def clear_cache(persistent: bool = True) -> None:
+    """Очистить кэш памяти и (по умолчанию) постоянный кэш"""
+    _memory_cache.clear()
+    if persistent:
+        try:
+            cache_clear()
+        except sqlite3.Error as e:
+            print(f"Ошибка очистки постоянного кэша: {e}")
+
+
+class _InFlight:
+    """Запрос, результат которого ждут все вызовы с тем же ключом."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def fetch_once(key: str, fetch: Callable[[], Any]) -> Tuple[Any, bool]:
+    """Выполнить ``fetch`` один раз для всех одновременных вызовов с ключом ``key``.
+
+    Первый вызов (ведущий) выполняет ``fetch``, остальные ждут его
+    завершения и получают тот же результат или то же исключение.
+
+    Args:
+        key: Ключ кэша (``city:...``, ``coords:...``)
+        fetch: Функция, получающая данные из API
+
+    Returns:
+        Пара (результат, True если вызов был ведущим)
+    """
+    with _in_flight_lock:
+        call = _in_flight.get(key)
+        leader = call is None
+        if leader:
+            call = _in_flight[key] = _InFlight()
+
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result, False
+
+    try:
+        call.result = fetch()
+        return call.result, True
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        with _in_flight_lock:
+            del _in_flight[key]
+        call.done.set()
 
 
 def save_weather_to_history(weather_data: Dict, source: str = "api", city: str = None, lat: float = None, lon: float = None) -> int:
@@ -50,6 +442,7 @@ def save_weather_to_history(weather_data: Dict, source: str = "api", city: str =
         
         # Извлекаем текущую погоду
         current_weather = api_data.get("current_weather", {})
+        conditions = current_conditions(api_data)
         
         # Сохраняем в БД
         record_id = save_to_history(
@@ -59,6 +452,10 @@ def save_weather_to_history(weather_data: Dict, source: str = "api", city: str =
             temperature=current_weather.get("temperature"),
             windspeed=current_weather.get("windspeed"),
             winddirection=current_weather.get("winddirection"),
+            humidity=conditions["humidity"],
+            pressure=conditions["pressure"],
+            weather_code=conditions["weather_code"],
+            is_day=conditions["is_day"],
             source=source,
             api_source="open-meteo",
             raw_data=weather_data
@@ -0,0 +1,139 @@
+"""
+HTTP-клиент с пулом соединений для обращений к open-meteo.
+
+Все запросы модуля :mod:`app.api` идут через один объект
+:class:`WeatherClient`, поэтому TCP/TLS-соединения с
+``api.open-meteo.com`` и ``geocoding-api.open-meteo.com``
+переиспользуются между вызовами (keep-alive).
+
+Клиент также умеет записывать ответы в файл и воспроизводить их без
+сети (см. :mod:`app.replay`): параметры ``record`` и ``replay`` или
+переменные окружения ``WEATHER_RECORD`` и ``WEATHER_REPLAY``.
+"""
+import os
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from .lazy import lazy_import
+
+# requests импортируется при создании первого клиента, см. app.lazy
+requests = lazy_import("requests")
+
+DEFAULT_TIMEOUT = 10
+
+
+class WeatherClient:
+    """Клиент поверх ``requests.Session`` с настраиваемым пулом.
+
+    Args:
+        pool_connections: Сколько пулов (по одному на хост) держать открытыми.
+        pool_maxsize: Максимум соединений в пуле одного хоста.
+        pool_block: Ждать свободного соединения вместо открытия лишнего.
+        keep_alive: Переиспользовать соединения между запросами.
+        retries: Число повторов при сетевых ошибках и ответах из ``status_forcelist``.
+        backoff_factor: Множитель экспоненциальной паузы между повторами, сек.
+        status_forcelist: HTTP-коды, при которых запрос повторяется.
+        timeout: Таймаут одного запроса по умолчанию, сек.
+        record: Файл, в который записываются все ответы.
+        replay: Файл записанных ответов; запросы в сеть не выполняются.
+        replay_latency: Множитель записанной задержки при воспроизведении.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 4,
+        pool_maxsize: int = 10,
+        pool_block: bool = False,
+        keep_alive: bool = True,
+        retries: int = 2,
+        backoff_factor: float = 0.3,
+        status_forcelist: Iterable[int] = (429, 500, 502, 503, 504),
+        timeout: float = DEFAULT_TIMEOUT,
+        record: Optional[str] = None,
+        replay: Optional[str] = None,
+        replay_latency: float = 0.0,
+    ):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=tuple(status_forcelist),
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False,
+        )
+        pool = dict(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            max_retries=retry,
+        )
+        self.store = None
+        if replay or record:
+            from .replay import RecordingAdapter, ReplayAdapter, ReplayStore
+            self.store = ReplayStore(replay or record)
+            if replay:
+                adapter = ReplayAdapter(self.store, latency=replay_latency)
+            else:
+                adapter = RecordingAdapter(self.store, **pool)
+        else:
+            adapter = HTTPAdapter(**pool)
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None,
+            timeout: Optional[float] = None) -> "requests.Response":
+        """Выполняет GET-запрос через общий пул соединений."""
+        return self.session.get(url, params=params, timeout=timeout or self.timeout)
+
+    def close(self) -> None:
+        """Закрывает все соединения пула."""
+        self.session.close()
+        if self.store is not None:
+            self.store.close()
+
+
+_client: Optional[WeatherClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> WeatherClient:
+    """Возвращает общий клиент модуля, создавая его при первом вызове."""
+    global _client
+    client = _client
+    if client is None:
+        # Первый вызов может прийти сразу из нескольких потоков пула
+        with _client_lock:
+            if _client is None:
+                _client = WeatherClient(record=os.environ.get("WEATHER_RECORD"),
+                                        replay=os.environ.get("WEATHER_REPLAY"))
+            client = _client
+    return client
+
+
+def configure_client(**kwargs) -> WeatherClient:
+    """Пересоздаёт общий клиент с новыми параметрами пула.
+
+    Принимает те же аргументы, что и :class:`WeatherClient`.
+    Старый клиент закрывается.
+    """
+    global _client
+    new = WeatherClient(**kwargs)
+    with _client_lock:
+        old, _client = _client, new
+    if old is not None:
+        old.close()
+    return new
@@ -1,58 +1,153 @@
 """
 Команды верхнего уровня для получения данных о погоде.
 """
-from .api import get_weather_by_city, get_weather_by_coordinates
-from .cache import get_from_cache, set_to_cache, save_weather_to_history
+import sqlite3
+from typing import List, Optional, Sequence, Tuple
 
+from . import api, metrics, refresh
+from .cache import (
+    get_from_cache, get_cache_entry, set_to_cache, save_weather_to_history, fetch_once, coords_key
+)
+from .geocoding import resolve_city
 
+
+@metrics.timed("weather_command_seconds", "Время выполнения команды", command="weather_by_city")
 def weather_by_city(city: str) -> dict:
-    """Возвращает погоду по городу с использованием кэша."""
-    key = f"city:{city.strip().lower()}"
-    
-    # Проверяем кэш в памяти
-    cached = get_from_cache(key)
-    if cached:
-        # Сохраняем в историю (из кэша)
-        save_weather_to_history(cached, source="cache", city=city)
-        return {"source": "cache", "result": cached}
-    
-    # Получаем из API
-    result = get_weather_by_city(city)
+    """Возвращает погоду по городу с использованием кэша.
+
+    Название разрешается в координаты через постоянный кэш геокодирования,
+    а прогноз берётся из кэша по координатам, поэтому «Москва», «moscow»
+    и «Moscow » делят одну запись прогноза.
+    """
+    geo = resolve_city(city)
+    if "error" in geo:
+        return {"source": "api", "result": geo}
     
-    # Сохраняем в кэш
-    set_to_cache(key, result)
+    source, wrapped = _weather_at(geo["latitude"], geo["longitude"])
+    data = wrapped["data"]
+    if "error" in data:
+        return {"source": source, "result": data}
     
-    # Сохраняем в историю (из API)
-    if "error" not in result:
-        save_weather_to_history({"result": result}, source="api", city=city)
-    
-    return {"source": "api", "result": result}
+    result = {"meta": geo, "data": data}
+    save_weather_to_history({"result": result}, source=source, city=city)
+    return {"source": source, "result": result}
 
 
+@metrics.timed("weather_command_seconds", "Время выполнения команды", command="weather_by_coords")
 def weather_by_coords(lat: float, lon: float) -> dict:
     """Возвращает погоду по координатам с использованием кэша."""
-    key = f"coords:{lat},{lon}"
+    source, wrapped = _weather_at(lat, lon)
+    save_weather_to_history({"result": wrapped}, source=source, lat=lat, lon=lon)
+    return {"source": source, "result": wrapped}
+
+
+def _weather_at(lat: float, lon: float) -> Tuple[str, dict]:
+    """
+    Прогноз для точки из кэша или из API
     
-    # Проверяем кэш в памяти
-    cached = get_from_cache(key)
-    if cached:
-        # Сохраняем в историю (из кэша)
-        save_weather_to_history(cached, source="cache", lat=lat, lon=lon)
-        return {"source": "cache", "result": cached}
+    Returns:
+        Пара (источник: "cache" | "stale" | "api", результат в формате
+        {"meta": {...}, "data": {...}})
+    """
+    key = coords_key(lat, lon)
     
-    # Получаем из API
-    result = get_weather_by_coordinates(lat, lon)
+    # Проверяем кэш
+    cached, state = get_cache_entry(key)
+    if cached:
+        # Устаревшие данные отдаём сразу, а свежие загружаем в фоне
+        if state == "stale":
+            refresh.schedule_refresh(key, lambda: _fetch_coords(key, lat, lon))
+        return ("cache" if state == "fresh" else "stale"), cached
     
-    # Оборачиваем в стандартный формат
-    wrapped = {"meta": {"latitude": lat, "longitude": lon}, "data": result}
+    # Получаем из API (одновременные запросы той же точки ждут один вызов)
+    wrapped, leader = fetch_once(key, lambda: _fetch_coords(key, lat, lon))
+    return ("api" if leader else "cache"), wrapped
+
+
+def refresh_weather_at(lat: float, lon: float) -> dict:
+    """
+    Загрузить прогноз для точки из API в обход кэша и обновить кэш
     
-    # Сохраняем в кэш
-    set_to_cache(key, wrapped)
+    Одновременный запрос той же точки из команды дождётся этого же вызова.
     
-    # Сохраняем в историю (из API)
-    save_weather_to_history({"result": wrapped}, source="api", lat=lat, lon=lon)
+    Returns:
+        Результат в формате {"meta": {...}, "data": {...}}
+    """
+    key = coords_key(lat, lon)
+    wrapped, _ = fetch_once(key, lambda: _fetch_coords(key, lat, lon))
+    return wrapped
+
+
+def _fetch_coords(key: str, lat: float, lon: float) -> dict:
+    """Получает погоду по координатам из API и кладёт её в кэш."""
+    result = api.get_weather_by_coordinates(lat, lon)
     
-    return {"source": "api", "result": wrapped}
+    # Оборачиваем в стандартный формат
+    wrapped = {"meta": {"latitude": lat, "longitude": lon}, "data": result}
+    if "error" not in result:
+        set_to_cache(key, wrapped)
+        _save_forecast(lat, lon, result)
+        refresh.register_loader(key, lambda: _fetch_coords(key, lat, lon))
+    return wrapped
+
+
+def _save_forecast(lat: float, lon: float, data: dict) -> None:
+    """Сохраняет почасовой и дневной прогноз ответа для выборок за период."""
+    from .database import save_forecast
+    try:
+        save_forecast(lat, lon, api.hourly_records(data), api.daily_records(data))
+    except (sqlite3.Error, ValueError) as e:
+        print(f"Ошибка сохранения прогноза: {e}")
+
+
+@metrics.timed("weather_command_seconds", "Время выполнения команды", command="weather_by_coords_many")
+def weather_by_coords_many(points: Sequence[Tuple[float, float]]) -> List[dict]:
+    """Возвращает погоду для набора координат с использованием кэша.
+
+    Точки, найденные в кэше, отдаются сразу, а все промахи запрашиваются
+    у API пакетно через :func:`app.api.get_weather_by_coordinates_batch`.
+
+    Args:
+        points: Последовательность пар (широта, долгота).
+
+    Returns:
+        Список результатов в формате :func:`weather_by_coords`
+        в порядке ``points``.
+    """
+    results = [None] * len(points)
+    misses = {}  # ключ кэша -> индексы точек с этим ключом
+
+    for i, (lat, lon) in enumerate(points):
+        key = coords_key(lat, lon)
+        if key in misses:
+            misses[key].append(i)
+            continue
+
+        cached = get_from_cache(key)
+        if cached:
+            save_weather_to_history(cached, source="cache", lat=lat, lon=lon)
+            results[i] = {"source": "cache", "result": cached}
+        else:
+            misses[key] = [i]
+
+    if not misses:
+        return results
+
+    # Один пакетный запрос (или несколько при длинном списке) на все промахи
+    keys = list(misses)
+    fetch_points = [points[misses[key][0]] for key in keys]
+    fetched = api.get_weather_by_coordinates_batch(fetch_points)
+
+    for key, (lat, lon), data in zip(keys, fetch_points, fetched):
+        wrapped = {"meta": {"latitude": lat, "longitude": lon}, "data": data}
+        if "error" not in data:
+            set_to_cache(key, wrapped)
+            _save_forecast(lat, lon, data)
+            save_weather_to_history({"result": wrapped}, source="api", lat=lat, lon=lon)
+        for i in misses[key]:
+            results[i] = {"source": "api", "result": wrapped}
+
+    return results
 
 
 def get_history(limit: int = 10):
@@ -61,7 +156,56 @@ def get_history(limit: int = 10):
     return get_recent_history(limit)
 
 
-def get_statistics():
-    """Получить статистику по истории"""
+def get_history_page(before_id=None, limit: int = 20, city=None, since=None, after_id=None):
+    """Получить страницу истории запросов (см. :func:`app.database.get_history_page`)"""
+    from .database import get_history_page as _get_history_page
+    return _get_history_page(before_id=before_id, limit=limit, city=city, since=since, after_id=after_id)
+
+
+def get_history_window(offset: int = 0, limit: int = 50, order_by: str = "id",
+                       descending: bool = True, city=None, since=None):
+    """Получить окно истории с сортировкой (см. :func:`app.database.get_history_window`)"""
+    from .database import get_history_window as _get_history_window
+    return _get_history_window(offset=offset, limit=limit, order_by=order_by,
+                               descending=descending, city=city, since=since)
+
+
+def count_history(city=None, since=None) -> int:
+    """Число записей истории с фильтрами (см. :func:`app.database.count_history`)"""
+    from .database import count_history as _count_history
+    return _count_history(city=city, since=since)
+
+
+def get_statistics(city=None, since=None, until=None):
+    """Получить статистику по истории (всей, по городу или за период по дням)"""
     from .database import get_history_stats
-    return get_history_stats()
\ No newline at end of file
+    return get_history_stats(city=city, since=since, until=until)
+
+def get_city_series(city: str, since: Optional[str] = None, until: Optional[str] = None,
+                    columns: Optional[List[str]] = None, daily: bool = False) -> dict:
+    """Получить сохранённый прогноз города за период.
+
+    Например, температура в Москве за последние 7 дней::
+
+        since = (datetime.now(timezone.utc) - timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
+        get_city_series("Москва", since=since, columns=["temperature"])
+
+    Args:
+        since, until: Границы периода включительно: время UTC
+            ('YYYY-MM-DD HH:MM:SS') или местная дата при ``daily``.
+        columns: Какие величины вернуть (см. :func:`app.database.get_hourly_series`).
+        daily: Дневные значения вместо почасовых.
+
+    Returns:
+        {"meta": место, "series": [...]} или {"error": ...}
+    """
+    from .database import get_daily_series, get_hourly_series
+    geo = resolve_city(city)
+    if "error" in geo:
+        return geo
+    query = get_daily_series if daily else get_hourly_series
+    try:
+        series = query(geo["latitude"], geo["longitude"], since, until, columns)
+    except ValueError as e:
+        return {"error": str(e)}
+    return {"meta": geo, "series": series}
@@ -0,0 +1,249 @@
+"""
+Фоновый сервис, поддерживающий погоду для списка мест всегда свежей.
+
+Каждое место из списка наблюдения обновляется раз в период чуть короче
+срока жизни кэша, поэтому интерактивные запросы этих мест всегда
+попадают в кэш. Обновления распределены по периоду равномерно, чтобы
+API не видел всплесков, а общий лимит запросов задаётся «ведром
+токенов» (:class:`TokenBucket`). Результаты проходят через те же слои,
+что и обычные команды: кэш, временные ряды прогноза и историю.
+
+Запуск::
+
+    python -m app.daemon watch.txt --rate 0.5 --burst 5
+
+Формат списка — как у пакетного режима CLI (:mod:`app.batch`).
+"""
+import argparse
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import cache, commands
+from .batch import parse_location
+from .geocoding import resolve_city
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты: ``rate`` токенов в секунду, не больше ``burst`` про запас.
+
+    Потокобезопасен, поэтому один объект можно разделить между
+    несколькими сервисами как общий лимит.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, clock: Callable[[], float] = time.monotonic):
+        if rate <= 0:
+            raise ValueError("rate должен быть больше нуля")
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._clock = clock
+        self._tokens = float(self.capacity)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """
+        Взять токен, если он есть
+
+        Returns:
+            0, если токен взят, иначе сколько секунд ждать следующего
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, stop: Optional[threading.Event] = None) -> bool:
+        """Дождаться токена; False, если раньше установлен ``stop``"""
+        stop = stop or threading.Event()
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return True
+            if stop.wait(wait):
+                return False
+
+
+class WatchRefresher:
+    """
+    Обновляет места из списка наблюдения по расписанию
+
+    Args:
+        locations: Разобранные места: ("city", название) или
+            ("coords", широта, долгота), см. :func:`app.batch.parse_location`
+        ttl: Срок жизни кэша (по умолчанию — текущий TTL :mod:`app.cache`)
+        margin: Доля TTL, на которую обновление опережает истечение записи
+        bucket: Общий лимит запросов к API
+        workers: Сколько обновлений может выполняться одновременно
+        history: Сохранять ли обновления в историю
+    """
+
+    def __init__(
+        self,
+        locations: Iterable[Tuple],
+        ttl: Optional[timedelta] = None,
+        margin: float = 0.1,
+        bucket: Optional[TokenBucket] = None,
+        workers: int = 2,
+        history: bool = True,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.locations = list(locations)
+        ttl = ttl or cache._memory_cache.ttl
+        self.period = ttl.total_seconds() * (1 - margin)
+        self.bucket = bucket or TokenBucket(rate=1.0, burst=5)
+        self.workers = workers
+        self.history = history
+        self._clock = clock
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {"refreshed": 0, "failed": 0, "skipped": 0}
+        self._in_flight = set()
+        self._schedule: List[Tuple[float, int]] = []
+
+    def _initial_schedule(self) -> None:
+        """Сдвинуть первые обновления мест на равные доли периода"""
+        now = self._clock()
+        step = self.period / max(1, len(self.locations))
+        self._schedule = [(now + i * step, i) for i in range(len(self.locations))]
+        heapq.heapify(self._schedule)
+
+    def refresh(self, location: Tuple) -> Dict:
+        """
+        Загрузить погоду места из API и записать её в кэш и историю
+
+        Returns:
+            {"source": "refresh", "result": {...}} в формате команд
+        """
+        if location[0] == "coords":
+            lat, lon = location[1], location[2]
+            result = commands.refresh_weather_at(lat, lon)
+            if "error" in result["data"]:
+                return {"source": "refresh", "result": result["data"]}
+            if self.history:
+                cache.save_weather_to_history({"result": result}, source="refresh", lat=lat, lon=lon)
+            return {"source": "refresh", "result": result}
+
+        geo = resolve_city(location[1])
+        if "error" in geo:
+            return {"source": "refresh", "result": geo}
+        wrapped = commands.refresh_weather_at(geo["latitude"], geo["longitude"])
+        if "error" in wrapped["data"]:
+            return {"source": "refresh", "result": wrapped["data"]}
+        result = {"meta": geo, "data": wrapped["data"]}
+        if self.history:
+            cache.save_weather_to_history({"result": result}, source="refresh", city=location[1])
+        return {"source": "refresh", "result": result}
+
+    def _run_one(self, index: int) -> None:
+        location = self.locations[index]
+        try:
+            failed = "error" in self.refresh(location)["result"]
+        except Exception as e:
+            print(f"Ошибка обновления {location}: {e}")
+            failed = True
+        with self._lock:
+            self._stats["failed" if failed else "refreshed"] += 1
+            self._in_flight.discard(index)
+
+    def run_once(self) -> Dict:
+        """Обновить все места сразу (с учётом лимита) и вернуть счётчики"""
+        for index in range(len(self.locations)):
+            if not self.bucket.acquire(self._stop):
+                break
+            with self._lock:
+                self._in_flight.add(index)
+            self._run_one(index)
+        return self.stats()
+
+    def _loop(self) -> None:
+        self._initial_schedule()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="weather-daemon") as pool:
+            while self._schedule and not self._stop.is_set():
+                due, index = self._schedule[0]
+                if self._stop.wait(max(0.0, due - self._clock())):
+                    break
+                heapq.heappop(self._schedule)
+                # Следующее обновление — через период от запланированного
+                # момента, чтобы места не сбивались в кучу после задержек
+                heapq.heappush(self._schedule, (max(due + self.period, self._clock()), index))
+                with self._lock:
+                    if index in self._in_flight:
+                        # Прошлое обновление ещё идёт (API медленнее периода)
+                        self._stats["skipped"] += 1
+                        continue
+                if not self.bucket.acquire(self._stop):
+                    break
+                with self._lock:
+                    self._in_flight.add(index)
+                pool.submit(self._run_one, index)
+
+    def start(self) -> None:
+        """Запустить обновление в фоновом потоке"""
+        self.stop()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="weather-daemon", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Остановить фоновый поток, дождавшись начатых обновлений"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> Dict:
+        """Счётчики: refreshed, failed, skipped, in_flight, next_due_s"""
+        with self._lock:
+            stats = dict(self._stats, in_flight=len(self._in_flight))
+        schedule = self._schedule
+        stats["next_due_s"] = round(max(0.0, schedule[0][0] - self._clock()), 3) if schedule else None
+        return stats
+
+
+def load_watch_list(path: str) -> List[Tuple]:
+    """Прочитать список наблюдения: по одному месту на строку"""
+    with open(path, encoding="utf-8") as f:
+        return [location for location in map(parse_location, f) if location is not None]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Weather watch-list refresher")
+    parser.add_argument("watch", help="Файл со списком городов или координат")
+    parser.add_argument("--rate", type=float, default=1.0, help="Запросов к API в секунду")
+    parser.add_argument("--burst", type=int, default=5, help="Запросов подряд сверх rate")
+    parser.add_argument("--workers", type=int, default=2, help="Одновременных обновлений")
+    parser.add_argument("--ttl", type=float, help="Срок жизни кэша, мин (по умолчанию — как в app.cache)")
+    parser.add_argument("--no-history", action="store_true", help="Не сохранять обновления в историю")
+    args = parser.parse_args(argv)
+
+    from .database import init_db
+    init_db()
+    ttl = timedelta(minutes=args.ttl) if args.ttl else None
+    if ttl:
+        cache.configure_cache(ttl=ttl)
+    refresher = WatchRefresher(load_watch_list(args.watch), ttl=ttl,
+                               bucket=TokenBucket(args.rate, args.burst),
+                               workers=args.workers, history=not args.no_history)
+    print(f"Наблюдение за {len(refresher.locations)} местами, обновление каждые "
+          f"{refresher.period / 60:.1f} мин")
+    refresher.start()
+    try:
+        while True:
+            time.sleep(60)
+            print(refresher.stats())
+    except KeyboardInterrupt:
+        refresher.stop()
+
+
+if __name__ == "__main__":
+    main()
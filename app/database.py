@@ -1,23 +1,138 @@
+import hashlib
+import os
 import sqlite3
+import threading
+import zlib
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Any, Optional, List, Dict
 import json
-from datetime import datetime
+from datetime import datetime, timezone
+
+from . import metrics
 
 DB_PATH = Path(__file__).parent / "weather_data.db"
 
+# Настройки каждого соединения: WAL позволяет читать историю, пока фоновые
+# потоки и процессы пишут в неё, а synchronous=NORMAL в режиме WAL
+# убирает fsync на каждый коммит (данные остаются целыми при сбое процесса)
+_PRAGMAS = (
+    # До перехода в WAL: для новой базы включает освобождение места
+    # частями (PRAGMA incremental_vacuum), на существующие базы не влияет
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",      # 16 МБ страничного кэша
+    "PRAGMA mmap_size=134217728",    # 128 МБ отображения файла в память
+    "PRAGMA temp_store=MEMORY",
+)
+_BUSY_TIMEOUT = 30          # секунд ожидания блокировки вместо "database is locked"
+_CACHED_STATEMENTS = 256    # подготовленных запросов на соединение
+
+# Соединение текущего потока
+_local = threading.local()
+
+# Лёгкие колонки истории для списков (без raw_data)
+_HISTORY_LIST_COLUMNS = """
+    id, city, latitude, longitude, temperature, humidity, pressure,
+    windspeed, winddirection, weather_code, source, requested_at
+"""
+
+_INSERT_HISTORY = """
+    INSERT INTO history (
+        city, latitude, longitude, temperature, feels_like, humidity,
+        pressure, windspeed, winddirection, description, weather_code,
+        is_day, precipitation, cloud_cover, visibility, source, api_source, raw_hash,
+        requested_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+# Уровень сжатия сырых ответов API (zlib, 1-9)
+_PAYLOAD_COMPRESSION = 6
+
+# Очередь отложенной записи истории (None — запись по одной)
+_writer = None
+
 
 def get_conn():
-    conn = sqlite3.connect(DB_PATH)
+    """Открыть новое настроенное соединение (вызывающий сам его закрывает)"""
+    conn = sqlite3.connect(DB_PATH, timeout=_BUSY_TIMEOUT, cached_statements=_CACHED_STATEMENTS)
     conn.row_factory = sqlite3.Row
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
-def init_db():
-    """Инициализировать базу данных"""
+def _conn() -> sqlite3.Connection:
+    """
+    Соединение текущего потока, открываемое один раз и переиспользуемое
+    
+    Повторное использование соединения экономит открытие файла и настройку
+    на каждую операцию и сохраняет кэш подготовленных запросов. Если файл
+    базы удалён или заменён (reset.py, тесты), соединение открывается заново.
+    """
+    path = str(DB_PATH)
+    try:
+        inode = os.stat(path).st_ino
+    except OSError:
+        inode = None
+    
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        if _local.path == path and _local.inode == inode:
+            return conn
+        conn.close()
+    
     conn = get_conn()
-    c = conn.cursor()
+    _local.conn = conn
+    _local.path = path
+    _local.inode = os.stat(path).st_ino
+    return conn
+
+
+def close_conn() -> None:
+    """Закрыть соединение текущего потока"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+def init_db():
+    """
+    Инициализировать базу данных
+    
+    Если схема уже последней версии (``PRAGMA user_version``), таблицы
+    не создаются заново: запуск стоит одного запроса к базе.
+    """
+    conn = _conn()
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    with _immediate(conn) as c:
+        _create_tables(c)
+    _migrate(conn)
+
+
+@contextmanager
+def _immediate(conn: sqlite3.Connection):
+    """
+    Транзакция, которая сразу берёт блокировку записи (BEGIN IMMEDIATE)
     
+    В отличие от ``with conn:`` в неё попадают и DDL-запросы: модуль sqlite3
+    сам открывает транзакцию только перед INSERT/UPDATE/DELETE.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn.cursor()
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def _create_tables(c: sqlite3.Cursor) -> None:
+    """Исходные таблицы, на которые накатываются миграции"""
     # Таблица истории запросов
     c.execute("""
         CREATE TABLE IF NOT EXISTS history (
@@ -44,10 +159,398 @@ def init_db():
         )
     """)
     
-    conn.commit()
-    conn.close()
+    # Постоянный кэш ответов, общий для всех процессов
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS cache (
+            key TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # Постоянный кэш геокодирования: нормализованное название + язык -> место
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS geocode (
+            query TEXT NOT NULL,
+            language TEXT NOT NULL,
+            found INTEGER NOT NULL,
+            name TEXT,
+            latitude REAL,
+            longitude REAL,
+            country TEXT,
+            admin1 TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (query, language)
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_geocode_name ON geocode (name)")
+
+
+def _migration_1_history_indexes(c: sqlite3.Cursor) -> None:
+    """Индексы для сортировки и фильтрации истории"""
+    c.execute("CREATE INDEX IF NOT EXISTS idx_history_requested_at ON history (requested_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_history_city ON history (city, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_history_coords ON history (latitude, longitude)")
+
+
+def _migration_2_stats_rollups(c: sqlite3.Cursor) -> None:
+    """
+    Сводная статистика, которую триггеры обновляют при каждой вставке
+    и удалении в history: общая, по городам и по дням
+    """
+    aggregates = """
+        total INTEGER NOT NULL DEFAULT 0,
+        temp_count INTEGER NOT NULL DEFAULT 0,
+        temp_sum REAL NOT NULL DEFAULT 0,
+        temp_min REAL,
+        temp_max REAL,
+        dirty INTEGER NOT NULL DEFAULT 0
+    """
+    c.execute(f"""
+        CREATE TABLE IF NOT EXISTS stats_summary (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            unique_cities INTEGER NOT NULL DEFAULT 0,
+            {aggregates}
+        )
+    """)
+    c.execute(f"""
+        CREATE TABLE IF NOT EXISTS stats_city (
+            city TEXT PRIMARY KEY,
+            {aggregates}
+        ) WITHOUT ROWID
+    """)
+    # city = '' — запросы по координатам без названия города
+    c.execute(f"""
+        CREATE TABLE IF NOT EXISTS stats_daily (
+            day TEXT NOT NULL,
+            city TEXT NOT NULL,
+            {aggregates},
+            PRIMARY KEY (day, city)
+        ) WITHOUT ROWID
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_stats_city_dirty ON stats_city (dirty) WHERE dirty")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_stats_daily_dirty ON stats_daily (dirty) WHERE dirty")
+    # Пересчёт min/max после удаления крайних значений
+    c.execute("CREATE INDEX IF NOT EXISTS idx_history_temperature ON history (temperature)")
+    
+    # Новое значение в агрегатах: min/max с учётом NULL
+    add = """
+        total = total + 1,
+        temp_count = temp_count + excluded.temp_count,
+        temp_sum = temp_sum + excluded.temp_sum,
+        temp_min = MIN(COALESCE(temp_min, excluded.temp_min), COALESCE(excluded.temp_min, temp_min)),
+        temp_max = MAX(COALESCE(temp_max, excluded.temp_max), COALESCE(excluded.temp_max, temp_max))
+    """
+    new_values = """
+        1, NEW.temperature IS NOT NULL, COALESCE(NEW.temperature, 0), NEW.temperature, NEW.temperature
+    """
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS history_stats_insert AFTER INSERT ON history
+        BEGIN
+            UPDATE stats_summary SET
+                total = total + 1,
+                unique_cities = unique_cities + (
+                    NEW.city IS NOT NULL
+                    AND NOT EXISTS (SELECT 1 FROM stats_city WHERE city = NEW.city)
+                ),
+                temp_count = temp_count + (NEW.temperature IS NOT NULL),
+                temp_sum = temp_sum + COALESCE(NEW.temperature, 0),
+                temp_min = MIN(COALESCE(temp_min, NEW.temperature), COALESCE(NEW.temperature, temp_min)),
+                temp_max = MAX(COALESCE(temp_max, NEW.temperature), COALESCE(NEW.temperature, temp_max))
+            WHERE id = 1;
+            
+            INSERT INTO stats_city (city, total, temp_count, temp_sum, temp_min, temp_max)
+            SELECT NEW.city, {new_values} WHERE NEW.city IS NOT NULL
+            ON CONFLICT (city) DO UPDATE SET {add};
+            
+            INSERT INTO stats_daily (day, city, total, temp_count, temp_sum, temp_min, temp_max)
+            VALUES (date(NEW.requested_at), COALESCE(NEW.city, ''), {new_values})
+            ON CONFLICT (day, city) DO UPDATE SET {add};
+        END
+    """)
+    
+    # Удаление: счётчики и суммы уменьшаются точно, а если удалено крайнее
+    # значение, min/max помечаются dirty и пересчитываются при чтении
+    remove = """
+        total = total - 1,
+        temp_count = temp_count - (OLD.temperature IS NOT NULL),
+        temp_sum = temp_sum - COALESCE(OLD.temperature, 0),
+        dirty = dirty OR (
+            OLD.temperature IS NOT NULL
+            AND (OLD.temperature <= temp_min OR OLD.temperature >= temp_max)
+        )
+    """
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS history_stats_delete AFTER DELETE ON history
+        BEGIN
+            UPDATE stats_city SET {remove} WHERE city = OLD.city;
+            
+            UPDATE stats_summary SET
+                {remove},
+                unique_cities = unique_cities - (
+                    OLD.city IS NOT NULL
+                    AND EXISTS (SELECT 1 FROM stats_city WHERE city = OLD.city AND total = 0)
+                )
+            WHERE id = 1;
+            
+            DELETE FROM stats_city WHERE city = OLD.city AND total = 0;
+            
+            UPDATE stats_daily SET {remove}
+            WHERE day = date(OLD.requested_at) AND city = COALESCE(OLD.city, '');
+            DELETE FROM stats_daily
+            WHERE day = date(OLD.requested_at) AND city = COALESCE(OLD.city, '') AND total = 0;
+        END
+    """)
+    
+    _rebuild_stats(c)
+
+
+def _rebuild_stats(c: sqlite3.Cursor) -> None:
+    """Заполнить сводные таблицы статистики заново по всей истории"""
+    c.execute("DELETE FROM stats_summary")
+    c.execute("DELETE FROM stats_city")
+    c.execute("DELETE FROM stats_daily")
+    c.execute("""
+        INSERT INTO stats_summary (id, total, unique_cities, temp_count, temp_sum, temp_min, temp_max)
+        SELECT 1, COUNT(*), COUNT(DISTINCT city), COUNT(temperature),
+               COALESCE(SUM(temperature), 0), MIN(temperature), MAX(temperature)
+        FROM history
+    """)
+    c.execute("""
+        INSERT INTO stats_city (city, total, temp_count, temp_sum, temp_min, temp_max)
+        SELECT city, COUNT(*), COUNT(temperature),
+               COALESCE(SUM(temperature), 0), MIN(temperature), MAX(temperature)
+        FROM history WHERE city IS NOT NULL
+        GROUP BY city
+    """)
+    c.execute("""
+        INSERT INTO stats_daily (day, city, total, temp_count, temp_sum, temp_min, temp_max)
+        SELECT date(requested_at), COALESCE(city, ''), COUNT(*), COUNT(temperature),
+               COALESCE(SUM(temperature), 0), MIN(temperature), MAX(temperature)
+        FROM history
+        GROUP BY 1, 2
+    """)
+
+
+def rebuild_stats() -> None:
+    """Пересчитать сводную статистику по всей истории (после ручных правок таблицы)"""
+    conn = _conn()
+    with conn:
+        _rebuild_stats(conn.cursor())
+
+
+def _migration_3_raw_payloads(c: sqlite3.Cursor) -> None:
+    """
+    Сырые ответы API хранятся один раз в сжатом виде в raw_payloads,
+    а history ссылается на них по хэшу содержимого
+    """
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS raw_payloads (
+            hash TEXT PRIMARY KEY,
+            data BLOB NOT NULL
+        )
+    """)
+    # ALTER нельзя повторить: база могла остаться с колонкой, но без
+    # новой версии схемы (миграция, прерванная до этого исправления)
+    if "raw_hash" not in {row[1] for row in c.execute("PRAGMA table_info(history)")}:
+        c.execute("ALTER TABLE history ADD COLUMN raw_hash TEXT")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_history_raw_hash ON history (raw_hash)")
+    
+    # Переносим уже сохранённые ответы частями, чтобы не читать всё в память
+    last_id = 0
+    while True:
+        rows = c.execute("""
+            SELECT id, raw_data FROM history
+            WHERE id > ? AND raw_data IS NOT NULL
+            ORDER BY id LIMIT 500
+        """, (last_id,)).fetchall()
+        if not rows:
+            break
+        for record_id, raw_data in rows:
+            try:
+                payload = _encode_payload(json.loads(raw_data))
+            except ValueError:
+                continue
+            _store_payloads(c, [payload])
+            c.execute("UPDATE history SET raw_hash = ?, raw_data = NULL WHERE id = ?",
+                      (payload[0], record_id))
+        last_id = rows[-1][0]
+
+
+def _migration_4_forecast_series(c: sqlite3.Cursor) -> None:
+    """
+    Почасовой и дневной прогноз в отдельных таблицах по точке и времени,
+    чтобы выборки за период не разбирали JSON сырых ответов
+    """
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS forecast_hourly (
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            time TEXT NOT NULL,
+            temperature REAL,
+            humidity INTEGER,
+            pressure REAL,
+            weather_code INTEGER,
+            PRIMARY KEY (latitude, longitude, time)
+        ) WITHOUT ROWID
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS forecast_daily (
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            day TEXT NOT NULL,
+            weather_code INTEGER,
+            temperature_max REAL,
+            temperature_min REAL,
+            precipitation_sum REAL,
+            PRIMARY KEY (latitude, longitude, day)
+        ) WITHOUT ROWID
+    """)
+
+
+def _migration_5_history_rollup(c: sqlite3.Cursor) -> None:
+    """
+    Агрегаты истории по часам или дням для каждого места, в которые
+    app.retention сворачивает удаляемые старые записи
+    """
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS history_rollup (
+            bucket TEXT NOT NULL,
+            period TEXT NOT NULL,
+            location TEXT NOT NULL,
+            latitude REAL,
+            longitude REAL,
+            requests INTEGER NOT NULL DEFAULT 0,
+            temp_count INTEGER NOT NULL DEFAULT 0,
+            temp_sum REAL NOT NULL DEFAULT 0,
+            temp_min REAL,
+            temp_max REAL,
+            humidity_count INTEGER NOT NULL DEFAULT 0,
+            humidity_sum REAL NOT NULL DEFAULT 0,
+            pressure_count INTEGER NOT NULL DEFAULT 0,
+            pressure_sum REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (bucket, period, location)
+        ) WITHOUT ROWID
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_history_rollup_location ON history_rollup (location, bucket, period)")
+
+
+# Миграции схемы по порядку; номер применённой хранится в PRAGMA user_version
+_MIGRATIONS = [
+    _migration_1_history_indexes,
+    _migration_2_stats_rollups,
+    _migration_3_raw_payloads,
+    _migration_4_forecast_series,
+    _migration_5_history_rollup,
+]
+
+_HOURLY_COLUMNS = ("temperature", "humidity", "pressure", "weather_code")
+_DAILY_COLUMNS = ("weather_code", "temperature_max", "temperature_min", "precipitation_sum")
+SCHEMA_VERSION = len(_MIGRATIONS)
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """
+    Применить миграции, которых ещё нет в базе
+    
+    Каждая миграция вместе с новым user_version идёт одной транзакцией под
+    блокировкой записи, а версия перечитывается уже под ней: несколько
+    процессов, запущенных одновременно, применяют каждую миграцию один раз.
+    """
+    while True:
+        with _immediate(conn) as c:
+            version = c.execute("PRAGMA user_version").fetchone()[0]
+            if version >= len(_MIGRATIONS):
+                return
+            _MIGRATIONS[version](c)
+            c.execute(f"PRAGMA user_version = {version + 1}")
+
+
+def _encode_payload(raw_data: Dict) -> tuple:
+    """Хэш содержимого и JSON сырого ответа"""
+    text = json.dumps(raw_data, separators=(",", ":"), ensure_ascii=False).encode()
+    return hashlib.blake2b(text, digest_size=16).hexdigest(), text
+
+
+def _store_payloads(c, payloads: List[tuple]) -> None:
+    """
+    Сохранить ответы в raw_payloads, пропуская уже сохранённые
+
+    Вызывается в той же транзакции, что и вставка в history: отдельная
+    проверка SELECT перед INSERT гонялась бы с другими потоками и с
+    удалением осиротевших ответов в retention.
+    """
+    c.executemany("INSERT OR IGNORE INTO raw_payloads (hash, data) VALUES (?, ?)",
+                  [(raw_hash, zlib.compress(text, _PAYLOAD_COMPRESSION))
+                   for raw_hash, text in dict(payloads).items()])
+
+
+def _decode_payload(data) -> Optional[Dict]:
+    """Распаковать сырой ответ (старые записи хранят JSON текстом)"""
+    try:
+        if isinstance(data, bytes):
+            data = zlib.decompress(data)
+        return json.loads(data)
+    except (ValueError, zlib.error):
+        return None
+
 
+# Значение raw_data записи истории, которое ещё не распаковано
+_NOT_DECODED = object()
 
+
+class HistoryRecord(dict):
+    """
+    Запись истории, у которой raw_data распаковывается только
+    при первом обращении к значению
+    
+    Ключ raw_data в записи есть всегда, поэтому keys(), items(), dict(record)
+    и json.dumps(record) видят его, как у обычного словаря; items(), values()
+    и копирование сначала распаковывают ответ.
+    """
+    
+    def __init__(self, row, payload):
+        super().__init__(row)
+        self._payload = payload
+        super().__setitem__('raw_data', _NOT_DECODED)
+    
+    def _decode(self) -> None:
+        if super().get('raw_data') is _NOT_DECODED:
+            payload, self._payload = self._payload, None
+            super().__setitem__('raw_data', _decode_payload(payload) if payload is not None else None)
+    
+    def __getitem__(self, key):
+        if key == 'raw_data':
+            self._decode()
+        return super().__getitem__(key)
+    
+    def get(self, key, default=None):
+        if key == 'raw_data':
+            self._decode()
+        return super().get(key, default)
+    
+    def __iter__(self):
+        # Переопределённый __iter__ заставляет dict(record) и {**record}
+        # читать значения через __getitem__, а не копировать их напрямую
+        return super().__iter__()
+    
+    def items(self):
+        self._decode()
+        return super().items()
+    
+    def values(self):
+        self._decode()
+        return super().values()
+    
+    def copy(self) -> Dict:
+        return dict(self.items())
+    
+    def __repr__(self):
+        self._decode()
+        return super().__repr__()
+
+
+@metrics.timed("weather_db_save_history_seconds", "Время сохранения записи истории")
 def save_to_history(
     city: Optional[str] = None,
     lat: Optional[float] = None,
@@ -68,90 +571,512 @@ def save_to_history(
     api_source: str = "",
     raw_data: Optional[Dict] = None
 ) -> int:
-    """Сохранить запись о погоде в историю"""
-    conn = get_conn()
-    c = conn.cursor()
+    """
+    Сохранить запись о погоде в историю
     
-    c.execute("""
-        INSERT INTO history (
-            city, latitude, longitude, temperature, feels_like, humidity,
-            pressure, windspeed, winddirection, description, weather_code,
-            is_day, precipitation, cloud_cover, visibility, source, api_source, raw_data
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
+    Если включена отложенная запись (:func:`enable_write_behind`), запись
+    ставится в очередь и будет сохранена пачкой вместе с другими.
+    
+    Returns:
+        ID сохраненной записи или 0, если запись поставлена в очередь
+    """
+    payload = _encode_payload(raw_data) if raw_data else None
+    row = (
         city, lat, lon, temperature, feels_like, humidity,
         pressure, windspeed, winddirection, description, weather_code,
         is_day, precipitation, cloud_cover, visibility, source, api_source,
-        json.dumps(raw_data) if raw_data else None
-    ))
+        payload[0] if payload else None,
+        datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    )
     
-    record_id = c.lastrowid
-    conn.commit()
-    conn.close()
+    writer = _writer
+    if writer is not None:
+        try:
+            writer.put((row, payload))
+            return 0
+        except RuntimeError:
+            # Отложенную запись выключили, пока запись готовилась: сохраняем сразу
+            pass
+    
+    conn = _conn()
+    with conn:
+        if payload:
+            _store_payloads(conn, [payload])
+        record_id = conn.execute(_INSERT_HISTORY, row).lastrowid
     return record_id
 
 
+@metrics.timed("weather_db_write_seconds", "Время записи в SQLite", op="history_batch")
+def save_many_to_history(rows: List[tuple]) -> None:
+    """
+    Сохранить пачку записей истории одной транзакцией
+    
+    Args:
+        rows: Пары (параметры записи, (хэш, JSON ответа) или None)
+    """
+    conn = _conn()
+    with conn:
+        _store_payloads(conn, [payload for _, payload in rows if payload])
+        conn.executemany(_INSERT_HISTORY, [row for row, _ in rows])
+
+
+def enable_write_behind(batch_size: int = 100, flush_interval: float = 0.5,
+                        max_queue: int = 10000) -> None:
+    """
+    Включить отложенную пакетную запись истории
+    
+    Args:
+        batch_size: Сохранять, как только в очереди накопится столько записей
+        flush_interval: Сохранять не реже чем раз в столько секунд
+        max_queue: Размер очереди; когда она заполнена, save_to_history ждёт
+    """
+    global _writer
+    from .history_writer import HistoryWriter
+    disable_write_behind()
+    _writer = HistoryWriter(save_many_to_history, batch_size, flush_interval, max_queue)
+
+
+def disable_write_behind() -> None:
+    """Сохранить всё из очереди и вернуться к записи по одной"""
+    global _writer
+    if _writer is not None:
+        writer, _writer = _writer, None
+        writer.close()
+
+
+def flush_history() -> None:
+    """Дождаться сохранения всех записей из очереди отложенной записи"""
+    if _writer is not None:
+        _writer.flush()
+
+
 def get_recent_history(limit: int = 10) -> List[Dict]:
-    """Получить последние записи из истории"""
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("""
-        SELECT * FROM history 
-        ORDER BY requested_at DESC 
-        LIMIT ?
-    """, (limit,))
+    """
+    Получить последние записи из истории
     
-    rows = c.fetchall()
-    conn.close()
+    Сырой ответ (raw_data) распаковывается из raw_payloads только при
+    обращении к нему, см. :class:`HistoryRecord`.
+    """
+    conn = _conn()
+    rows = conn.execute("""
+        SELECT h.*, COALESCE(p.data, h.raw_data) AS raw_payload
+        FROM history h
+        LEFT JOIN raw_payloads p ON p.hash = h.raw_hash
+        ORDER BY h.requested_at DESC 
+        LIMIT ?
+    """, (limit,)).fetchall()
     
-    # Преобразуем raw_data из JSON
     result = []
     for row in rows:
-        item = dict(row)
-        if item.get('raw_data'):
-            try:
-                item['raw_data'] = json.loads(item['raw_data'])
-            except:
-                item['raw_data'] = None
+        item = HistoryRecord(row, row['raw_payload'])
+        del item['raw_payload'], item['raw_hash']
         result.append(item)
     
     return result
 
 
-def get_history_stats() -> Dict:
-    """Получить статистику по истории"""
-    conn = get_conn()
-    c = conn.cursor()
+def _history_filter(city: Optional[str], since: Optional[str]) -> tuple:
+    """Условия WHERE и параметры для фильтров истории по городу и времени"""
+    conditions, params = [], []
+    if city is not None:
+        conditions.append("city = ?")
+        params.append(city)
+    if since is not None:
+        # Записи добавляются по времени, поэтому границу по времени
+        # переводим в границу по id через индекс idx_history_requested_at
+        conditions.append("id >= (SELECT MIN(id) FROM history WHERE requested_at >= ?)")
+        conditions.append("requested_at >= ?")
+        params += [since, since]
+    return conditions, params
+
+
+def get_history_page(
+    before_id: Optional[int] = None,
+    limit: int = 20,
+    city: Optional[str] = None,
+    since: Optional[str] = None,
+    after_id: Optional[int] = None
+) -> List[Dict]:
+    """
+    Получить страницу истории, от новых записей к старым (без raw_data)
     
-    stats = {}
+    Постраничный вывод по ключу: следующая страница запрашивается с
+    before_id, равным id последней записи предыдущей, поэтому время
+    запроса не растёт с глубиной, в отличие от OFFSET.
     
-    # Общее количество запросов
-    c.execute("SELECT COUNT(*) as total FROM history")
-    stats['total_requests'] = c.fetchone()['total']
+    Args:
+        before_id: Вернуть записи с id меньше этого (None — с самой новой)
+        limit: Размер страницы
+        city: Только записи этого города
+        since: Только записи не старше этого времени ('YYYY-MM-DD HH:MM:SS', UTC)
+        after_id: Только записи новее этой (с id больше), например
+            добавленные после последнего обновления списка
     
-    # Количество уникальных городов
-    c.execute("SELECT COUNT(DISTINCT city) as cities FROM history WHERE city IS NOT NULL")
-    stats['unique_cities'] = c.fetchone()['cities']
+    Returns:
+        Список записей; пустой список — страниц больше нет
+    """
+    conditions, params = _history_filter(city, since)
+    if before_id is not None:
+        conditions.append("id < ?")
+        params.append(before_id)
+    if after_id is not None:
+        conditions.append("id > ?")
+        params.append(after_id)
     
-    # Средняя температура
-    c.execute("SELECT AVG(temperature) as avg_temp FROM history WHERE temperature IS NOT NULL")
-    avg_temp = c.fetchone()['avg_temp']
-    stats['avg_temperature'] = round(avg_temp, 1) if avg_temp else None
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    params.append(limit)
+    rows = _conn().execute(f"""
+        SELECT {_HISTORY_LIST_COLUMNS} FROM history
+        {where}
+        ORDER BY id DESC
+        LIMIT ?
+    """, params).fetchall()
+    return [dict(row) for row in rows]
+
+
+# Колонки, по которым можно сортировать окно истории; для каждой есть
+# индекс, поэтому сортировка с LIMIT/OFFSET идёт по индексу без сортировки
+# всей таблицы (в индексе SQLite после колонки хранится id записи)
+HISTORY_SORT_COLUMNS = ("id", "requested_at", "city", "temperature")
+
+
+def get_history_window(
+    offset: int = 0,
+    limit: int = 50,
+    order_by: str = "id",
+    descending: bool = True,
+    city: Optional[str] = None,
+    since: Optional[str] = None
+) -> List[Dict]:
+    """
+    Получить окно истории из limit записей начиная с offset (без raw_data)
+    
+    Нужен для просмотра с прокруткой в произвольное место списка
+    и сортировкой по колонке; для последовательного чтения от новых
+    к старым быстрее :func:`get_history_page`.
+    
+    Args:
+        order_by: Колонка сортировки, одна из HISTORY_SORT_COLUMNS
+        descending: По убыванию
+        city, since: Фильтры, как в :func:`get_history_page`
+    """
+    if order_by not in HISTORY_SORT_COLUMNS:
+        raise ValueError(f"Сортировка возможна только по {', '.join(HISTORY_SORT_COLUMNS)}")
+    
+    conditions, params = _history_filter(city, since)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    direction = "DESC" if descending else "ASC"
+    order = f"{order_by} {direction}" if order_by == "id" else f"{order_by} {direction}, id {direction}"
+    rows = _conn().execute(f"""
+        SELECT {_HISTORY_LIST_COLUMNS} FROM history
+        {where}
+        ORDER BY {order}
+        LIMIT ? OFFSET ?
+    """, (*params, limit, offset)).fetchall()
+    return [dict(row) for row in rows]
+
+
+def count_history(city: Optional[str] = None, since: Optional[str] = None) -> int:
+    """Число записей истории с фильтрами, как в :func:`get_history_page`"""
+    if since is None:
+        # Без фильтра по времени число берётся из сводной статистики
+        return get_history_stats(city=city)["total_requests"]
+    
+    conditions, params = _history_filter(city, since)
+    return _conn().execute(
+        f"SELECT COUNT(*) FROM history WHERE {' AND '.join(conditions)}", params
+    ).fetchone()[0]
+
+
+@metrics.timed("weather_db_write_seconds", "Время записи в SQLite", op="forecast")
+def save_forecast(lat: float, lon: float, hourly: List[tuple], daily: List[tuple]) -> None:
+    """
+    Сохранить прогноз точки одной транзакцией; более новый прогноз
+    заменяет прежние значения за те же часы и дни
+    
+    Args:
+        hourly: Строки (время UTC, температура, влажность, давление, код погоды),
+            см. :func:`app.api.hourly_records`
+        daily: Строки (дата, код погоды, максимум, минимум, осадки),
+            см. :func:`app.api.daily_records`
+    """
+    conn = _conn()
+    with conn:
+        conn.executemany(f"""
+            INSERT OR REPLACE INTO forecast_hourly (latitude, longitude, time, {', '.join(_HOURLY_COLUMNS)})
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(lat, lon, *row) for row in hourly])
+        conn.executemany(f"""
+            INSERT OR REPLACE INTO forecast_daily (latitude, longitude, day, {', '.join(_DAILY_COLUMNS)})
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(lat, lon, *row) for row in daily])
+
+
+def _series_query(table: str, time_column: str, allowed: tuple, lat: float, lon: float,
+                  since: Optional[str], until: Optional[str], columns: Optional[List[str]]) -> List[Dict]:
+    columns = list(columns or allowed)
+    unknown = set(columns) - set(allowed)
+    if unknown:
+        raise ValueError(f"Неизвестные колонки: {', '.join(sorted(unknown))}")
+    
+    conditions, params = ["latitude = ?", "longitude = ?"], [lat, lon]
+    if since is not None:
+        conditions.append(f"{time_column} >= ?")
+        params.append(since)
+    if until is not None:
+        conditions.append(f"{time_column} <= ?")
+        params.append(until)
+    
+    rows = _conn().execute(f"""
+        SELECT {time_column}, {', '.join(columns)} FROM {table}
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {time_column}
+    """, params).fetchall()
+    return [dict(row) for row in rows]
+
+
+def get_hourly_series(
+    lat: float,
+    lon: float,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    columns: Optional[List[str]] = None
+) -> List[Dict]:
+    """
+    Почасовые значения для точки за период
+    
+    Args:
+        since: Начало периода, UTC ('YYYY-MM-DD HH:MM:SS'), включительно
+        until: Конец периода, UTC, включительно
+        columns: Какие величины вернуть (по умолчанию все):
+            temperature, humidity, pressure, weather_code
+    
+    Returns:
+        Записи {'time': ..., <величина>: ...} по возрастанию времени
+    """
+    return _series_query("forecast_hourly", "time", _HOURLY_COLUMNS, lat, lon, since, until, columns)
+
+
+def get_daily_series(
+    lat: float,
+    lon: float,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    columns: Optional[List[str]] = None
+) -> List[Dict]:
+    """
+    Дневные значения для точки за период (даты местные, 'YYYY-MM-DD')
+    
+    Args:
+        columns: Какие величины вернуть (по умолчанию все): weather_code,
+            temperature_max, temperature_min, precipitation_sum
+    """
+    return _series_query("forecast_daily", "day", _DAILY_COLUMNS, lat, lon, since, until, columns)
+
+
+def _fix_dirty_stats(conn: sqlite3.Connection) -> None:
+    """Пересчитать min/max в строках статистики, помеченных после удалений"""
+    dirty = conn.execute("""
+        SELECT (SELECT dirty FROM stats_summary WHERE id = 1)
+            OR EXISTS (SELECT 1 FROM stats_city WHERE dirty)
+            OR EXISTS (SELECT 1 FROM stats_daily WHERE dirty)
+    """).fetchone()[0]
+    if not dirty:
+        return
+    
+    with conn:
+        conn.execute("""
+            UPDATE stats_summary SET
+                temp_min = (SELECT MIN(temperature) FROM history),
+                temp_max = (SELECT MAX(temperature) FROM history),
+                dirty = 0
+            WHERE dirty
+        """)
+        conn.execute("""
+            UPDATE stats_city SET
+                temp_min = (SELECT MIN(temperature) FROM history WHERE city = stats_city.city),
+                temp_max = (SELECT MAX(temperature) FROM history WHERE city = stats_city.city),
+                dirty = 0
+            WHERE dirty
+        """)
+        conn.execute("""
+            UPDATE stats_daily SET
+                temp_min = (
+                    SELECT MIN(temperature) FROM history
+                    WHERE requested_at >= stats_daily.day
+                      AND requested_at < date(stats_daily.day, '+1 day')
+                      AND COALESCE(city, '') = stats_daily.city
+                ),
+                temp_max = (
+                    SELECT MAX(temperature) FROM history
+                    WHERE requested_at >= stats_daily.day
+                      AND requested_at < date(stats_daily.day, '+1 day')
+                      AND COALESCE(city, '') = stats_daily.city
+                ),
+                dirty = 0
+            WHERE dirty
+        """)
+
+
+@metrics.timed("weather_db_history_stats_seconds", "Время расчёта статистики истории")
+def get_history_stats(
+    city: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+) -> Dict:
+    """
+    Получить статистику по истории
+    
+    Статистика читается из сводных таблиц, которые обновляются триггерами
+    при каждой вставке, поэтому не зависит от размера истории.
     
-    # Минимальная и максимальная температура
-    c.execute("SELECT MIN(temperature) as min_temp, MAX(temperature) as max_temp FROM history WHERE temperature IS NOT NULL")
-    temps = c.fetchone()
-    stats['min_temperature'] = round(temps['min_temp'], 1) if temps['min_temp'] else None
-    stats['max_temperature'] = round(temps['max_temp'], 1) if temps['max_temp'] else None
+    Args:
+        city: Только по этому городу
+        since: Начало периода, день ('YYYY-MM-DD', UTC), включительно
+        until: Конец периода, день ('YYYY-MM-DD', UTC), включительно
+    """
+    conn = _conn()
+    _fix_dirty_stats(conn)
+    
+    if since is None and until is None:
+        if city is None:
+            row = conn.execute("""
+                SELECT total, unique_cities, temp_count, temp_sum, temp_min, temp_max
+                FROM stats_summary WHERE id = 1
+            """).fetchone()
+        else:
+            row = conn.execute("""
+                SELECT total, 1 AS unique_cities, temp_count, temp_sum, temp_min, temp_max
+                FROM stats_city WHERE city = ?
+            """, (city,)).fetchone()
+    else:
+        conditions, params = [], []
+        if since is not None:
+            conditions.append("day >= date(?)")
+            params.append(since)
+        if until is not None:
+            conditions.append("day <= date(?)")
+            params.append(until)
+        if city is not None:
+            conditions.append("city = ?")
+            params.append(city)
+        row = conn.execute(f"""
+            SELECT COALESCE(SUM(total), 0) AS total,
+                   COUNT(DISTINCT NULLIF(city, '')) AS unique_cities,
+                   COALESCE(SUM(temp_count), 0) AS temp_count,
+                   COALESCE(SUM(temp_sum), 0) AS temp_sum,
+                   MIN(temp_min) AS temp_min, MAX(temp_max) AS temp_max
+            FROM stats_daily WHERE {' AND '.join(conditions)}
+        """, params).fetchone()
+    
+    stats = {}
+    stats['total_requests'] = row['total'] if row else 0
+    stats['unique_cities'] = row['unique_cities'] if row else 0
+    
+    avg_temp = row['temp_sum'] / row['temp_count'] if row and row['temp_count'] else None
+    stats['avg_temperature'] = round(avg_temp, 1) if avg_temp else None
+    stats['min_temperature'] = round(row['temp_min'], 1) if row and row['temp_min'] else None
+    stats['max_temperature'] = round(row['temp_max'], 1) if row and row['temp_max'] else None
     
-    conn.close()
     return stats
 
 
+def cache_get(key: str, max_age: float) -> Optional[tuple]:
+    """
+    Получить запись постоянного кэша не старше max_age секунд
+    
+    Returns:
+        Пара (данные, возраст записи в секундах) или None
+    """
+    row = _conn().execute("""
+        SELECT data, (julianday('now') - julianday(fetched_at)) * 86400 AS age
+        FROM cache
+        WHERE key = ? AND fetched_at > datetime('now', ?)
+    """, (key, f"-{max_age} seconds")).fetchone()
+    
+    if row is None:
+        return None
+    return json.loads(row['data']), max(row['age'], 0.0)
+
+
+@metrics.timed("weather_db_write_seconds", "Время записи в SQLite", op="cache")
+def cache_set(key: str, data: Dict) -> None:
+    """Сохранить запись в постоянный кэш"""
+    conn = _conn()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, data, fetched_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
+            (key, json.dumps(data, ensure_ascii=False))
+        )
+
+
+def cache_purge(max_age: float) -> int:
+    """Удалить из постоянного кэша записи старше max_age секунд"""
+    conn = _conn()
+    with conn:
+        removed = conn.execute(
+            "DELETE FROM cache WHERE fetched_at <= datetime('now', ?)", (f"-{max_age} seconds",)
+        ).rowcount
+    return removed
+
+
+def cache_clear() -> None:
+    """Очистить постоянный кэш"""
+    conn = _conn()
+    with conn:
+        conn.execute("DELETE FROM cache")
+
+
+def geocode_get(query: str, language: str, negative_ttl: float) -> Optional[Dict]:
+    """
+    Найти название в кэше геокодирования
+    
+    Args:
+        query: Нормализованное название
+        language: Язык результатов геокодера
+        negative_ttl: Сколько секунд помнить, что название не найдено
+    
+    Returns:
+        Словарь места с ключом found (1 — найдено, 0 — не найдено) или None,
+        если названия нет в кэше
+    """
+    row = _conn().execute("""
+        SELECT found, name, latitude, longitude, country, admin1 FROM geocode
+        WHERE query = ? AND language = ?
+          AND (found = 1 OR created_at > datetime('now', ?))
+    """, (query, language, f"-{negative_ttl} seconds")).fetchone()
+    return dict(row) if row else None
+
+
+def geocode_set(query: str, language: str, geo: Optional[Dict]) -> None:
+    """Сохранить результат геокодирования (None — название не найдено)"""
+    geo = geo or {}
+    conn = _conn()
+    with conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO geocode (
+                query, language, found, name, latitude, longitude, country, admin1, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """, (
+            query, language, 1 if geo else 0, geo.get("name"), geo.get("latitude"),
+            geo.get("longitude"), geo.get("country"), geo.get("admin1")
+        ))
+
+
 def clear_history():
-    """Очистить всю историю"""
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("DELETE FROM history")
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    """Очистить всю историю и вернуть освободившееся место файловой системе"""
+    conn = _conn()
+    with _immediate(conn) as c:
+        # Триггер удаления обновлял бы статистику для каждой строки; без него
+        # SQLite очищает таблицу целиком, а статистика просто обнуляется
+        trigger = c.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'history_stats_delete'"
+        ).fetchone()[0]
+        c.execute("DROP TRIGGER history_stats_delete")
+        c.execute("DELETE FROM history")
+        c.execute(trigger)
+        c.execute("DELETE FROM raw_payloads")
+        _rebuild_stats(c)
+    # Без auto_vacuum=INCREMENTAL (базы, созданные раньше) ничего не делает;
+    # executescript, потому что execute освобождает лишь одну страницу за шаг
+    conn.executescript("PRAGMA incremental_vacuum")
\ No newline at end of file
@@ -0,0 +1,49 @@
+"""
+Квантование координат: привязка к сетке и geohash.
+
+Используется для ключей кэша, чтобы близкие точки (например,
+«дрожащие» GPS-координаты) попадали в одну ячейку и получали
+один и тот же прогноз.
+"""
+from typing import Tuple
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def snap_to_grid(lat: float, lon: float, resolution: float) -> Tuple[float, float]:
+    """Округляет координаты до ближайшего узла сетки с шагом ``resolution`` градусов."""
+    return (
+        round(round(lat / resolution) * resolution, 6),
+        round(round(lon / resolution) * resolution, 6),
+    )
+
+
+def geohash_encode(lat: float, lon: float, precision: int = 6) -> str:
+    """Кодирует координаты в geohash длиной ``precision`` символов.
+
+    Точность 5 символов — ячейка примерно 4.9×4.9 км, 6 символов — 1.2×0.6 км.
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True  # биты чередуются: долгота, широта, долгота...
+
+    while len(chars) < precision:
+        rng, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+
+    return "".join(chars)
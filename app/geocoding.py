@@ -0,0 +1,83 @@
+"""
+Разрешение названий городов в координаты с постоянным кэшем.
+
+Координаты города не меняются, поэтому результат геокодирования
+хранится в таблице ``geocode`` без срока жизни и запрашивается у API
+только один раз на нормализованное название. Ненайденные названия
+тоже запоминаются, но на ограниченное время.
+"""
+import sqlite3
+from datetime import timedelta
+from typing import Dict, Optional
+
+from . import api
+from .cache import MemoryCache, fetch_once
+from .database import geocode_get, geocode_set
+from .lazy import lazy_import
+
+requests = lazy_import("requests")
+
+# Сколько помнить, что название не найдено
+_NEGATIVE_TTL = timedelta(hours=6)
+
+# Найденные места в памяти процесса, чтобы не обращаться к SQLite на каждый запрос
+_memo = MemoryCache(max_entries=4096, ttl=timedelta(days=1))
+
+
+def normalize_city_name(name: str) -> str:
+    """Нормализует название: без лишних пробелов и без учёта регистра."""
+    return " ".join(name.split()).casefold()
+
+
+def resolve_city(city: str, language: str = api.GEOCODING_LANGUAGE) -> Dict:
+    """
+    Найти город: сначала в памяти, затем в таблице geocode, затем в API
+
+    Returns:
+        Словарь места (name, latitude, longitude, country, admin1)
+        или ``{"error": ...}``, если город не найден или запрос не удался
+    """
+    query = normalize_city_name(city)
+    memo_key = f"{language}:{query}"
+
+    geo = _memo.get(memo_key)
+    if geo is not None:
+        return geo
+
+    try:
+        row = geocode_get(query, language, _NEGATIVE_TTL.total_seconds())
+    except sqlite3.Error as e:
+        print(f"Ошибка чтения кэша геокодирования: {e}")
+        row = None
+
+    if row is None:
+        # Одновременные запросы одного названия ждут один вызов API
+        try:
+            geo, _ = fetch_once(f"geo:{memo_key}", lambda: _lookup(query, language))
+        except requests.RequestException as e:
+            return {"error": f"Ошибка запроса: {e}"}
+    elif row.pop("found"):
+        geo = row
+    else:
+        geo = None
+
+    if geo is None:
+        return {"error": f"Город '{city}' не найден."}
+
+    _memo.set(memo_key, geo)
+    return geo
+
+
+def _lookup(query: str, language: str) -> Optional[Dict]:
+    """Запрашивает геокодер и сохраняет ответ (в том числе «не найдено»)."""
+    geo = api.search_city(query, language)
+    try:
+        geocode_set(query, language, geo)
+    except sqlite3.Error as e:
+        print(f"Ошибка записи в кэш геокодирования: {e}")
+    return geo
+
+
+def clear_memo() -> None:
+    """Очистить кэш геокодирования в памяти процесса."""
+    _memo.clear()
@@ -0,0 +1,106 @@
+"""
+Отложенная (write-behind) запись истории запросов.
+
+Записи накапливаются в ограниченной очереди и сохраняются фоновым
+потоком пачками — одной транзакцией на пачку, — а не отдельным
+коммитом на каждый запрос погоды.
+"""
+import atexit
+import queue
+import threading
+import time
+from typing import Callable, List
+
+_STOP = object()
+_FLUSH = object()
+
+
+class HistoryWriter:
+    """
+    Фоновый поток, сохраняющий записи пачками.
+
+    Args:
+        write: Функция, сохраняющая список записей одной транзакцией
+        batch_size: Сохранять, как только накопится столько записей
+        flush_interval: Сохранять не реже чем раз в столько секунд
+        max_queue: Размер очереди; при заполненной очереди put ждёт
+            освобождения места (обратное давление на вызывающих)
+    """
+
+    def __init__(self, write: Callable[[List[tuple]], None], batch_size: int = 100,
+                 flush_interval: float = 0.5, max_queue: int = 10000):
+        self._write = write
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        # Ничего не ставится в очередь после _STOP: такая запись потерялась
+        # бы, а flush() ждал бы её вечно
+        self._lock = threading.Lock()
+        self.written = 0
+        self.batches = 0
+        self._thread = threading.Thread(target=self._run, name="weather-history-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, row: tuple) -> None:
+        """Поставить запись в очередь (ждёт, если очередь заполнена)"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("HistoryWriter закрыт")
+            self._queue.put(row)
+
+    def flush(self) -> None:
+        """Сохранить накопленную пачку, не дожидаясь таймера, и дождаться
+        сохранения всех записей, поставленных в очередь"""
+        with self._lock:
+            if not self._closed:
+                self._queue.put(_FLUSH)
+        self._queue.join()
+
+    def close(self) -> None:
+        """Сохранить оставшиеся записи и остановить поток"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                break
+            if item is _FLUSH:
+                self._queue.task_done()
+                continue
+
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP or item is _FLUSH:
+                    self._queue.task_done()
+                    stop = item is _STOP
+                    break
+                batch.append(item)
+
+            try:
+                self._write(batch)
+                self.written += len(batch)
+                self.batches += 1
+            except Exception as e:
+                print(f"Ошибка при сохранении истории: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
@@ -0,0 +1,44 @@
+"""
+Отложенный импорт тяжёлых зависимостей.
+
+``requests`` вместе с ``urllib3`` и ``certifi`` импортируется около
+десятой доли секунды — дольше, чем весь остальной пакет. Модули,
+которым он нужен только при сетевом запросе, получают его через
+:func:`lazy_import`: настоящий импорт происходит при первом обращении
+к атрибуту, поэтому запуск GUI и CLI, а также ответы из кэша за него
+не платят.
+"""
+import importlib
+import sys
+
+
+class LazyModule:
+    """Заместитель модуля, импортирующий его при первом обращении к атрибуту."""
+
+    def __init__(self, name: str):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            # import_module потокобезопасен: параллельные первые обращения
+            # дождутся одного импорта
+            module = self.__dict__["_module"] = importlib.import_module(self._name)
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr: str, value) -> None:
+        setattr(self._load(), attr, value)
+
+    def __repr__(self) -> str:
+        state = "загружен" if self.__dict__["_module"] is not None else "не загружен"
+        return f"<отложенный модуль {self._name!r} ({state})>"
+
+
+def lazy_import(name: str):
+    """Модуль ``name``, если он уже импортирован, иначе :class:`LazyModule`."""
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
@@ -0,0 +1,221 @@
+"""
+Метрики производительности: счётчики и гистограммы задержек.
+
+Горячие пути приложения (запросы к API, кэш, запись и чтение SQLite)
+отмечены декоратором :func:`timed` и вызовами :meth:`Counter.inc`.
+Пока метрики выключены, это стоит одну проверку флага; включаются они
+функцией :func:`enable` или переменной окружения ``WEATHER_METRICS=1``.
+
+Собранные значения выгружаются в текстовом формате Prometheus
+(:func:`to_prometheus`) или в JSON (:func:`to_json`).
+"""
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+# Границы корзин гистограмм задержек, сек.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_enabled = os.environ.get("WEATHER_METRICS") == "1"
+_registry: Dict[str, "Counter"] = {}
+_registry_lock = threading.Lock()
+
+
+def enable() -> None:
+    """Включить сбор метрик."""
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    """Выключить сбор метрик (накопленные значения сохраняются)."""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def _labels_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Counter:
+    """Счётчик событий, отдельный для каждого набора меток."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str = ""):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """Увеличить счётчик (ничего не делает, если метрики выключены)."""
+        if not _enabled:
+            return
+        key = _labels_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_labels_key(labels), 0)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        """Пары (метки, значение)."""
+        with self._lock:
+            return list(self._values.items())
+
+
+class Histogram(Counter):
+    """Распределение значений (обычно задержек в секундах) по корзинам."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        """Учесть значение (ничего не делает, если метрики выключены)."""
+        if not _enabled:
+            return
+        key = _labels_key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Счётчики по корзинам (последняя — +Inf), сумма, количество
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def value(self, **labels) -> Optional[Dict]:
+        """Сводка {'count', 'sum'} для набора меток или None."""
+        state = self._values.get(_labels_key(labels))
+        return {"count": state[2], "sum": state[1]} if state else None
+
+    def samples(self):
+        with self._lock:
+            return [(key, [list(state[0]), state[1], state[2]]) for key, state in self._values.items()]
+
+
+def _get(cls, name: str, help: str, **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, help, **kwargs)
+        elif not isinstance(metric, cls) or metric.kind != cls.kind:
+            raise ValueError(f"Метрика {name} уже зарегистрирована как {metric.kind}")
+        return metric
+
+
+def counter(name: str, help: str = "") -> Counter:
+    """Счётчик из общего реестра (создаётся при первом обращении)."""
+    return _get(Counter, name, help)
+
+
+def histogram(name: str, help: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    """Гистограмма из общего реестра (создаётся при первом обращении)."""
+    return _get(Histogram, name, help, buckets=buckets)
+
+
+def timed(name: str, help: str = "", **labels) -> Callable:
+    """
+    Декоратор: время выполнения функции в гистограмму ``name`` (секунды).
+
+    Пока метрики выключены, обёртка сразу вызывает функцию.
+    """
+    hist = histogram(name, help)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                hist.observe(time.perf_counter() - start, **labels)
+        return wrapper
+    return decorator
+
+
+def reset() -> None:
+    """Обнулить все метрики."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    for metric in metrics:
+        metric.reset()
+
+
+def _format_labels(key, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def to_prometheus() -> str:
+    """Все метрики в текстовом формате Prometheus."""
+    lines = []
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for key, value in sorted(metric.samples()):
+            if metric.kind == "counter":
+                lines.append(f"{metric.name}{_format_labels(key)} {_format_value(value)}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, n in zip(metric.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{metric.name}_bucket{_format_labels(key, (('le', le),))} {cumulative}")
+            lines.append(f"{metric.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{metric.name}_count{_format_labels(key)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot() -> Dict:
+    """Все метрики словарём: имя -> тип, описание и значения по меткам."""
+    result = {}
+    with _registry_lock:
+        metrics = list(_registry.values())
+    for metric in metrics:
+        values = []
+        for key, value in metric.samples():
+            item = {"labels": dict(key)}
+            if metric.kind == "counter":
+                item["value"] = value
+            else:
+                counts, total, count = value
+                item.update(count=count, sum=total,
+                            buckets=dict(zip([*map(str, metric.buckets), "+Inf"], counts)))
+            values.append(item)
+        result[metric.name] = {"type": metric.kind, "help": metric.help, "values": values}
+    return result
+
+
+def to_json(**kwargs) -> str:
+    """Все метрики в JSON (см. :func:`snapshot`)."""
+    return json.dumps(snapshot(), ensure_ascii=False, **kwargs)
@@ -3,6 +3,17 @@
 """
 import argparse
 
+# Число потоков пакетного режима (--batch) по умолчанию
+DEFAULT_WORKERS = 4
+
+
+def _positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("должно быть целым числом больше нуля")
+    return number
+
+
 def build_parser() -> argparse.ArgumentParser:
     """Создаёт и настраивает парсер аргументов CLI.
 
@@ -13,6 +24,10 @@ def build_parser() -> argparse.ArgumentParser:
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument("--city", type=str, help="Название города")
     group.add_argument("--coords", nargs=2, type=float, metavar=('LAT','LON'), help="Координаты: широта долгота")
+    group.add_argument("--batch", type=str, metavar="FILE",
+                       help="Файл со списком городов или координат, по одному на строку ('-' — stdin)")
+    parser.add_argument("--workers", type=_positive_int, default=DEFAULT_WORKERS,
+                        help=f"Число потоков в пакетном режиме (по умолчанию {DEFAULT_WORKERS})")
     return parser
 
 if __name__ == "__main__":
@@ -0,0 +1,140 @@
+"""
+Фоновое обновление записей кэша.
+
+Используется режимом stale-while-revalidate: команда отдаёт устаревшие
+данные сразу, а свежие загружаются здесь, в отдельном потоке. Кроме того,
+можно включить упреждающее обновление самых запрашиваемых записей
+незадолго до истечения их срока жизни.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Callable, Dict, Optional
+
+from . import cache
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# Ключ кэша -> функция, которая загружает данные из API и кладёт их в кэш
+_loaders: Dict[str, Callable[[], dict]] = {}
+_loaders_lock = threading.Lock()
+_pending = set()
+_pending_lock = threading.Lock()
+
+_proactive_thread: Optional[threading.Thread] = None
+_proactive_stop = threading.Event()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="weather-refresh")
+        return _executor
+
+
+def register_loader(key: str, loader: Callable[[], dict]) -> None:
+    """Запомнить, как обновить запись ``key``.
+
+    Загрузчики нужны только упреждающему обновлению, поэтому без
+    запущенного :func:`start_proactive_refresh` они не сохраняются.
+    """
+    if _proactive_thread is not None:
+        with _loaders_lock:
+            _loaders[key] = loader
+
+
+def schedule_refresh(key: str, loader: Optional[Callable[[], dict]] = None) -> bool:
+    """
+    Поставить обновление записи в очередь фонового потока.
+
+    Повторные вызовы для ключа, обновление которого ещё не закончилось,
+    ничего не делают; одновременный запрос того же ключа из команды
+    объединяется с фоновым через :func:`app.cache.fetch_once`.
+
+    Returns:
+        True, если обновление поставлено в очередь
+    """
+    if loader is None:
+        with _loaders_lock:
+            loader = _loaders.get(key)
+    if loader is None:
+        return False
+
+    with _pending_lock:
+        if key in _pending:
+            return False
+        _pending.add(key)
+
+    _get_executor().submit(_refresh, key, loader)
+    return True
+
+
+def _refresh(key: str, loader: Callable[[], dict]) -> None:
+    try:
+        cache.fetch_once(key, loader)
+    except Exception as e:
+        print(f"Ошибка фонового обновления {key}: {e}")
+    finally:
+        with _pending_lock:
+            _pending.discard(key)
+
+
+def refresh_hot_keys(top_n: int = 10, ahead: timedelta = timedelta(minutes=2)) -> int:
+    """
+    Обновить top_n самых запрашиваемых записей, срок которых истекает
+    в ближайшие ``ahead``.
+
+    Returns:
+        Число поставленных в очередь обновлений
+    """
+    # Загрузчики записей, вытесненных из кэша, больше не нужны; команды
+    # регистрируют новые из других потоков, поэтому обходим снимок
+    with _loaders_lock:
+        for key in [k for k in list(_loaders) if k not in cache._memory_cache]:
+            del _loaders[key]
+
+    keys = cache._memory_cache.hot_keys_expiring(ahead.total_seconds(), top_n)
+    return sum(1 for key in keys if schedule_refresh(key))
+
+
+def start_proactive_refresh(top_n: int = 10, ahead: timedelta = timedelta(minutes=2),
+                            interval: float = 30.0) -> None:
+    """Запустить поток, который каждые ``interval`` секунд вызывает :func:`refresh_hot_keys`."""
+    global _proactive_thread
+    stop_proactive_refresh()
+    _proactive_stop.clear()
+
+    def loop():
+        while not _proactive_stop.wait(interval):
+            try:
+                refresh_hot_keys(top_n, ahead)
+            except Exception as e:
+                print(f"Ошибка упреждающего обновления: {e}")
+
+    _proactive_thread = threading.Thread(target=loop, name="weather-proactive-refresh", daemon=True)
+    _proactive_thread.start()
+
+
+def stop_proactive_refresh() -> None:
+    """Остановить поток упреждающего обновления."""
+    global _proactive_thread
+    if _proactive_thread is not None:
+        _proactive_stop.set()
+        _proactive_thread.join()
+        _proactive_thread = None
+        with _loaders_lock:
+            _loaders.clear()
+
+
+def wait_idle(timeout: float = 10.0) -> bool:
+    """Дождаться завершения всех фоновых обновлений (удобно в тестах и при выходе)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with _pending_lock:
+            if not _pending:
+                return True
+        time.sleep(0.01)
+    return False
@@ -0,0 +1,143 @@
+"""
+Запись и воспроизведение ответов open-meteo.
+
+В режиме записи каждый ответ геокодера и прогноза сохраняется в файл
+SQLite с ключом по методу, адресу и отсортированным параметрам запроса;
+тело сжимается zlib. В режиме воспроизведения те же запросы получают
+записанные ответы без обращения к сети, при желании — с записанной
+задержкой. Так можно детерминированно и без сети прогонять весь путь
+``commands`` → ``cache`` → ``database`` на ответах реального размера.
+
+Режимы включаются через :func:`app.client.configure_client` или
+переменные окружения::
+
+    WEATHER_RECORD=responses.db python main.py --batch cities.txt
+    WEATHER_REPLAY=responses.db python main.py --batch cities.txt
+"""
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import timedelta
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+_COMPRESSION = 6
+
+
+def request_key(method: str, url: str) -> str:
+    """Ключ записи: метод, адрес без параметров и параметры по алфавиту."""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return f"{method.upper()} {parts.scheme}://{parts.netloc}{parts.path}?{query}"
+
+
+class ReplayStore:
+    """Файл с записанными ответами; общий для всех потоков процесса."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    status INTEGER NOT NULL,
+                    content_type TEXT,
+                    body BLOB NOT NULL,
+                    latency REAL NOT NULL,
+                    recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+    def put(self, key: str, status: int, content_type: Optional[str], body: bytes, latency: float) -> None:
+        """Сохранить ответ (более поздняя запись того же запроса заменяет прежнюю)"""
+        data = zlib.compress(body, _COMPRESSION)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT OR REPLACE INTO responses (key, status, content_type, body, latency)
+                VALUES (?, ?, ?, ?, ?)
+            """, (key, status, content_type, data, latency))
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Записанный ответ: status, content_type, body, latency — или None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, content_type, body, latency FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"status": row[0], "content_type": row[1], "body": zlib.decompress(row[2]), "latency": row[3]}
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT key FROM responses ORDER BY key")]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Обычный транспорт с пулом соединений, сохраняющий ответы GET в :class:`ReplayStore`."""
+
+    def __init__(self, store: ReplayStore, **kwargs):
+        super().__init__(**kwargs)
+        self.store = store
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        if request.method == "GET":
+            self.store.put(request_key(request.method, request.url), response.status_code,
+                           response.headers.get("Content-Type"), response.content,
+                           response.elapsed.total_seconds())
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Транспорт, отвечающий записанными ответами без обращения к сети
+
+    Args:
+        store: Записанные ответы
+        latency: Множитель записанной задержки (0 — отвечать сразу)
+
+    Запрос, которого нет в записи, завершается ``requests.ConnectionError``,
+    как при недоступной сети.
+    """
+
+    def __init__(self, store: ReplayStore, latency: float = 0.0):
+        super().__init__()
+        self.store = store
+        self.latency = latency
+
+    def send(self, request, **kwargs):
+        key = request_key(request.method, request.url)
+        recorded = self.store.get(key)
+        if recorded is None:
+            raise requests.ConnectionError(f"Нет записанного ответа: {key}", request=request)
+        if self.latency:
+            time.sleep(recorded["latency"] * self.latency)
+
+        response = requests.Response()
+        response.status_code = recorded["status"]
+        response.reason = "OK" if recorded["status"] < 400 else "Recorded error"
+        response.headers = CaseInsensitiveDict({"Content-Type": recorded["content_type"] or ""})
+        response._content = recorded["body"]
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        response.elapsed = timedelta(seconds=recorded["latency"])
+        return response
+
+    def close(self) -> None:
+        pass
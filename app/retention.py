@@ -0,0 +1,354 @@
+"""
+Ограничение роста истории в долго работающих установках.
+
+Политика :class:`RetentionPolicy` задаёт, сколько дней хранить записи
+истории целиком. Более старые записи сворачиваются в агрегаты по часам
+или по дням для каждого места (таблица ``history_rollup``), по желанию
+переносятся в помесячные файлы-архивы и удаляются небольшими пачками,
+каждая в своей короткой транзакции, чтобы не держать блокировку записи.
+Архив за месяц — отдельный файл SQLite рядом с основной базой, поэтому
+удаление старых данных — это удаление файла.
+
+Пример::
+
+    apply_retention(RetentionPolicy(raw_days=30, rollup="day", archive=True, archive_months=12))
+"""
+import sqlite3
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from . import database
+
+# Начало периода агрегата для записи истории
+_BUCKETS = {
+    "hour": "strftime('%Y-%m-%d %H:00:00', requested_at)",
+    "day": "date(requested_at)",
+}
+
+
+class RetentionPolicy:
+    """
+    Правила хранения истории.
+
+    Args:
+        raw_days: Сколько дней хранить записи истории целиком
+        rollup: Во что сворачивать более старые записи: "hour", "day"
+            или None — удалять без агрегатов
+        rollup_days: Сколько дней хранить агрегаты (None — всегда)
+        archive: Переносить удаляемые записи в помесячные файлы-архивы
+        archive_months: Сколько месяцев хранить архивы (None — всегда)
+        forecast_days: Сколько дней хранить почасовой и дневной прогноз
+            (None — всегда)
+        batch_size: Сколько записей удалять одной транзакцией
+        pause: Пауза между пачками, сек., чтобы успевали другие писатели
+        vacuum_pages: Сколько свободных страниц возвращать системе за проход
+            (0 — не возвращать)
+    """
+
+    def __init__(self, raw_days: int = 30, rollup: Optional[str] = "day",
+                 rollup_days: Optional[int] = None, archive: bool = False,
+                 archive_months: Optional[int] = None, forecast_days: Optional[int] = 90,
+                 batch_size: int = 500, pause: float = 0.0, vacuum_pages: int = 1000):
+        if rollup is not None and rollup not in _BUCKETS:
+            raise ValueError(f"rollup должен быть одним из {sorted(_BUCKETS)} или None")
+        self.raw_days = raw_days
+        self.rollup = rollup
+        self.rollup_days = rollup_days
+        self.archive = archive
+        self.archive_months = archive_months
+        self.forecast_days = forecast_days
+        self.batch_size = batch_size
+        self.pause = pause
+        self.vacuum_pages = vacuum_pages
+
+
+def _timestamp(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def apply_retention(policy: Optional[RetentionPolicy] = None,
+                    now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Применить политику хранения
+
+    Returns:
+        Сколько удалено: записей истории, агрегатов, прогнозов,
+        неиспользуемых сырых ответов, архивов и освобождено страниц
+    """
+    policy = policy or RetentionPolicy()
+    now = now or datetime.now(timezone.utc)
+    conn = database._conn()
+    report = {}
+
+    cutoff = _timestamp(now - timedelta(days=policy.raw_days))
+    report["history"] = _expire_history(conn, policy, cutoff)
+
+    report["rollup"] = 0
+    if policy.rollup_days is not None:
+        cutoff = _timestamp(now - timedelta(days=policy.rollup_days))
+        report["rollup"] = _delete_batched(
+            conn, policy, "history_rollup", "bucket, period, location",
+            "period < CASE bucket WHEN 'day' THEN date(?) ELSE ? END", (cutoff, cutoff))
+
+    report["forecast"] = 0
+    if policy.forecast_days is not None:
+        cutoff = _timestamp(now - timedelta(days=policy.forecast_days))
+        report["forecast"] = _delete_batched(
+            conn, policy, "forecast_hourly", "latitude, longitude, time", "time < ?", (cutoff,))
+        report["forecast"] += _delete_batched(
+            conn, policy, "forecast_daily", "latitude, longitude, day", "day < date(?)", (cutoff,))
+
+    # Сырые ответы, на которые больше не ссылается ни одна запись истории
+    report["payloads"] = _delete_batched(
+        conn, policy, "raw_payloads", "hash",
+        "NOT EXISTS (SELECT 1 FROM history WHERE history.raw_hash = raw_payloads.hash)", ())
+
+    report["partitions"] = 0
+    if policy.archive_months is not None:
+        report["partitions"] = len(drop_partitions(policy.archive_months, now))
+
+    report["pages"] = incremental_vacuum(policy.vacuum_pages) if policy.vacuum_pages else 0
+    return report
+
+
+def _pause(policy: RetentionPolicy) -> None:
+    if policy.pause:
+        time.sleep(policy.pause)
+
+
+def _expire_history(conn: sqlite3.Connection, policy: RetentionPolicy, cutoff: str) -> int:
+    """Свернуть, заархивировать и удалить записи старше cutoff, по месяцу за раз"""
+    total = 0
+    while True:
+        row = conn.execute("""
+            SELECT strftime('%Y_%m', requested_at) FROM history
+            WHERE requested_at < ? ORDER BY requested_at LIMIT 1
+        """, (cutoff,)).fetchone()
+        if row is None:
+            return total
+
+        month = row[0]
+        year, number = map(int, month.split("_"))
+        month_end = f"{year + number // 12:04d}-{number % 12 + 1:02d}-01 00:00:00"
+        until = min(cutoff, month_end)
+
+        with _attached(conn, month) if policy.archive else nullcontext() as columns:
+            while True:
+                ids = [r[0] for r in conn.execute("""
+                    SELECT id FROM history WHERE requested_at < ?
+                    ORDER BY requested_at LIMIT ?
+                """, (until, policy.batch_size))]
+                if not ids:
+                    break
+
+                marks = ", ".join("?" * len(ids))
+                with conn:
+                    # Архив и основная база в режиме WAL фиксируются по отдельности,
+                    # поэтому запись в архив идемпотентна (INSERT OR IGNORE по id)
+                    if columns:
+                        names = ", ".join(columns)
+                        conn.execute(f"""
+                            INSERT OR IGNORE INTO archive.history ({names})
+                            SELECT {names} FROM main.history WHERE id IN ({marks})
+                        """, ids)
+                        conn.execute(f"""
+                            INSERT OR IGNORE INTO archive.raw_payloads (hash, data)
+                            SELECT hash, data FROM main.raw_payloads WHERE hash IN (
+                                SELECT raw_hash FROM main.history WHERE id IN ({marks})
+                            )
+                        """, ids)
+                    if policy.rollup:
+                        _rollup(conn, policy.rollup, ids)
+                    conn.execute(f"DELETE FROM history WHERE id IN ({marks})", ids)
+                total += len(ids)
+                _pause(policy)
+
+
+def _rollup(conn: sqlite3.Connection, bucket: str, ids: List[int]) -> None:
+    """Добавить записи ids в агрегаты history_rollup"""
+    conn.execute(f"""
+        INSERT INTO history_rollup (
+            bucket, period, location, latitude, longitude, requests,
+            temp_count, temp_sum, temp_min, temp_max,
+            humidity_count, humidity_sum, pressure_count, pressure_sum
+        )
+        SELECT ?, {_BUCKETS[bucket]}, COALESCE(city, printf('%.2f,%.2f', latitude, longitude)),
+               AVG(latitude), AVG(longitude), COUNT(*),
+               COUNT(temperature), COALESCE(SUM(temperature), 0), MIN(temperature), MAX(temperature),
+               COUNT(humidity), COALESCE(SUM(humidity), 0), COUNT(pressure), COALESCE(SUM(pressure), 0)
+        FROM history WHERE id IN ({", ".join("?" * len(ids))})
+        GROUP BY 2, 3
+        ON CONFLICT (bucket, period, location) DO UPDATE SET
+            requests = requests + excluded.requests,
+            temp_count = temp_count + excluded.temp_count,
+            temp_sum = temp_sum + excluded.temp_sum,
+            temp_min = MIN(COALESCE(temp_min, excluded.temp_min), COALESCE(excluded.temp_min, temp_min)),
+            temp_max = MAX(COALESCE(temp_max, excluded.temp_max), COALESCE(excluded.temp_max, temp_max)),
+            humidity_count = humidity_count + excluded.humidity_count,
+            humidity_sum = humidity_sum + excluded.humidity_sum,
+            pressure_count = pressure_count + excluded.pressure_count,
+            pressure_sum = pressure_sum + excluded.pressure_sum
+    """, (bucket, *ids))
+
+
+def _delete_batched(conn: sqlite3.Connection, policy: RetentionPolicy, table: str,
+                    key: str, condition: str, params: tuple) -> int:
+    """Удалить строки table по условию пачками по batch_size"""
+    total = 0
+    while True:
+        with conn:
+            deleted = conn.execute(f"""
+                DELETE FROM {table} WHERE ({key}) IN (
+                    SELECT {key} FROM {table} WHERE {condition} LIMIT ?
+                )
+            """, (*params, policy.batch_size)).rowcount
+        total += deleted
+        if deleted < policy.batch_size:
+            return total
+        _pause(policy)
+
+
+def get_rollup(location: Optional[str] = None, bucket: str = "day",
+               since: Optional[str] = None, until: Optional[str] = None) -> List[Dict]:
+    """
+    Получить агрегаты свёрнутой истории
+
+    Args:
+        location: Город (или 'широта,долгота' для запросов по координатам)
+        bucket: "hour" или "day"
+        since, until: Границы периода включительно ('YYYY-MM-DD[ HH:00:00]', UTC)
+
+    Returns:
+        Записи с числом запросов и средней, минимальной и максимальной
+        температурой, средними влажностью и давлением, по возрастанию периода
+    """
+    conditions, params = ["bucket = ?"], [bucket]
+    if location is not None:
+        conditions.append("location = ?")
+        params.append(location)
+    if since is not None:
+        conditions.append("period >= ?")
+        params.append(since)
+    if until is not None:
+        conditions.append("period <= ?")
+        params.append(until)
+
+    rows = database._conn().execute(f"""
+        SELECT period, location, latitude, longitude, requests,
+               temp_sum / NULLIF(temp_count, 0) AS avg_temperature,
+               temp_min AS min_temperature, temp_max AS max_temperature,
+               humidity_sum / NULLIF(humidity_count, 0) AS avg_humidity,
+               pressure_sum / NULLIF(pressure_count, 0) AS avg_pressure
+        FROM history_rollup WHERE {' AND '.join(conditions)}
+        ORDER BY period, location
+    """, params).fetchall()
+    return [dict(row) for row in rows]
+
+
+def partition_path(month: str) -> Path:
+    """Файл архива за месяц ('YYYY_MM') рядом с основной базой"""
+    db = Path(database.DB_PATH)
+    return db.with_name(f"{db.stem}_{month}{db.suffix}")
+
+
+@contextmanager
+def _attached(conn: sqlite3.Connection, month: str):
+    """Подключить архив месяца как схему archive; возвращает колонки history"""
+    conn.execute("ATTACH DATABASE ? AS archive", (str(partition_path(month)),))
+    try:
+        columns = conn.execute("PRAGMA main.table_info(history)").fetchall()
+        definitions = ", ".join(
+            f"{c['name']} {c['type']}{' PRIMARY KEY' if c['pk'] else ''}" for c in columns
+        )
+        conn.execute(f"CREATE TABLE IF NOT EXISTS archive.history ({definitions})")
+        # Архив мог быть создан до добавления новых колонок
+        existing = {c["name"] for c in conn.execute("PRAGMA archive.table_info(history)")}
+        for c in columns:
+            if c["name"] not in existing:
+                conn.execute(f"ALTER TABLE archive.history ADD COLUMN {c['name']} {c['type']}")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS archive.raw_payloads (
+                hash TEXT PRIMARY KEY,
+                data BLOB NOT NULL
+            )
+        """)
+        yield [c["name"] for c in columns]
+    finally:
+        conn.execute("DETACH DATABASE archive")
+
+
+def list_partitions() -> List[str]:
+    """Месяцы ('YYYY_MM'), за которые есть архивы, по возрастанию"""
+    db = Path(database.DB_PATH)
+    pattern = f"{db.stem}_[0-9][0-9][0-9][0-9]_[0-9][0-9]{db.suffix}"
+    return sorted(path.stem[len(db.stem) + 1:] for path in db.parent.glob(pattern))
+
+
+def get_archived_history(month: str, city: Optional[str] = None, limit: int = 100) -> List[Dict]:
+    """Записи из архива месяца, от новых к старым (без raw_data)"""
+    path = partition_path(month)
+    if not path.exists():
+        return []
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        query = "SELECT * FROM history"
+        params = []
+        if city is not None:
+            query += " WHERE city = ?"
+            params.append(city)
+        rows = conn.execute(query + " ORDER BY id DESC LIMIT ?", (*params, limit)).fetchall()
+    finally:
+        conn.close()
+    return [{k: row[k] for k in row.keys() if k != "raw_data"} for row in rows]
+
+
+def drop_partitions(keep_months: int, now: Optional[datetime] = None) -> List[str]:
+    """
+    Удалить файлы архивов старше keep_months месяцев (текущий месяц
+    считается первым)
+
+    Returns:
+        Месяцы удалённых архивов
+    """
+    now = now or datetime.now(timezone.utc)
+    index = now.year * 12 + now.month - keep_months
+    oldest = f"{index // 12:04d}_{index % 12 + 1:02d}"
+
+    dropped = []
+    for month in list_partitions():
+        if month < oldest:
+            path = partition_path(month)
+            for suffix in ("", "-journal", "-wal", "-shm"):
+                Path(f"{path}{suffix}").unlink(missing_ok=True)
+            dropped.append(month)
+    return dropped
+
+
+def incremental_vacuum(pages: Optional[int] = None, convert: bool = False) -> int:
+    """
+    Вернуть файловой системе свободные страницы базы
+
+    Args:
+        pages: Сколько страниц освободить за раз (None — все)
+        convert: Если база создана до включения auto_vacuum=INCREMENTAL,
+            перестроить её один раз полным VACUUM (долго и блокирует базу)
+
+    Returns:
+        Число освобождённых страниц
+    """
+    conn = database._conn()
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        if not convert:
+            return 0
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+
+    before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    # execute() делает один шаг запроса, то есть освобождает одну страницу;
+    # executescript() выполняет прагму до конца
+    conn.executescript(f"PRAGMA incremental_vacuum({int(pages)})" if pages else "PRAGMA incremental_vacuum")
+    return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
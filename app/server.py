@@ -0,0 +1,282 @@
+"""
+Локальный HTTP-сервер для чтения погоды, истории и статистики.
+
+Клиенты на одной машине (несколько окон GUI, скрипты) обращаются к одному
+процессу и делят его прогретый кэш, вместо того чтобы каждый держал свой
+кэш в памяти и отдельно ходил в API. Сервер работает по HTTP/1.1 с
+keep-alive, а для ответов из кэша хранит уже сериализованные байты, чтобы
+не кодировать один и тот же прогноз в JSON на каждый запрос.
+
+Эндпоинты (все GET, ответ — JSON)::
+
+    /weather?city=Москва
+    /weather?lat=55.75&lon=37.62
+    /history?limit=20&before_id=100&city=Москва&since=2025-01-01
+    /stats?city=Москва&since=2025-01-01&until=2025-01-31
+    /metrics                      (текстовый формат Prometheus)
+    /health
+
+Ответ ``/weather`` совпадает с результатом :func:`app.commands.weather_by_city`;
+ошибки API и «город не найден» передаются в нём же полем ``error``.
+
+Запуск::
+
+    python -m app.server --port 8765
+"""
+import argparse
+import json
+import socket
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+from . import commands, metrics
+from .cache import coords_key
+from .geocoding import normalize_city_name
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_HISTORY_LIMIT = 500
+
+REQUEST_SECONDS = metrics.histogram("weather_server_request_seconds", "Время обработки запроса сервером")
+ENCODED_RESPONSES = metrics.counter("weather_server_encoded_total",
+                                    "Ответы из кэша: reused — готовые байты, encoded — сериализованы заново")
+
+
+def _dumps(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+
+
+class BadRequest(ValueError):
+    """Неверные параметры запроса (ответ 400)."""
+
+
+def _param(query: Dict[str, str], name: str, kind=str, default=None):
+    value = query.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return kind(value)
+    except ValueError:
+        raise BadRequest(f"Неверное значение параметра {name}: {value}")
+
+
+class WeatherHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов к :class:`WeatherServer`."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    # Сколько ждать следующего запроса на открытом соединении, сек
+    timeout = 30
+
+    def setup(self):
+        super().setup()
+        self.server.track_connection(self.connection, True)
+
+    def finish(self):
+        self.server.track_connection(self.connection, False)
+        super().finish()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        route = self.server.routes.get(url.path.rstrip("/") or "/")
+        start = time.perf_counter()
+        try:
+            if route is None:
+                self._send(404, _dumps({"error": f"Неизвестный путь: {url.path}"}))
+            else:
+                status, body, content_type = route(self.server, query)
+                self._send(status, body, content_type)
+        except BadRequest as e:
+            self._send(400, _dumps({"error": str(e)}))
+        except Exception as e:
+            print(f"Ошибка обработки {self.path}: {e}")
+            self._send(500, _dumps({"error": f"Внутренняя ошибка: {e}"}))
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - start, path=url.path if route else "other")
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def _weather(server: "WeatherServer", query: Dict[str, str]):
+    city = _param(query, "city")
+    lat, lon = _param(query, "lat", float), _param(query, "lon", float)
+    if city:
+        key = "city:" + normalize_city_name(city)
+        response = commands.weather_by_city(city)
+    elif lat is not None and lon is not None:
+        key = coords_key(lat, lon)
+        response = commands.weather_by_coords(lat, lon)
+    else:
+        raise BadRequest("Нужен параметр city или пара lat и lon")
+    return 200, server.encode_weather(key, response), "application/json; charset=utf-8"
+
+
+def _history(server: "WeatherServer", query: Dict[str, str]):
+    limit = min(_param(query, "limit", int, 20), MAX_HISTORY_LIMIT)
+    items = commands.get_history_page(before_id=_param(query, "before_id", int), limit=limit,
+                                      city=_param(query, "city"), since=_param(query, "since"))
+    return 200, _dumps({"items": items}), "application/json; charset=utf-8"
+
+
+def _stats(server: "WeatherServer", query: Dict[str, str]):
+    stats = commands.get_statistics(city=_param(query, "city"), since=_param(query, "since"),
+                                    until=_param(query, "until"))
+    return 200, _dumps(stats), "application/json; charset=utf-8"
+
+
+def _metrics(server: "WeatherServer", query: Dict[str, str]):
+    return 200, metrics.to_prometheus().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _health(server: "WeatherServer", query: Dict[str, str]):
+    return 200, b'{"status": "ok"}', "application/json; charset=utf-8"
+
+
+class WeatherServer(ThreadingHTTPServer):
+    """
+    HTTP-сервер поверх :mod:`app.commands`, каждый клиент — в своём потоке
+
+    Args:
+        address: Адрес и порт (порт 0 — любой свободный)
+        max_encoded: Сколько сериализованных ответов из кэша хранить
+        verbose: Писать журнал запросов в stderr
+    """
+
+    daemon_threads = True
+    routes = {
+        "/weather": _weather,
+        "/history": _history,
+        "/stats": _stats,
+        "/metrics": _metrics,
+        "/health": _health,
+    }
+
+    def __init__(self, address=(DEFAULT_HOST, DEFAULT_PORT), max_encoded: int = 1024,
+                 verbose: bool = False):
+        super().__init__(address, WeatherHandler)
+        self.max_encoded = max_encoded
+        self.verbose = verbose
+        # Ключ запроса -> (данные прогноза из кэша, готовый ответ в байтах)
+        self._encoded = OrderedDict()
+        self._encoded_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        # Открытые соединения клиентов: обработчики — потоки-демоны, и
+        # server_close их не ждёт, поэтому stop ждёт, пока опустеет этот набор
+        self._connections = set()
+        self._connections_closed = threading.Condition()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def encode_weather(self, key: str, response: Dict) -> bytes:
+        """
+        Ответ команды в байтах JSON
+
+        Ответ из кэша кодируется один раз: пока кэш отдаёт тот же объект
+        прогноза, повторные запросы получают сохранённые байты.
+        """
+        data = (response.get("result") or {}).get("data")
+        if response.get("source") != "cache" or data is None:
+            return _dumps(response)
+
+        with self._encoded_lock:
+            entry = self._encoded.get(key)
+            if entry is not None and entry[0] is data:
+                self._encoded.move_to_end(key)
+                ENCODED_RESPONSES.inc(result="reused")
+                return entry[1]
+
+        body = _dumps(response)
+        ENCODED_RESPONSES.inc(result="encoded")
+        with self._encoded_lock:
+            self._encoded[key] = (data, body)
+            self._encoded.move_to_end(key)
+            while len(self._encoded) > self.max_encoded:
+                self._encoded.popitem(last=False)
+        return body
+
+    def track_connection(self, connection: socket.socket, opened: bool) -> None:
+        with self._connections_closed:
+            if opened:
+                self._connections.add(connection)
+            else:
+                self._connections.discard(connection)
+                self._connections_closed.notify_all()
+
+    def start(self) -> "WeatherServer":
+        """Запустить сервер в фоновом потоке"""
+        self._thread = threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.1},
+                                        name="weather-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """
+        Остановить сервер и дождаться обработчиков запросов
+
+        Начатые запросы (и их запись в историю) завершаются, но не дольше
+        ``timeout`` секунд; соединения, ждущие следующего запроса
+        keep-alive, закрываются сразу.
+        """
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        with self._connections_closed:
+            for connection in self._connections:
+                try:
+                    connection.shutdown(socket.SHUT_RD)
+                except OSError:
+                    pass
+            self._connections_closed.wait_for(lambda: not self._connections, timeout)
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Weather local HTTP API")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Адрес (по умолчанию только локальный)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Порт")
+    parser.add_argument("--verbose", action="store_true", help="Журнал запросов в stderr")
+    args = parser.parse_args(argv)
+
+    from .database import disable_write_behind, enable_write_behind, init_db
+    init_db()
+    # Каждый запрос погоды пишется в историю: пачками в фоне, а не транзакцией на запрос
+    enable_write_behind()
+    server = WeatherServer((args.host, args.port), verbose=args.verbose).start()
+    print(f"Сервер погоды: {server.url}")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Очередь истории закрывается, только когда обработчики закончили
+        # сохранять в неё записи
+        server.stop()
+        disable_write_behind()
+
+
+if __name__ == "__main__":
+    main()
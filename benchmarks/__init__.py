@@ -0,0 +1,4 @@
+"""
+Бенчмарки приложения погоды. Запускаются против локального
+сервера-заглушки, без обращений к настоящему open-meteo.
+"""
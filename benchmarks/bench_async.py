@@ -0,0 +1,56 @@
+"""
+Бенчмарк асинхронного слоя :mod:`app.aio`.
+
+Получает погоду для N разных городов у локальной заглушки open-meteo
+последовательно через :func:`app.commands.weather_by_city` и параллельно
+через :func:`app.aio.async_weather_many`, выводит время выполнения.
+
+Запуск::
+
+    python -m benchmarks.bench_async --cities 500 --latency 0.02
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from app import aio, api, commands, database
+from app.client import configure_client
+from benchmarks.stub_server import StubServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Async fan-out benchmark")
+    parser.add_argument("--cities", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02, help="Задержка заглушки, сек")
+    parser.add_argument("--concurrency", type=int, default=aio.DEFAULT_CONCURRENCY)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, StubServer(latency=args.latency) as server:
+        database.DB_PATH = Path(tmp) / "bench.db"
+        database.init_db()
+        api.BASE_URL = server.url + "/v1/forecast"
+        api.GEOCODING_URL = server.url + "/v1/search"
+        configure_client(pool_maxsize=args.concurrency)
+        aio.set_concurrency(args.concurrency)
+
+        start = time.perf_counter()
+        for i in range(args.cities):
+            commands.weather_by_city(f"sync-{i}")
+        sync_time = time.perf_counter() - start
+
+        names = [f"async-{i}" for i in range(args.cities)]
+        start = time.perf_counter()
+        asyncio.run(aio.async_weather_many(cities=names))
+        async_time = time.perf_counter() - start
+
+    print(f"cities: {args.cities}, latency: {args.latency * 1000:.0f} ms, "
+          f"concurrency: {args.concurrency}")
+    print(f"sync:  {sync_time:8.2f} s")
+    print(f"async: {async_time:8.2f} s  (x{sync_time / async_time:.1f})")
+    configure_client()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Бенчмарк пула соединений :mod:`app.client`.
+
+Сравнивает задержку запросов к локальной заглушке open-meteo
+с новым соединением на каждый запрос (cold) и с переиспользованием
+соединений из пула (warm).
+
+Запуск::
+
+    python -m benchmarks.bench_http_pool --requests 500
+"""
+import argparse
+import statistics
+import time
+
+from app import api
+from app.client import configure_client
+from benchmarks.common import percentile
+from benchmarks.stub_server import StubServer
+
+
+def measure(n: int, keep_alive: bool) -> list:
+    """Делает ``n`` вызовов ``get_weather_by_city`` и возвращает задержки в мс."""
+    configure_client(keep_alive=keep_alive)
+    latencies = []
+    for i in range(n):
+        start = time.perf_counter()
+        api.get_weather_by_city(f"city-{i}")
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP pool benchmark")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка заглушки, сек")
+    args = parser.parse_args()
+
+    with StubServer(latency=args.latency) as server:
+        api.BASE_URL = server.url + "/v1/forecast"
+        api.GEOCODING_URL = server.url + "/v1/search"
+
+        print(f"{'mode':6} {'p50, ms':>10} {'p99, ms':>10} {'mean, ms':>10}")
+        for mode, keep_alive in (("cold", False), ("warm", True)):
+            lat = measure(args.requests, keep_alive)
+            print(f"{mode:6} {percentile(lat, 50):10.2f} {percentile(lat, 99):10.2f} "
+                  f"{statistics.mean(lat):10.2f}")
+
+    configure_client()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Бенчмарк хранения сырых ответов API в истории.
+
+Сохраняет N записей истории, из которых только часть несёт новый ответ
+(остальные — повторы, как при попаданиях в кэш), двумя способами:
+JSON-текстом в колонке ``raw_data`` (как раньше) и сжатыми ответами
+в ``raw_payloads`` со ссылкой по хэшу. Выводит размер базы, скорость
+записи и время чтения последних записей.
+
+Запуск::
+
+    python -m benchmarks.bench_raw_payloads --rows 20000 --unique 0.1
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from app import database
+from benchmarks.stub_server import forecast_payload
+
+
+def make_payloads(count: int) -> list:
+    """Ответы прогноза с правдоподобно меняющимися значениями."""
+    rnd = random.Random(42)
+    payloads = []
+    for i in range(count):
+        data = forecast_payload(55.0 + i * 0.01, 37.0)
+        hourly = data["hourly"]
+        hourly["temperature_2m"] = [round(rnd.uniform(-10, 10), 1) for _ in range(24)]
+        hourly["relative_humidity_2m"] = [rnd.randint(40, 100) for _ in range(24)]
+        hourly["pressure_msl"] = [round(rnd.uniform(990, 1030), 1) for _ in range(24)]
+        payloads.append({"result": {"meta": {"name": f"city-{i}"}, "data": data}})
+    return payloads
+
+
+def legacy_save(payload: dict) -> None:
+    """Запись как до хранения ответов по хэшу: JSON-текстом в каждой строке."""
+    conn = database._conn()
+    with conn:
+        conn.execute("INSERT INTO history (city, source, raw_data) VALUES (?, 'cache', ?)",
+                     (payload["result"]["meta"]["name"], json.dumps(payload)))
+
+
+def current_save(payload: dict) -> None:
+    database.save_to_history(city=payload["result"]["meta"]["name"], source="cache",
+                             raw_data=payload)
+
+
+def run(save, rows: list, tmp: str, name: str) -> dict:
+    database.close_conn()
+    database.DB_PATH = Path(tmp) / f"{name}.db"
+    database.init_db()
+
+    start = time.perf_counter()
+    for payload in rows:
+        save(payload)
+    write_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    history = database.get_recent_history(1000)
+    list_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for item in history:
+        item.get("raw_data")
+    decode_time = time.perf_counter() - start
+
+    conn = database._conn()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    size = database.DB_PATH.stat().st_size
+    database.close_conn()
+    return {
+        "size_mb": size / 2 ** 20,
+        "rows_per_s": len(rows) / write_time,
+        "list_ms": list_time * 1000,
+        "decode_ms": decode_time * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Raw payload storage benchmark")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--unique", type=float, default=0.1, help="Доля новых ответов")
+    args = parser.parse_args()
+
+    payloads = make_payloads(max(1, int(args.rows * args.unique)))
+    rnd = random.Random(0)
+    rows = [rnd.choice(payloads) for _ in range(args.rows)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {
+            "text": run(legacy_save, rows, tmp, "text"),
+            "hashed": run(current_save, rows, tmp, "hashed"),
+        }
+
+    print(f"rows: {args.rows}, unique payloads: {len(payloads)}")
+    print(f"{'':8}{'size, MB':>10}{'rows/s':>10}{'list 1000, ms':>15}{'decode, ms':>12}")
+    for name, r in results.items():
+        print(f"{name:8}{r['size_mb']:10.1f}{r['rows_per_s']:10.0f}"
+              f"{r['list_ms']:15.1f}{r['decode_ms']:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Нагрузочный тест локального HTTP-сервера :mod:`app.server`.
+
+Несколько клиентов с постоянными (keep-alive) соединениями запрашивают
+``/weather?city=...``: по прогретому набору городов (попадания в кэш,
+с готовыми байтами ответа и без них) и по новым городам (промахи,
+каждый запрос идёт в заглушку open-meteo).
+
+Запуск::
+
+    python -m benchmarks.bench_server --clients 8 --requests 200
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from typing import Callable, Dict, List
+from urllib.parse import quote
+
+from app import database
+from app.server import WeatherServer
+from benchmarks.common import stub_api, summarize, temp_database
+from benchmarks.stub_server import StubServer
+
+
+def _load(server: WeatherServer, clients: int, requests: int, path: Callable[[int, int], str]) -> Dict:
+    """``clients`` потоков делают по ``requests`` запросов; задержки и запросы в секунду."""
+    host, port = server.server_address[:2]
+    latencies: List[float] = []
+    errors = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(clients + 1)
+
+    def client(n: int):
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        own = []
+        start_barrier.wait()
+        for i in range(requests):
+            start = time.perf_counter()
+            conn.request("GET", path(n, i))
+            resp = conn.getresponse()
+            body = resp.read()
+            own.append((time.perf_counter() - start) * 1000)
+            if resp.status != 200 or b'"error"' in body:
+                errors.append(resp.status)
+        conn.close()
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for t in threads:
+        t.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return {**summarize(latencies), "requests_per_s": round(len(latencies) / elapsed, 1),
+            "errors": len(errors)}
+
+
+def server_load(clients: int = 8, requests: int = 200, hot: int = 50, latency: float = 0.005,
+                seed: int = 0) -> Dict:
+    """Пропускная способность и задержки сервера для попаданий и промахов кэша."""
+    results = {"params": {"clients": clients, "requests": requests, "hot": hot,
+                          "latency_ms": latency * 1000}}
+    with temp_database(), StubServer(latency) as upstream, stub_api(upstream):
+        database.enable_write_behind()
+        hot_names = [f"hot-{i}" for i in range(hot)]
+        rnd = random.Random(seed)
+        picks = [[quote(rnd.choice(hot_names)) for _ in range(requests)] for _ in range(clients)]
+
+        for name, max_encoded in (("cache_hit", 1024), ("cache_hit_no_reuse", 0)):
+            with WeatherServer(("127.0.0.1", 0), max_encoded=max_encoded) as server:
+                for city in hot_names:
+                    _load(server, 1, 1, lambda n, i: f"/weather?city={city}")
+                before = upstream.requests
+                results[name] = _load(server, clients, requests,
+                                      lambda n, i: f"/weather?city={picks[n][i]}")
+                results[name]["upstream_requests"] = upstream.requests - before
+
+        with WeatherServer(("127.0.0.1", 0)) as server:
+            before = upstream.requests
+            results["cache_miss"] = _load(server, clients, requests,
+                                          lambda n, i: f"/weather?city=miss-{n}-{i}")
+            results["cache_miss"]["upstream_requests"] = upstream.requests - before
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP server load test")
+    parser.add_argument("--clients", type=int, default=8, help="Одновременных клиентов")
+    parser.add_argument("--requests", type=int, default=200, help="Запросов на клиента")
+    parser.add_argument("--hot", type=int, default=50, help="Городов в прогретом наборе")
+    parser.add_argument("--latency", type=float, default=0.005, help="Задержка заглушки, сек")
+    args = parser.parse_args()
+
+    report = server_load(args.clients, args.requests, args.hot, args.latency)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Общие помощники бенчмарков: сводка задержек, временная база данных
+и подключение :mod:`app.api` к серверу-заглушке.
+"""
+import statistics
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List
+
+from app import api, cache, database, geocoding
+from app.client import configure_client
+
+
+def percentile(values, q: float) -> float:
+    """Перцентиль ``q`` (0..100) по отсортированной выборке."""
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    """Сводка задержек в мс: p50, p99, среднее и число замеров."""
+    if not latencies:
+        return {"n": 0}
+    return {
+        "n": len(latencies),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(statistics.mean(latencies), 3),
+    }
+
+
+@contextmanager
+def temp_database():
+    """Временная база вместо ``app/weather_data.db`` на время бенчмарка."""
+    old_path = database.DB_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        database.close_conn()
+        database.DB_PATH = Path(tmp) / "bench.db"
+        database.init_db()
+        try:
+            yield database.DB_PATH
+        finally:
+            database.disable_write_behind()
+            database.close_conn()
+            database.DB_PATH = old_path
+
+
+@contextmanager
+def stub_api(server):
+    """Направить запросы :mod:`app.api` на сервер-заглушку с чистыми кэшами."""
+    old_urls = api.BASE_URL, api.GEOCODING_URL
+    api.BASE_URL = server.url + "/v1/forecast"
+    api.GEOCODING_URL = server.url + "/v1/search"
+    cache.clear_cache()
+    geocoding.clear_memo()
+    configure_client()
+    try:
+        yield server
+    finally:
+        api.BASE_URL, api.GEOCODING_URL = old_urls
+        cache.clear_cache(persistent=False)
+        geocoding.clear_memo()
+        configure_client()
@@ -0,0 +1,129 @@
+"""
+Запуск набора бенчмарков с записью результатов в JSON.
+
+Результаты разных версий можно сравнить: ``--compare`` печатает
+метрики, ухудшившиеся больше чем на ``--threshold``, и завершает
+работу с кодом 1, если такие есть.
+
+Запуск::
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --quick --scenarios cache,stats --compare bench.json
+"""
+import argparse
+import json
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from benchmarks.scenarios import SCENARIOS
+
+# Уменьшенные параметры для быстрой проверки (например, в CI)
+QUICK = {
+    "cache": {"cities": 50},
+    "hit_ratio": {"requests": 100},
+    "insert": {"rows": 1000},
+    "stats": {"sizes": (10_000,), "repeats": 20},
+    "startup": {"repeats": 2},
+    "server": {"clients": 2, "requests": 50},
+    "replay": {"cities": 50},
+}
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run(names: List[str], quick: bool = False) -> Dict:
+    """Выполнить сценарии ``names`` и вернуть результаты с описанием окружения."""
+    report = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "quick": quick,
+        },
+        "results": {},
+    }
+    for name in names:
+        print(f"{name}...", file=sys.stderr, flush=True)
+        start = time.perf_counter()
+        report["results"][name] = SCENARIOS[name](**(QUICK[name] if quick else {}))
+        report["results"][name]["elapsed_s"] = round(time.perf_counter() - start, 2)
+    return report
+
+
+def _metrics(tree: Dict, prefix: str = "") -> Iterator[Tuple[str, float]]:
+    """Числовые метрики вложенного словаря результатов: (путь, значение)."""
+    for key, value in tree.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            if key != "params":
+                yield from _metrics(value, path)
+        elif isinstance(value, (int, float)) and (key.endswith("_ms") or key.endswith("_per_s")):
+            yield path, value
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = 0.2) -> List[str]:
+    """
+    Метрики, ухудшившиеся больше чем на ``threshold`` (доля): задержки
+    (``*_ms``) выросли или пропускная способность (``*_per_s``) упала.
+    """
+    old = dict(_metrics(baseline.get("results", {})))
+    regressions = []
+    for path, value in _metrics(current.get("results", {})):
+        before = old.get(path)
+        if not before:
+            continue
+        change = (value - before) / before
+        if path.endswith("_per_s"):
+            change = -change
+        if change > threshold:
+            regressions.append(f"{path}: {before} -> {value} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Weather benchmark suite")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Сценарии через запятую: {', '.join(SCENARIOS)}")
+    parser.add_argument("--quick", action="store_true", help="Уменьшенные размеры")
+    parser.add_argument("--output", type=Path, help="Файл для JSON (по умолчанию stdout)")
+    parser.add_argument("--compare", type=Path, help="JSON прошлого запуска для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Допустимое ухудшение метрики при сравнении (доля)")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(unknown)}")
+
+    report = run(names, args.quick)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+    if args.compare:
+        regressions = compare(json.loads(args.compare.read_text(encoding="utf-8")), report, args.threshold)
+        for line in regressions:
+            print(f"ухудшение: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
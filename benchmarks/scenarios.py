@@ -0,0 +1,220 @@
+"""
+Сценарии бенчмарков :mod:`app.commands`, :mod:`app.cache` и :mod:`app.database`.
+
+Каждый сценарий — функция, возвращающая словарь с результатами, пригодный
+для записи в JSON (см. :mod:`benchmarks.run`). Задержки — в миллисекундах
+(ключи ``*_ms``), пропускная способность — в операциях в секунду
+(ключи ``*_per_s``).
+"""
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Sequence
+
+from app import cache, commands, database, geocoding
+from app.client import configure_client
+from benchmarks.bench_server import server_load
+from benchmarks.common import stub_api, summarize, temp_database
+from benchmarks.startup import startup
+from benchmarks.stub_server import StubServer, forecast_payload
+
+
+def _measure(func: Callable, args: Iterable) -> List[float]:
+    """Вызывает ``func`` для каждого аргумента и возвращает задержки в мс."""
+    latencies = []
+    for arg in args:
+        start = time.perf_counter()
+        func(arg)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def _repeat(func: Callable, repeats: int) -> Dict[str, float]:
+    return summarize(_measure(lambda _: func(), range(repeats)))
+
+
+def cache_cold_warm(cities: int = 200, latency: float = 0.005, error_rate: float = 0.0,
+                    hours: int = 24) -> Dict:
+    """Погода по городу: без кэша, из кэша в памяти и из постоянного кэша в SQLite."""
+    with temp_database(), StubServer(latency, error_rate, hours) as server, stub_api(server):
+        names = [f"city-{i}" for i in range(cities)]
+
+        cold = _measure(commands.weather_by_city, names)
+        cold_requests = server.requests
+        warm = _measure(commands.weather_by_city, names)
+        warm_requests = server.requests - cold_requests
+
+        # Память процесса пуста, данные есть только в SQLite
+        cache.clear_cache(persistent=False)
+        geocoding.clear_memo()
+        disk = _measure(commands.weather_by_city, names)
+
+        return {
+            "params": {"cities": cities, "latency_ms": latency * 1000, "error_rate": error_rate,
+                       "hours": hours},
+            "cold": summarize(cold),
+            "warm_memory": summarize(warm),
+            "warm_disk": summarize(disk),
+            "upstream_requests": {"cold": cold_requests, "warm": warm_requests},
+            "upstream_errors": server.errors,
+        }
+
+
+def hit_ratio_sweep(requests: int = 500, ratios: Sequence[float] = (0.0, 0.5, 0.9, 0.99),
+                    hot: int = 20, latency: float = 0.005, seed: int = 0) -> Dict:
+    """Средняя задержка и пропускная способность при разной доле попаданий в кэш."""
+    results = {}
+    with temp_database(), StubServer(latency) as server, stub_api(server):
+        for ratio in ratios:
+            cache.clear_cache()
+            geocoding.clear_memo()
+            hot_names = [f"hot-{i}" for i in range(hot)]
+            for name in hot_names:
+                commands.weather_by_city(name)
+
+            rnd = random.Random(seed)
+            names = [
+                hot_names[rnd.randrange(hot)] if rnd.random() < ratio else f"miss-{ratio}-{i}"
+                for i in range(requests)
+            ]
+            sources = []
+            start = time.perf_counter()
+            latencies = _measure(lambda name: sources.append(commands.weather_by_city(name)["source"]), names)
+            elapsed = time.perf_counter() - start
+
+            results[str(ratio)] = {
+                **summarize(latencies),
+                "observed_hit_ratio": round(sum(s != "api" for s in sources) / len(sources), 3),
+                "requests_per_s": round(requests / elapsed, 1),
+            }
+    return {"params": {"requests": requests, "hot": hot, "latency_ms": latency * 1000},
+            "ratios": results}
+
+
+def _weather(i: int, hours: int) -> dict:
+    data = forecast_payload(55.0 + i * 0.01, 37.0, hours)
+    data["current_weather"]["temperature"] = round(-10 + i % 200 / 10, 1)
+    return {"result": {"meta": {"name": f"city-{i}"}, "data": data}}
+
+
+def history_insert(rows: int = 5000, unique: float = 0.1, batch_size: int = 100,
+                   hours: int = 24) -> Dict:
+    """Скорость записи истории: по одной записи и с отложенной пакетной записью."""
+    payloads = [_weather(i, hours) for i in range(max(1, int(rows * unique)))]
+    stream = [payloads[i % len(payloads)] for i in range(rows)]
+    results = {"params": {"rows": rows, "unique": unique, "batch_size": batch_size, "hours": hours}}
+
+    for mode in ("single", "write_behind"):
+        with temp_database() as path:
+            if mode == "write_behind":
+                database.enable_write_behind(batch_size=batch_size)
+            start = time.perf_counter()
+            for weather in stream:
+                cache.save_weather_to_history(weather, source="api")
+            database.flush_history()
+            elapsed = time.perf_counter() - start
+
+            database._conn().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            results[mode] = {
+                "rows_per_s": round(rows / elapsed, 1),
+                "db_size_mb": round(path.stat().st_size / 2 ** 20, 2),
+            }
+    return results
+
+
+def fill_history(rows: int, cities: int = 500, days: int = 365, seed: int = 0) -> None:
+    """Заполнить текущую базу синтетической историей за ``days`` дней."""
+    rnd = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    step = days * 86400 / rows
+    batch = []
+    for i in range(rows):
+        city = i % cities
+        requested_at = (start + timedelta(seconds=i * step)).strftime("%Y-%m-%d %H:%M:%S")
+        # Порядок колонок — как в database._INSERT_HISTORY
+        row = (
+            f"city-{city}", 40 + city % 30, 30 + city % 60, round(rnd.uniform(-30, 30), 1), None,
+            rnd.randint(30, 100), rnd.randint(990, 1030), round(rnd.uniform(0, 15), 1),
+            rnd.randint(0, 359), None, rnd.choice((0, 1, 2, 3)), 1, None, None, None,
+            "api", "open-meteo", None, requested_at
+        )
+        batch.append((row, None))
+        if len(batch) >= 10000:
+            database.save_many_to_history(batch)
+            batch = []
+    if batch:
+        database.save_many_to_history(batch)
+
+
+def stats_latency(sizes: Sequence[int] = (10_000, 100_000), repeats: int = 50) -> Dict:
+    """Задержка статистики и списков истории на больших синтетических базах."""
+    results = {}
+    for size in sizes:
+        with temp_database():
+            start = time.perf_counter()
+            fill_history(size)
+            fill_time = time.perf_counter() - start
+
+            conn = database._conn()
+            results[str(size)] = {
+                "fill_rows_per_s": round(size / fill_time, 1),
+                "stats_all": _repeat(database.get_history_stats, repeats),
+                "stats_city": _repeat(lambda: database.get_history_stats(city="city-7"), repeats),
+                "stats_period": _repeat(
+                    lambda: database.get_history_stats(since="2025-03-01", until="2025-03-31"), repeats),
+                # Прежний способ — агрегаты по всей таблице, для сравнения
+                "stats_full_scan": _repeat(lambda: conn.execute("""
+                    SELECT COUNT(*), COUNT(DISTINCT city), AVG(temperature),
+                           MIN(temperature), MAX(temperature) FROM history
+                """).fetchone(), max(1, repeats // 10)),
+                "history_page": _repeat(lambda: database.get_history_page(limit=20), repeats),
+                "history_window_deep": _repeat(
+                    lambda: database.get_history_window(offset=size - 20, limit=20,
+                                                        order_by="temperature"), repeats),
+            }
+    return {"params": {"repeats": repeats}, "sizes": results}
+
+
+def replay_path(cities: int = 200, hours: int = 168, latency_scale: float = 0.0) -> Dict:
+    """
+    Весь путь команд на записанных ответах (см. :mod:`app.replay`): сначала
+    ответы заглушки записываются, затем воспроизводятся без сети.
+    """
+    names = [f"city-{i}" for i in range(cities)]
+    with tempfile.TemporaryDirectory() as tmp, temp_database(), StubServer(hours=hours) as server, \
+            stub_api(server):
+        store = Path(tmp) / "responses.db"
+        with temp_database():
+            configure_client(record=str(store))
+            for name in names:
+                commands.weather_by_city(name)
+        recorded_requests = server.requests
+
+        with temp_database():
+            cache.clear_cache()
+            geocoding.clear_memo()
+            configure_client(replay=str(store), replay_latency=latency_scale)
+            cold = _measure(commands.weather_by_city, names)
+            warm = _measure(commands.weather_by_city, names)
+            configure_client()
+
+        return {
+            "params": {"cities": cities, "hours": hours, "latency_scale": latency_scale},
+            "store_kb": round(store.stat().st_size / 1024, 1),
+            "cold": summarize(cold),
+            "warm_memory": summarize(warm),
+            "upstream_requests": server.requests - recorded_requests,
+        }
+
+
+SCENARIOS = {
+    "cache": cache_cold_warm,
+    "hit_ratio": hit_ratio_sweep,
+    "insert": history_insert,
+    "stats": stats_latency,
+    "startup": startup,
+    "server": server_load,
+    "replay": replay_path,
+}
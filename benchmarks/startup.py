@@ -0,0 +1,99 @@
+"""
+Время холодного запуска: импорт точек входа по данным ``python -X importtime``.
+
+Каждая точка входа импортируется в отдельном процессе несколько раз,
+берётся медиана. Сценарий также проверяет, что ``requests`` не
+загружается при запуске, и сравнивает время с бюджетом.
+
+Запуск::
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --repeats 10
+
+Код завершения 1, если какая-либо точка входа не укладывается в бюджет.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Модуль -> бюджет на импорт со всеми зависимостями, мс
+BUDGET_MS = {
+    "main": 50,
+    "app.commands": 80,
+    "gui": 120,
+}
+
+# Модули, которые не должны импортироваться при запуске
+DEFERRED = ("requests", "urllib3")
+
+
+def import_times(module: str) -> Tuple[List[Tuple[str, int, int]], float]:
+    """
+    Импортировать ``module`` в новом процессе с ``-X importtime``
+
+    Returns:
+        Строки (модуль, собственное время, время с зависимостями) в мкс
+        и полное время процесса в мс
+    """
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, cwd=ROOT, check=True)
+    process_ms = (time.perf_counter() - start) * 1000
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(own), int(cumulative)))
+    return rows, process_ms
+
+
+def startup(repeats: int = 5, top: int = 5) -> Dict:
+    """Время импорта точек входа, загрузка отложенных модулей и бюджет."""
+    results = {}
+    for module, budget in BUDGET_MS.items():
+        import_ms, process_ms = [], []
+        for _ in range(repeats):
+            rows, elapsed = import_times(module)
+            import_ms.append(next(c for name, _, c in rows if name == module) / 1000)
+            process_ms.append(elapsed)
+        loaded = {name for name, _, _ in rows}
+        median = statistics.median(import_ms)
+        results[module] = {
+            "import_ms": round(median, 2),
+            "process_ms": round(statistics.median(process_ms), 2),
+            "budget_ms": budget,
+            "within_budget": median <= budget,
+            "deferred_loaded": sorted(name for name in DEFERRED if name in loaded),
+            "slowest": [f"{name}: {own / 1000:.1f}"
+                        for name, own, _ in sorted(rows, key=lambda r: -r[1])[:top]],
+        }
+    return {"params": {"repeats": repeats}, "modules": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time benchmark")
+    parser.add_argument("--repeats", type=int, default=5, help="Запусков на модуль")
+    args = parser.parse_args()
+
+    report = startup(args.repeats)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    failed = [f"{module}: {r['import_ms']} мс > {r['budget_ms']} мс"
+              for module, r in report["modules"].items() if not r["within_budget"]]
+    failed += [f"{module}: при запуске загружены {', '.join(r['deferred_loaded'])}"
+               for module, r in report["modules"].items() if r["deferred_loaded"]]
+    for line in failed:
+        print(f"превышение: {line}", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
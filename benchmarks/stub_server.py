@@ -0,0 +1,159 @@
+"""
+Локальный HTTP-сервер, имитирующий эндпоинты open-meteo.
+
+Отдаёт заранее подготовленные ответы геокодирования (``/v1/search``)
+и прогноза (``/v1/forecast``) по HTTP/1.1 с поддержкой keep-alive.
+Задержка, доля ответов с ошибкой и размер прогноза настраиваются.
+"""
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def geocode_payload(name: str) -> dict:
+    """Ответ геокодера для города ``name``.
+
+    Координаты выводятся из названия, чтобы разные города
+    получали разные точки прогноза.
+    """
+    h = zlib.crc32(name.encode("utf-8"))
+    return {
+        "results": [{
+            "name": name,
+            "latitude": round((h % 18000) / 100 - 90, 4),
+            "longitude": round((h // 18000 % 36000) / 100 - 180, 4),
+            "country": "Россия",
+            "admin1": "Москва",
+        }]
+    }
+
+
+def forecast_payload(lat: float, lon: float, hours: int = 24) -> dict:
+    """Ответ прогноза для одной точки.
+
+    Args:
+        hours: Число часов почасового прогноза — определяет размер ответа.
+    """
+    times = [f"2025-01-{1 + h // 24:02d}T{h % 24:02d}:00" for h in range(hours)]
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "timezone": "Europe/Moscow",
+        "utc_offset_seconds": 10800,
+        "current_weather": {
+            "time": "2025-01-01T12:00",
+            "temperature": -5.0,
+            "windspeed": 3.6,
+            "winddirection": 180,
+            "weathercode": 3,
+            "is_day": 1,
+        },
+        "hourly": {
+            "time": times,
+            "temperature_2m": [-5.0] * hours,
+            "relative_humidity_2m": [80] * hours,
+            "pressure_msl": [1015.0] * hours,
+            "weather_code": [3] * hours,
+        },
+        "daily": {
+            "time": ["2025-01-01"],
+            "weather_code": [3],
+            "temperature_2m_max": [-2.0],
+            "temperature_2m_min": [-8.0],
+            "precipitation_sum": [0.0],
+        },
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов заглушки."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            fail = server.error_rate and server.random.random() < server.error_rate
+        if server.latency:
+            time.sleep(server.latency)
+
+        if fail:
+            with server.lock:
+                server.errors += 1
+            self.send_error(503)
+            return
+
+        if url.path.endswith("/search"):
+            body = geocode_payload(query.get("name", ""))
+        elif url.path.endswith("/forecast"):
+            lats = [float(x) for x in query.get("latitude", "0").split(",")]
+            lons = [float(x) for x in query.get("longitude", "0").split(",")]
+            points = [forecast_payload(a, b, server.hours) for a, b in zip(lats, lons)]
+            body = points[0] if len(points) == 1 else points
+        else:
+            self.send_error(404)
+            return
+
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer:
+    """Сервер-заглушка, работающий в фоновом потоке.
+
+    Args:
+        latency: Искусственная задержка ответа, сек.
+        error_rate: Доля запросов, на которые отвечается 503.
+        hours: Число часов в почасовом прогнозе (размер ответа).
+        seed: Начальное значение генератора ошибок, чтобы прогоны совпадали.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, hours: int = 24, seed: int = 0):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = latency
+        self.httpd.error_rate = error_rate
+        self.httpd.hours = hours
+        self.httpd.random = random.Random(seed)
+        self.httpd.lock = threading.Lock()
+        self.httpd.requests = 0
+        self.httpd.errors = 0
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def requests(self) -> int:
+        """Сколько запросов получил сервер (включая ответы с ошибкой)."""
+        return self.httpd.requests
+
+    @property
+    def errors(self) -> int:
+        """Сколько запросов получили ответ 503."""
+        return self.httpd.errors
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
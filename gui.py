@@ -1,11 +1,20 @@
 """Графический интерфейс для получения погоды по городу или координатам."""
+import queue
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, messagebox
-from app.commands import weather_by_city, weather_by_coords, get_history, get_statistics
-from app.database import init_db, get_recent_history, clear_history
+from app.commands import (
+    weather_by_city, weather_by_coords, get_history_page, get_history_window, count_history, get_statistics
+)
+from app.database import init_db, clear_history, HISTORY_SORT_COLUMNS
 import json
 from datetime import datetime
 
+# Сколько запросов погоды может выполняться одновременно
+FETCH_WORKERS = 4
+# Как часто окно проверяет готовые результаты, мс
+POLL_INTERVAL = 50
+
 
 def format_weather(result):
     """Форматирует результат запроса погоды в удобный текст для отображения."""
@@ -53,22 +62,182 @@ def format_weather(result):
     return "\n".join(lines)
 
 
-def format_history_entry(entry: dict) -> str:
-    """Форматирует одну запись истории"""
-    city = entry.get('city') or f"{entry.get('latitude', 0):.2f}, {entry.get('longitude', 0):.2f}"
-    temp = f"{entry['temperature']:.1f}°C" if entry.get('temperature') else "—"
-    wind = f"{entry['windspeed']} км/ч" if entry.get('windspeed') else "—"
+def history_row_values(entry: dict) -> tuple:
+    """Значения колонок таблицы истории для одной записи"""
+    city = entry.get('city') or f"{entry.get('latitude') or 0:.2f}, {entry.get('longitude') or 0:.2f}"
+    temp = f"{entry['temperature']:.1f}°C" if entry.get('temperature') is not None else "—"
+    wind = f"{entry['windspeed']} км/ч" if entry.get('windspeed') is not None else "—"
     
     # Форматируем время
-    time_str = entry.get('requested_at', '')
+    time_str = entry.get('requested_at') or ''
     if time_str:
         try:
             dt = datetime.fromisoformat(time_str.replace('Z', '+00:00'))
-            time_str = dt.strftime('%H:%M %d.%m')
-        except:
+            time_str = dt.strftime('%H:%M %d.%m.%Y')
+        except ValueError:
             pass
     
-    return f"{time_str:15} | {city:20} | {temp:>8} | ветер {wind:>10}"
+    return (time_str, city, temp, wind, entry.get('source') or '')
+
+
+class HistoryView(ttk.Frame):
+    """
+    Таблица истории, которая держит в Treeview только видимые строки.
+    
+    Полоса прокрутки показывает положение окна во всём (отфильтрованном)
+    списке, и при прокрутке из базы запрашивается только новое окно.
+    Сортировка и фильтр по городу выполняются запросом к базе, а новые
+    записи добавляются сверху без перезагрузки списка.
+    """
+    
+    COLUMNS = (
+        ("requested_at", "Время (UTC)", 130),
+        ("city", "Место", 200),
+        ("temperature", "Темп.", 80),
+        ("windspeed", "Ветер", 90),
+        ("source", "Источник", 80),
+    )
+    
+    def __init__(self, master, rows: int = 20):
+        super().__init__(master)
+        self.rows = rows
+        self.offset = 0
+        self.total = 0
+        self.order_by = "id"
+        self.descending = True
+        self.city = None
+        self._last_id = 0
+        self._load_scheduled = False
+        
+        self.tree = ttk.Treeview(self, columns=[name for name, _, _ in self.COLUMNS],
+                                 show="headings", height=rows, selectmode="browse")
+        for name, title, width in self.COLUMNS:
+            self.tree.column(name, width=width, anchor=tk.W)
+            self.tree.heading(name, text=title)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll_by(-3 if e.delta > 0 else 3))
+        self.tree.bind("<Button-4>", lambda e: self.scroll_by(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_by(3))
+        self.tree.bind("<Prior>", lambda e: self.scroll_by(-self.rows))
+        self.tree.bind("<Next>", lambda e: self.scroll_by(self.rows))
+        self._update_headings()
+    
+    def _sort_column(self):
+        # Сортировка по времени запроса — это сортировка по id записи
+        return "requested_at" if self.order_by == "id" else self.order_by
+    
+    def _update_headings(self):
+        for name, title, _ in self.COLUMNS:
+            if name == self._sort_column():
+                title += " ▼" if self.descending else " ▲"
+            command = (lambda n=name: self.sort(n)) if name in HISTORY_SORT_COLUMNS else ""
+            self.tree.heading(name, text=title, command=command)
+    
+    def sort(self, column: str):
+        """Сортировать по колонке; повторный выбор меняет направление"""
+        column = "id" if column == "requested_at" else column
+        if column == self.order_by:
+            self.descending = not self.descending
+        else:
+            self.order_by, self.descending = column, column == "id"
+        self._update_headings()
+        self.offset = 0
+        self.load()
+    
+    def set_filter(self, city=None):
+        """Показывать только записи города (None — все)"""
+        self.city = city or None
+        self.refresh()
+    
+    def set_rows(self, rows: int):
+        """Изменить число видимых строк"""
+        self.rows = max(1, rows)
+        self.tree.configure(height=self.rows)
+        self.scroll_to(self.offset)
+        self.load()
+    
+    def refresh(self):
+        """Перечитать число записей и текущее окно"""
+        self.total = count_history(city=self.city)
+        newest = get_history_page(limit=1, city=self.city)
+        self._last_id = newest[0]["id"] if newest else 0
+        self.offset = min(self.offset, max(0, self.total - self.rows))
+        self.load()
+    
+    def load(self):
+        """Загрузить из базы строки текущего окна"""
+        self._load_scheduled = False
+        entries = get_history_window(self.offset, self.rows, self.order_by, self.descending, city=self.city)
+        self.tree.delete(*self.tree.get_children())
+        for entry in entries:
+            self.tree.insert("", tk.END, iid=str(entry["id"]), values=history_row_values(entry))
+        newest = max((entry["id"] for entry in entries), default=0)
+        if newest > self._last_id:
+            # В окно попали записи, сохранённые после последнего add_new:
+            # add_new не должен вставлять их второй раз
+            self._last_id = newest
+            self.total = count_history(city=self.city)
+        self._update_scrollbar()
+    
+    def add_new(self):
+        """Добавить записи, сохранённые после последней загрузки"""
+        entries = get_history_page(after_id=self._last_id, limit=self.rows + 1, city=self.city)
+        if not entries:
+            return
+        if len(entries) > self.rows:
+            self.refresh()
+            return
+        
+        self._last_id = entries[0]["id"]
+        self.total += len(entries)
+        if self.order_by != "id" or not self.descending:
+            # В другой сортировке место новых строк известно только базе;
+            # окно обновится при следующей прокрутке
+            self._update_scrollbar()
+        elif self.offset == 0:
+            for entry in reversed(entries):
+                if not self.tree.exists(str(entry["id"])):
+                    self.tree.insert("", 0, iid=str(entry["id"]), values=history_row_values(entry))
+            for iid in self.tree.get_children()[self.rows:]:
+                self.tree.delete(iid)
+            self._update_scrollbar()
+        else:
+            # Новые строки выше окна: сдвигаем окно, чтобы видимые строки остались на месте
+            self.offset += len(entries)
+            self._update_scrollbar()
+    
+    def scroll_to(self, offset: int):
+        """Перейти к окну, начинающемуся с записи offset"""
+        offset = max(0, min(int(offset), self.total - self.rows))
+        if offset != self.offset:
+            self.offset = offset
+            # Перетаскивание ползунка присылает много событий: загружаем
+            # окно один раз, когда главный цикл освободится
+            if not self._load_scheduled:
+                self._load_scheduled = True
+                self.after_idle(self.load)
+    
+    def scroll_by(self, rows: int):
+        self.scroll_to(self.offset + rows)
+    
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self.scroll_to(float(value) * self.total)
+        elif unit == "pages":
+            self.scroll_by(int(value) * self.rows)
+        else:
+            self.scroll_by(int(value))
+    
+    def _update_scrollbar(self):
+        if self.total <= 0:
+            self.scrollbar.set(0, 1)
+            return
+        shown = len(self.tree.get_children())
+        self.scrollbar.set(self.offset / self.total, min(1.0, (self.offset + shown) / self.total))
 
 
 class WeatherApp(tk.Tk):
@@ -77,8 +246,15 @@ class WeatherApp(tk.Tk):
         self.title("Погода")
         self.geometry("700x600")
         
-        # Инициализируем БД
-        init_db()
+        # Запросы погоды выполняются в фоновых потоках, а готовые результаты
+        # передаются окну через очередь, которую главный цикл Tk опрашивает
+        # через after(): виджеты Tk трогает только главный поток
+        self._executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="weather-gui")
+        self._results = queue.Queue()
+        self._in_flight = {}        # future -> номер запроса
+        self._generation = 0        # номер последнего запроса; результаты старых не показываются
+        self._polling = False
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
         
         # Создаем notebook (вкладки)
         self.notebook = ttk.Notebook(self)
@@ -98,6 +274,25 @@ class WeatherApp(tk.Tk):
         self.stats_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.stats_frame, text="Статистика")
         self.create_stats_widgets()
+        
+        # База, история и статистика загружаются, когда окно уже показано:
+        # after_idle мог выполниться раньше, чем окно отобразится
+        self.bind("<Map>", self._on_first_map)
+    
+    def _on_first_map(self, event):
+        """Запустить загрузку данных после первого показа окна (один раз)"""
+        # Привязка корневого окна срабатывает и для Map дочерних виджетов
+        if event.widget is not self:
+            return
+        self.unbind("<Map>")
+        self.update_idletasks()
+        self.after(1, self._load_initial)
+    
+    def _load_initial(self):
+        """Подготовить базу и показать историю и статистику"""
+        init_db()
+        self.refresh_history()
+        self.refresh_stats()
     
     def create_weather_widgets(self):
         """Создает виджеты для вкладки погоды"""
@@ -198,28 +393,30 @@ class WeatherApp(tk.Tk):
         control_frame = ttk.Frame(frm)
         control_frame.pack(fill=tk.X, pady=(0, 10))
         
-        ttk.Label(control_frame, text="Количество записей:").pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Label(control_frame, text="Строк на экране:").pack(side=tk.LEFT, padx=(0, 5))
         self.history_limit_var = tk.IntVar(value=20)
         ttk.Spinbox(control_frame, from_=5, to=100, textvariable=self.history_limit_var,
-                   width=8, command=self.refresh_history).pack(side=tk.LEFT, padx=(0, 15))
+                   width=8, command=self.resize_history).pack(side=tk.LEFT, padx=(0, 15))
+        
+        ttk.Label(control_frame, text="Город:").pack(side=tk.LEFT, padx=(0, 5))
+        self.history_city_var = tk.StringVar()
+        city_entry = ttk.Entry(control_frame, textvariable=self.history_city_var, width=15)
+        city_entry.pack(side=tk.LEFT, padx=(0, 5))
+        city_entry.bind("<Return>", lambda e: self.filter_history())
+        ttk.Button(control_frame, text="Фильтр", command=self.filter_history).pack(side=tk.LEFT, padx=5)
         
         ttk.Button(control_frame, text="Обновить", command=self.refresh_history).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="Очистить историю", command=self.clear_history).pack(side=tk.LEFT, padx=5)
         
-        # Текст с историей
+        # Таблица истории
         history_frame = ttk.LabelFrame(frm, text="История запросов", padding=10)
         history_frame.pack(fill=tk.BOTH, expand=True)
         
-        self.history_text = tk.Text(history_frame, height=20, wrap=tk.WORD, 
-                                  font=('Consolas', 9), bg='#f8f9fa')
-        scrollbar = ttk.Scrollbar(history_frame, orient="vertical", command=self.history_text.yview)
-        self.history_text.configure(yscrollcommand=scrollbar.set)
+        self.history_view = HistoryView(history_frame, rows=self.history_limit_var.get())
+        self.history_view.pack(fill=tk.BOTH, expand=True)
         
-        self.history_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        # Загружаем историю при открытии
-        self.refresh_history()
+        self.history_total_var = tk.StringVar(value="Загрузка...")
+        ttk.Label(frm, textvariable=self.history_total_var, foreground="gray").pack(anchor=tk.W, pady=(5, 0))
     
     def create_stats_widgets(self):
         """Создает виджеты для вкладки статистики"""
@@ -239,66 +436,123 @@ class WeatherApp(tk.Tk):
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
         ttk.Button(frm, text="Обновить статистику", command=self.refresh_stats).pack(pady=10)
-        
-        self.refresh_stats()
     
     def get_weather(self):
-        """Получить погоду"""
+        """Получить погоду (запрос выполняется в фоне, окно не блокируется)"""
         mode = self.mode_var.get()
-        self.status_var.set("Загрузка...")
-        self.output_text.delete(1.0, tk.END)
         
+        if mode == "city":
+            city = self.city_entry_var.get().strip()
+            if not city:
+                messagebox.showwarning("Ошибка", "Введите название города")
+                self.status_var.set("Ошибка: введите город")
+                return
+            fetch, args = weather_by_city, (city,)
+        else:
+            try:
+                lat = float(self.lat_var.get())
+                lon = float(self.lon_var.get())
+            except ValueError:
+                messagebox.showwarning("Ошибка", "Введите корректные числа для координат")
+                self.status_var.set("Ошибка: некорректные координаты")
+                return
+            fetch, args = weather_by_coords, (lat, lon)
+        
+        # Новый запрос делает прежние устаревшими: ещё не начатые отменяются,
+        # а результаты уже выполняющихся будут отброшены
+        self._generation += 1
+        for future in self._in_flight:
+            future.cancel()
+        
+        generation = self._generation
+        future = self._executor.submit(fetch, *args)
+        self._in_flight[future] = generation
+        future.add_done_callback(self._results.put)
+        
+        self.output_text.delete(1.0, tk.END)
+        self._show_loading()
+        if not self._polling:
+            self._polling = True
+            self.after(POLL_INTERVAL, self._poll_results)
+    
+    def _show_loading(self):
+        """Показать статус загрузки с числом выполняющихся запросов"""
+        running = sum(1 for future in self._in_flight if not future.cancelled())
+        self.status_var.set("Загрузка..." if running <= 1 else f"Загрузка... (запросов: {running})")
+    
+    def _poll_results(self):
+        """Забрать готовые результаты из очереди (вызывается через after)"""
         try:
-            if mode == "city":
-                city = self.city_entry_var.get().strip()
-                if not city:
-                    messagebox.showwarning("Ошибка", "Введите название города")
-                    self.status_var.set("Ошибка: введите город")
-                    return
-                result = weather_by_city(city)
-            else:
+            updated = False
+            while True:
                 try:
-                    lat = float(self.lat_var.get())
-                    lon = float(self.lon_var.get())
-                except ValueError:
-                    messagebox.showwarning("Ошибка", "Введите корректные числа для координат")
-                    self.status_var.set("Ошибка: некорректные координаты")
-                    return
-                result = weather_by_coords(lat, lon)
-            
-            # Форматируем вывод
-            formatted = format_weather(result)
-            self.output_text.insert(tk.END, formatted)
-            self.status_var.set(f"Готово. Источник: {result.get('source', 'unknown')}")
+                    future = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                generation = self._in_flight.pop(future, None)
+                if future.cancelled():
+                    continue
+                # Результат устаревшего запроса всё равно сохранён в кэш и историю
+                updated = True
+                if generation == self._generation:
+                    self._show_result(future)
             
-            # Обновляем историю и статистику
-            self.refresh_history()
-            self.refresh_stats()
+            if updated:
+                self.add_new_history()
+                self.refresh_stats()
             
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось получить данные: {e}")
-            self.status_var.set("Ошибка")
-            self.output_text.insert(tk.END, f"Ошибка: {str(e)}")
+            if any(g == self._generation for g in self._in_flight.values()):
+                self._show_loading()
+        finally:
+            # Опрос продолжается, даже если показ результата упал с ошибкой
+            if self._in_flight:
+                self.after(POLL_INTERVAL, self._poll_results)
+            else:
+                self._polling = False
     
-    def refresh_history(self):
-        """Обновить историю"""
-        limit = self.history_limit_var.get()
-        history = get_history(limit)
-        
-        self.history_text.delete(1.0, tk.END)
-        
-        if not history:
-            self.history_text.insert(tk.END, "История запросов пуста.\n")
+    def _show_result(self, future):
+        """Вывести результат последнего запроса"""
+        self.output_text.delete(1.0, tk.END)
+        error = future.exception()
+        if error is not None:
+            messagebox.showerror("Ошибка", f"Не удалось получить данные: {error}")
+            self.status_var.set("Ошибка")
+            self.output_text.insert(tk.END, f"Ошибка: {str(error)}")
             return
         
-        # Заголовок
-        self.history_text.insert(tk.END, "Последние запросы погоды:\n")
-        self.history_text.insert(tk.END, "=" * 70 + "\n\n")
-        
-        # Записи
-        for i, entry in enumerate(history, 1):
-            formatted = format_history_entry(entry)
-            self.history_text.insert(tk.END, f"{i:2}. {formatted}\n")
+        result = future.result()
+        self.output_text.insert(tk.END, format_weather(result))
+        self.status_var.set(f"Готово. Источник: {result.get('source', 'unknown')}")
+    
+    def on_close(self):
+        """Закрыть окно, не дожидаясь выполняющихся запросов"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.destroy()
+    
+    def refresh_history(self):
+        """Перечитать историю"""
+        self.history_view.refresh()
+        self._show_history_total()
+    
+    def add_new_history(self):
+        """Добавить в таблицу записи, сохранённые после последнего обновления"""
+        self.history_view.add_new()
+        self._show_history_total()
+    
+    def filter_history(self):
+        """Показать историю только по введённому городу (пустое поле — всю)"""
+        self.history_view.set_filter(self.history_city_var.get().strip())
+        self._show_history_total()
+    
+    def resize_history(self):
+        """Изменить число строк в таблице истории"""
+        try:
+            self.history_view.set_rows(self.history_limit_var.get())
+        except tk.TclError:
+            pass
+    
+    def _show_history_total(self):
+        self.history_total_var.set(f"Всего записей: {self.history_view.total}")
     
     def refresh_stats(self):
         """Обновить статистику"""
@@ -1,14 +1,55 @@
 #!/usr/bin/env python3
 """
 Точка входа для консольной версии приложения погоды.
+
+Примеры::
+
+    python main.py --city Moscow
+    python main.py --coords 55.75 37.62
+    python main.py --batch cities.txt --workers 8 > weather.ndjson
+    cat cities.txt | python main.py --batch -
 """
+import json
+import sys
+
 from app.database import init_db
 
-if __name__ == "__main__":
+
+def main(argv=None) -> int:
+    """Выполнить команду CLI и вернуть код завершения."""
+    argv = sys.argv[1:] if argv is None else argv
     # Инициализируем БД
     init_db()
-    print("База данных инициализирована.")
-    
-    # Здесь может быть код консольного интерфейса
-    print("Запустите gui.py для графического интерфейса:")
-    print("python gui.py")
\ No newline at end of file
+    if not argv:
+        print("База данных инициализирована.")
+        print("Запустите gui.py для графического интерфейса:")
+        print("python gui.py")
+        return 0
+
+    from app import commands, database
+    from app.parser import build_parser
+    args = build_parser().parse_args(argv)
+
+    if args.batch:
+        from app.batch import read_locations, run_batch
+        stream = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+        # История пишется пачками в фоне, а не транзакцией на каждую локацию
+        database.enable_write_behind()
+        try:
+            summary = run_batch(read_locations(stream), workers=args.workers)
+        finally:
+            database.disable_write_behind()
+            if stream is not sys.stdin:
+                stream.close()
+        return 1 if summary["failed"] else 0
+
+    if args.city:
+        response = commands.weather_by_city(args.city)
+    else:
+        response = commands.weather_by_coords(*args.coords)
+    print(json.dumps(response, ensure_ascii=False, indent=2))
+    return 1 if "error" in response["result"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,6 +12,9 @@ if __name__ == "__main__":
     if db_path.exists():
         os.remove(db_path)
         print("✅ Старая БД удалена")
+    # Журнал WAL старой БД не должен достаться новой
+    for suffix in ("-wal", "-shm"):
+        Path(f"{db_path}{suffix}").unlink(missing_ok=True)
     
     # Создаем новую
     init_db()
@@ -26,5 +29,21 @@ if __name__ == "__main__":
     print("  - winddirection (INTEGER)")
     print("  - source (TEXT)")
     print("  - api_source (TEXT)")
-    print("  - raw_data (TEXT)")
-    print("  - requested_at (TIMESTAMP)")
\ No newline at end of file
+    print("  - raw_hash (TEXT) -> raw_payloads.hash")
+    print("  - requested_at (TIMESTAMP)")
+    print("\nСтруктура таблицы cache:")
+    print("  - key (TEXT PRIMARY KEY)")
+    print("  - data (TEXT)")
+    print("  - fetched_at (TIMESTAMP)")
+    print("\nСтруктура таблицы raw_payloads:")
+    print("  - hash (TEXT PRIMARY KEY)")
+    print("  - data (BLOB, JSON ответа, сжатый zlib)")
+    print("\nСтруктура таблиц forecast_hourly / forecast_daily:")
+    print("  - latitude, longitude, time / day (PRIMARY KEY)")
+    print("  - temperature, humidity, pressure, weather_code")
+    print("  - weather_code, temperature_max, temperature_min, precipitation_sum")
+    print("\nСтруктура таблицы geocode:")
+    print("  - query, language (PRIMARY KEY)")
+    print("  - found (INTEGER)")
+    print("  - name, latitude, longitude, country, admin1")
+    print("  - created_at (TIMESTAMP)")
\ No newline at end of file
@@ -2,18 +2,22 @@
 import sqlite3
 from pathlib import Path
 
+from app.database import get_history_page, init_db
+
 db_path = Path("app/weather_data.db")
 if not db_path.exists():
     print("База не найдена! Сделай пару запросов погоды сначала.")
     exit()
 
+# Доводим схему до текущей версии (таблица cache, индексы истории)
+init_db()
+
 conn = sqlite3.connect(db_path)
 conn.row_factory = sqlite3.Row
 cur = conn.cursor()
 
 print("ИСТОРИЯ ПОГОДЫ (последние 15 запросов)".center(90, "="))
-cur.execute("SELECT * FROM history ORDER BY requested_at DESC LIMIT 15")
-for row in cur.fetchall():
+for row in get_history_page(limit=15):
     city = row["city"] or f"{row['latitude']}, {row['longitude']}"
     temp = f"{row['temperature']:.1f}°C" if row["temperature"] else "—"
     wind = f"{row['windspeed']} км/ч" if row["windspeed"] else "—"
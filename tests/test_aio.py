@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import aio
+
+
+class TestAio(unittest.TestCase):
+    """Тесты асинхронных вариантов команд"""
+
+    def tearDown(self):
+        aio.set_concurrency(aio.DEFAULT_CONCURRENCY)
+
+    @patch('app.commands.weather_by_coords')
+    @patch('app.commands.weather_by_city')
+    def test_weather_many_keeps_order(self, mock_city, mock_coords):
+        """Тест что результаты возвращаются в порядке запросов"""
+        mock_city.side_effect = lambda city: {"source": "api", "result": city}
+        mock_coords.side_effect = lambda lat, lon: {"source": "api", "result": (lat, lon)}
+
+        results = asyncio.run(aio.async_weather_many(cities=["A", "B"], points=[(1.0, 2.0)]))
+
+        self.assertEqual([r["result"] for r in results], ["A", "B", (1.0, 2.0)])
+
+    @patch('app.commands.weather_by_city')
+    def test_weather_many_error(self, mock_city):
+        """Тест что исключение одного запроса не прерывает остальные"""
+        mock_city.side_effect = lambda city: 1 / 0 if city == "bad" else {"source": "api"}
+
+        results = asyncio.run(aio.async_weather_many(cities=["bad", "good"]))
+
+        self.assertEqual(results[0]["source"], "error")
+        self.assertEqual(results[1]["source"], "api")
+
+    @patch('app.commands.weather_by_city')
+    def test_concurrency_limit(self, mock_city):
+        """Тест что одновременно выполняется не больше заданного числа запросов"""
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0}
+
+        def slow(city):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(0.01)
+            with lock:
+                state["active"] -= 1
+            return {"source": "api"}
+
+        mock_city.side_effect = slow
+        aio.set_concurrency(3)
+
+        asyncio.run(aio.async_weather_many(cities=[str(i) for i in range(12)]))
+
+        self.assertLessEqual(state["peak"], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
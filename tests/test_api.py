@@ -5,15 +5,16 @@ import os
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app.api import geocode_city, get_weather_by_coordinates, get_weather_by_city
+from app import api
+from app.api import geocode_city, get_weather_by_coordinates, get_weather_by_city, get_weather_by_coordinates_batch
 import requests
 
 
 class TestWeatherAPI(unittest.TestCase):
     """Тесты для модуля работы с API погоды"""
     
-    @patch('app.api.requests.get')
-    def test_geocode_city_success(self, mock_get):
+    @patch('app.api.get_client')
+    def test_geocode_city_success(self, mock_client):
         """Тест успешного геокодирования города"""
         mock_response = Mock()
         mock_response.status_code = 200
@@ -27,7 +28,7 @@ class TestWeatherAPI(unittest.TestCase):
                 }
             ]
         }
-        mock_get.return_value = mock_response
+        mock_client.return_value.get.return_value = mock_response
         
         result = geocode_city("Moscow")
         
@@ -36,28 +37,30 @@ class TestWeatherAPI(unittest.TestCase):
         self.assertEqual(result["longitude"], 37.6173)
         self.assertEqual(result["country"], "Russia")
     
-    @patch('app.api.requests.get')
-    def test_geocode_city_not_found(self, mock_get):
+    @patch('app.api.get_client')
+    def test_geocode_city_not_found(self, mock_client):
         """Тест геокодирования несуществующего города"""
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.json.return_value = {"results": []}
-        mock_get.return_value = mock_response
+        mock_client.return_value.get.return_value = mock_response
         
         result = geocode_city("UnknownCity")
         
         self.assertIsNone(result)
     
-    @patch('app.api.requests.get')
-    def test_geocode_city_network_error(self, mock_get):
+    @patch('app.api.get_client')
+    def test_geocode_city_network_error(self, mock_client):
         """Тест сетевой ошибки при геокодировании"""
-        mock_get.side_effect = requests.RequestException("Network error")
+        mock_client.return_value.get.side_effect = requests.RequestException("Network error")
         
+        # search_city пробрасывает ошибку, geocode_city превращает её в None
         with self.assertRaises(requests.RequestException):
-            geocode_city("Moscow")
+            api.search_city("Moscow")
+        self.assertIsNone(geocode_city("Moscow"))
     
-    @patch('app.api.requests.get')
-    def test_get_weather_by_coordinates_success(self, mock_get):
+    @patch('app.api.get_client')
+    def test_get_weather_by_coordinates_success(self, mock_client):
         """Тест получения погоды по координатам"""
         mock_response = Mock()
         mock_response.status_code = 200
@@ -68,22 +71,95 @@ class TestWeatherAPI(unittest.TestCase):
                 "weathercode": 0
             }
         }
-        mock_get.return_value = mock_response
+        mock_client.return_value.get.return_value = mock_response
         
         result = get_weather_by_coordinates(55.7558, 37.6173)
         
         self.assertEqual(result["current_weather"]["temperature"], 15.5)
         self.assertEqual(result["current_weather"]["windspeed"], 3.2)
     
-    @patch('app.api.requests.get')
-    def test_get_weather_by_coordinates_error(self, mock_get):
+    @patch('app.api.get_client')
+    def test_get_weather_by_coordinates_error(self, mock_client):
         """Тест ошибки при получении погоды по координатам"""
         mock_response = Mock()
         mock_response.raise_for_status.side_effect = requests.RequestException("API error")
-        mock_get.return_value = mock_response
+        mock_client.return_value.get.return_value = mock_response
         
-        with self.assertRaises(requests.RequestException):
-            get_weather_by_coordinates(55.7558, 37.6173)
+        result = get_weather_by_coordinates(55.7558, 37.6173)
+        
+        self.assertIn("API error", result["error"])
+    
+    @patch('app.api.get_client')
+    def test_get_weather_by_coordinates_batch(self, mock_client):
+        """Тест пакетного запроса погоды для нескольких точек"""
+        mock_response = Mock()
+        mock_response.json.return_value = [
+            {"latitude": 55.75, "current_weather": {"temperature": 1.0}},
+            {"latitude": 59.94, "current_weather": {"temperature": 2.0}}
+        ]
+        mock_client.return_value.get.return_value = mock_response
+        
+        result = get_weather_by_coordinates_batch([(55.75, 37.62), (59.94, 30.31)])
+        
+        self.assertEqual([r["current_weather"]["temperature"] for r in result], [1.0, 2.0])
+        params = mock_client.return_value.get.call_args.kwargs["params"]
+        self.assertEqual(params["latitude"], "55.75,59.94")
+        self.assertEqual(params["longitude"], "37.62,30.31")
+    
+    @patch('app.api.get_client')
+    def test_get_weather_by_coordinates_batch_error(self, mock_client):
+        """Тест что ошибка пакетного запроса возвращается для каждой точки"""
+        mock_client.return_value.get.side_effect = requests.RequestException("API error")
+        
+        result = get_weather_by_coordinates_batch([(55.75, 37.62), (59.94, 30.31)])
+        
+        self.assertEqual(len(result), 2)
+        self.assertTrue(all("error" in r for r in result))
+    
+    def test_chunk_points_respects_limits(self):
+        """Тест разбиения длинного списка точек на части"""
+        points = [(55.7558 + i / 10000, 37.6173) for i in range(300)]
+        
+        chunks = api._chunk_points(points)
+        
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(sum(chunks, []), points)
+        self.assertTrue(all(len(c) <= api.MAX_BATCH_POINTS for c in chunks))
+    
+    def test_hourly_records_in_utc(self):
+        """Тест перевода почасового прогноза в строки со временем UTC"""
+        data = {
+            "utc_offset_seconds": 10800,
+            "hourly": {
+                "time": ["2025-01-01T00:00", "2025-01-01T01:00"],
+                "temperature_2m": [-5.0, -6.0],
+                "relative_humidity_2m": [80, 81],
+                "pressure_msl": [1015.2, 1015.8],
+            }
+        }
+        
+        rows = api.hourly_records(data)
+        
+        self.assertEqual(rows, [
+            ("2024-12-31 21:00:00", -5.0, 80, 1015.2, None),
+            ("2024-12-31 22:00:00", -6.0, 81, 1015.8, None),
+        ])
+        self.assertEqual(api.hourly_records({}), [])
+    
+    def test_current_conditions(self):
+        """Тест текущих влажности и давления из почасового прогноза"""
+        data = {
+            "current_weather": {"time": "2025-01-01T01:15", "weathercode": 3, "is_day": 0},
+            "hourly": {
+                "time": ["2025-01-01T00:00", "2025-01-01T01:00"],
+                "relative_humidity_2m": [80, 81],
+                "pressure_msl": [1015.2, 1015.8],
+            }
+        }
+        
+        self.assertEqual(api.current_conditions(data),
+                         {"humidity": 81, "pressure": 1016, "weather_code": 3, "is_day": 0})
+        self.assertEqual(api.current_conditions({})["humidity"], None)
     
     @patch('app.api.geocode_city')
     @patch('app.api.get_weather_by_coordinates')
@@ -0,0 +1,102 @@
+import io
+import json
+import threading
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.batch import parse_location, read_locations, run_batch
+
+
+class TestReadLocations(unittest.TestCase):
+    """Тесты разбора входа пакетного режима"""
+
+    def test_parse_location(self):
+        """Тест разбора городов и координат"""
+        self.assertEqual(parse_location("Moscow\n"), ("city", "Moscow"))
+        self.assertEqual(parse_location("New York"), ("city", "New York"))
+        self.assertEqual(parse_location("55.75,37.62"), ("coords", 55.75, 37.62))
+        self.assertEqual(parse_location(" 55.75 -37.62 "), ("coords", 55.75, -37.62))
+        self.assertIsNone(parse_location("   "))
+        self.assertIsNone(parse_location("# комментарий"))
+
+    def test_read_locations(self):
+        """Тест что пустые строки и комментарии пропускаются"""
+        stream = io.StringIO("Moscow\n\n# skip\n55.75, 37.62\n")
+        self.assertEqual(list(read_locations(stream)), [
+            ("Moscow", ("city", "Moscow")),
+            ("55.75, 37.62", ("coords", 55.75, 37.62)),
+        ])
+
+
+class TestRunBatch(unittest.TestCase):
+    """Тесты пакетной обработки"""
+
+    def run_batch(self, text, workers=4):
+        out, err = io.StringIO(), io.StringIO()
+        summary = run_batch(read_locations(io.StringIO(text)), workers=workers, out=out, err=err)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        return summary, lines, err.getvalue()
+
+    @patch('app.batch.fetch_location')
+    def test_results_and_summary(self, mock_fetch):
+        """Тест NDJSON-вывода и итоговой сводки"""
+        def fetch(location):
+            if location[1] == "Nowhere":
+                return {"source": "api", "result": {"error": "Город 'Nowhere' не найден."}}
+            if location[1] == "Broken":
+                raise RuntimeError("boom")
+            source = "cache" if location[0] == "coords" else "api"
+            return {"source": source, "result": {"meta": {}, "data": {"v": location[1]}}}
+        mock_fetch.side_effect = fetch
+
+        summary, lines, err = self.run_batch("Moscow\n55.75,37.62\nNowhere\nBroken\n")
+
+        self.assertEqual(summary["total"], 4)
+        self.assertEqual(summary["failed"], 2)
+        self.assertEqual(summary["cache_hits"], 1)
+        self.assertEqual(summary["hit_ratio"], 0.5)
+        by_query = {line["query"]: line for line in lines}
+        self.assertEqual(by_query["Moscow"]["result"]["data"], {"v": "Moscow"})
+        self.assertEqual(by_query["55.75,37.62"]["source"], "cache")
+        self.assertIn("не найден", by_query["Nowhere"]["error"])
+        self.assertEqual(by_query["Broken"]["error"], "boom")
+        self.assertIn("ошибок 2", err)
+
+    @patch('app.batch.fetch_location')
+    def test_results_streamed_as_completed(self, mock_fetch):
+        """Тест что готовый результат пишется, не дожидаясь медленных"""
+        release = threading.Event()
+
+        def fetch(location):
+            if location[1] == "Slow":
+                release.wait(5)
+            return {"source": "api", "result": {"data": {}}}
+        mock_fetch.side_effect = fetch
+
+        class Out(io.StringIO):
+            def write(self, text):
+                release.set()
+                return super().write(text)
+
+        out = Out()
+        run_batch(read_locations(io.StringIO("Slow\nFast\n")), workers=2, out=out, err=io.StringIO())
+        queries = [json.loads(line)["query"] for line in out.getvalue().splitlines()]
+        self.assertEqual(queries, ["Fast", "Slow"])
+
+    @patch('app.batch.fetch_location')
+    def test_many_locations_bounded_pool(self, mock_fetch):
+        """Тест длинного входа с одним потоком"""
+        mock_fetch.return_value = {"source": "cache", "result": {"data": {}}}
+        summary, lines, _ = self.run_batch("".join(f"city-{i}\n" for i in range(50)), workers=1)
+
+        self.assertEqual(summary["total"], 50)
+        self.assertEqual(summary["hit_ratio"], 1.0)
+        self.assertEqual(len(lines), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
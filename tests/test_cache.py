@@ -1,27 +1,20 @@
 # tests/test_cache.py
 import unittest
-import os
-from pathlib import Path
-import sqlite3
 from app.cache import get, set
+from tests.test_database import DatabaseTestCase
 
-# Путь к тестовой БД (чтобы не трогать настоящую)
-TEST_DB_PATH = Path("app/weather_data.db")
 
-class TestCache(unittest.TestCase):
+class TestCache(DatabaseTestCase):
     def setUp(self):
-        # Удаляем тестовую БД перед каждым тестом
-        if TEST_DB_PATH.exists():
-            TEST_DB_PATH.unlink()
-
-        # Принудительно пересоздаём таблицы
-        from app.database import init_db
-        init_db()
+        # Временная база уже пуста; очищаем кэш в памяти
+        super().setUp()
+        from app.cache import clear_cache
+        clear_cache(persistent=False)
 
     def tearDown(self):
-        # Удаляем после теста
-        if TEST_DB_PATH.exists():
-            TEST_DB_PATH.unlink()
+        from app.cache import clear_cache
+        clear_cache(persistent=False)
+        super().tearDown()
 
     def test_cache_set_and_get(self):
         key = "test:key:123"
@@ -49,5 +42,182 @@ class TestCache(unittest.TestCase):
         self.assertEqual(get("key1")["city"], "Moscow")
         self.assertEqual(get("key2")["city"], "London")
 
+    def test_persistent_tier_after_memory_cleared(self):
+        from app.cache import get_from_cache, set_to_cache, clear_cache
+
+        set_to_cache("coords:1.0,2.0", {"temp": 3})
+        clear_cache(persistent=False)  # как будто процесс перезапущен
+
+        self.assertEqual(get_from_cache("coords:1.0,2.0"), {"temp": 3})
+
+    def test_errors_not_persisted(self):
+        from app.cache import set_to_cache
+
+        set_to_cache("city:nowhere", {"error": "Город 'nowhere' не найден."})
+
+        self.assertIsNone(get("city:nowhere"))
+
+
+class TestMemoryCache(unittest.TestCase):
+    def test_lru_eviction_by_entries(self):
+        from app.cache import MemoryCache
+
+        cache = MemoryCache(max_entries=2)
+        cache.set("a", {"v": 1})
+        cache.set("b", {"v": 2})
+        cache.get("a")            # "a" становится самой свежей
+        cache.set("c", {"v": 3})  # вытесняется "b"
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), {"v": 1})
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_eviction_by_bytes(self):
+        from app.cache import MemoryCache
+
+        cache = MemoryCache(max_bytes=100)
+        cache.set("a", {"v": "x" * 60})
+        cache.set("b", {"v": "y" * 60})
+
+        self.assertEqual(len(cache), 1)
+        self.assertLessEqual(cache.stats()["bytes"], 100)
+
+    def test_expired_entries_are_swept(self):
+        from datetime import timedelta
+        from app.cache import MemoryCache
+
+        cache = MemoryCache(ttl=timedelta(seconds=0))
+        cache.set("a", {"v": 1})
+        cache.set("b", {"v": 2})  # при записи "a" уже просрочена
+
+        self.assertNotIn("a", cache)
+        self.assertIsNone(cache.get("b"))
+        stats = cache.stats()
+        self.assertEqual(stats["expirations"], 2)
+        self.assertEqual(stats["entries"], 0)
+
+    def test_hit_miss_counters(self):
+        from app.cache import MemoryCache
+
+        cache = MemoryCache()
+        cache.get("missing")
+        cache.set("k", {"v": 1})
+        cache.get("k")
+
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_ratio"], 0.5)
+
+    def test_stale_entry(self):
+        from datetime import timedelta
+        from app.cache import MemoryCache
+
+        cache = MemoryCache(ttl=timedelta(0), stale_ttl=timedelta(minutes=5))
+        cache.set("k", {"v": 1})
+
+        self.assertIsNone(cache.get("k"))
+        self.assertEqual(cache.get_entry("k"), ({"v": 1}, "stale"))
+        self.assertEqual(cache.stats()["stale_hits"], 1)
+
+    def test_hot_keys_expiring(self):
+        from datetime import timedelta
+        from app.cache import MemoryCache
+
+        cache = MemoryCache(ttl=timedelta(seconds=60))
+        for key in ("a", "b", "c"):
+            cache.set(key, {"v": key})
+        for _ in range(3):
+            cache.get("a")
+        cache.get("b")
+
+        self.assertEqual(cache.hot_keys_expiring(within=120, top_n=2), ["a", "b"])
+        self.assertEqual(cache.hot_keys_expiring(within=1, top_n=2), [])
+
+
+class TestCoordsKey(unittest.TestCase):
+    def tearDown(self):
+        from app.cache import configure_coords_key
+        configure_coords_key(None)
+
+    def test_exact_coords_by_default(self):
+        from app.cache import coords_key
+
+        self.assertEqual(coords_key(55.7558, 37.6173), "coords:55.7558,37.6173")
+        self.assertNotEqual(coords_key(55.7558, 37.6173), coords_key(55.7559, 37.6172))
+
+    def test_grid_mode_shares_cell(self):
+        from app.cache import coords_key, configure_coords_key
+
+        configure_coords_key("grid", resolution=0.1)
+
+        self.assertEqual(coords_key(55.7558, 37.6173), "coords:55.8,37.6")
+        self.assertEqual(coords_key(55.7558, 37.6173), coords_key(55.7559, 37.6172))
+
+    def test_geohash_mode_shares_cell(self):
+        from app.cache import coords_key, configure_coords_key
+
+        configure_coords_key("geohash", precision=5)
+
+        self.assertEqual(coords_key(55.7558, 37.6173), coords_key(55.7559, 37.6172))
+        self.assertTrue(coords_key(55.7558, 37.6173).startswith("coords:gh:"))
+
+
+class TestFetchOnce(unittest.TestCase):
+    def test_concurrent_calls_share_one_fetch(self):
+        import threading
+        import time
+        from app.cache import fetch_once
+
+        calls = []
+        results = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.05)
+            return {"temp": 1}
+
+        def worker():
+            results.append(fetch_once("city:test", fetch))
+
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([r[0] for r in results], [{"temp": 1}] * 5)
+        self.assertEqual(sum(1 for _, leader in results if leader), 1)
+
+    def test_error_is_shared(self):
+        from app.cache import fetch_once
+
+        def fetch():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            fetch_once("city:error", fetch)
+        # После ошибки ключ освобождается
+        self.assertEqual(fetch_once("city:error", lambda: 42), (42, True))
+
+
+class TestPersistentPurge(DatabaseTestCase):
+    def test_expired_rows_purged_on_write(self):
+        from unittest.mock import patch
+        from app import cache, database
+
+        set("old:1", {"temp": 1})
+        set("old:2", {"temp": 2})
+        conn = database._conn()
+        with conn:
+            conn.execute("UPDATE cache SET fetched_at = datetime('now', '-1 day')")
+
+        with patch.object(cache, "_PURGE_EVERY", 3):
+            for i in range(3):
+                set(f"new:{i}", {"temp": i})
+
+        keys = {row[0] for row in conn.execute("SELECT key FROM cache")}
+        self.assertEqual(keys, {"new:0", "new:1", "new:2"})
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
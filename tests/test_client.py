@@ -0,0 +1,81 @@
+import subprocess
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.client import WeatherClient, configure_client, get_client
+
+
+class TestWeatherClient(unittest.TestCase):
+    """Тесты для HTTP-клиента с пулом соединений"""
+
+    def tearDown(self):
+        configure_client()
+
+    def test_get_client_is_shared(self):
+        """Тест что модуль отдаёт один и тот же клиент"""
+        self.assertIs(get_client(), get_client())
+
+    def test_configure_client_replaces_shared(self):
+        """Тест пересоздания клиента с другими параметрами пула"""
+        old = get_client()
+        new = configure_client(pool_maxsize=32, retries=0)
+
+        self.assertIsNot(old, new)
+        self.assertIs(get_client(), new)
+        adapter = new.session.get_adapter("https://api.open-meteo.com")
+        self.assertEqual(adapter._pool_maxsize, 32)
+        self.assertEqual(adapter.max_retries.total, 0)
+
+    def test_get_client_created_once_concurrently(self):
+        """Тест что одновременные первые вызовы создают один клиент"""
+        import threading
+        import time
+        from unittest.mock import patch
+        from app import client as client_module
+
+        def slow_client(**kwargs):
+            time.sleep(0.05)
+            return WeatherClient(**kwargs)
+
+        client_module._client = None
+        results = []
+        with patch("app.client.WeatherClient", side_effect=slow_client) as factory:
+            threads = [threading.Thread(target=lambda: results.append(get_client())) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        self.assertEqual(factory.call_count, 1)
+        self.assertTrue(all(c is results[0] for c in results))
+
+    def test_keep_alive_disabled(self):
+        """Тест что без keep-alive клиент просит закрыть соединение"""
+        c = WeatherClient(keep_alive=False)
+        self.assertEqual(c.session.headers["Connection"], "close")
+        c.close()
+
+
+
+class TestLazyImport(unittest.TestCase):
+    """Тесты отложенного импорта requests"""
+
+    def test_requests_not_imported_at_startup(self):
+        """Тест что импорт команд не загружает requests"""
+        code = "import sys, app.commands, app.geocoding; print('requests' in sys.modules)"
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                             cwd=os.path.join(os.path.dirname(__file__), '..')).stdout
+        self.assertEqual(out.strip(), "False")
+
+    def test_lazy_module_loads_on_access(self):
+        """Тест что заместитель модуля импортирует его при обращении"""
+        from app.lazy import LazyModule
+        module = LazyModule("json")
+        self.assertEqual(module.dumps([1]), "[1]")
+
+
+if __name__ == '__main__':
+    unittest.main()
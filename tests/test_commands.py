@@ -1,50 +1,53 @@
 # tests/test_commands.py
-import unittest
-from unittest.mock import patch
+from unittest.mock import Mock, patch
+import sys
+import os
 
-from app.database import init_db
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.cache import clear_cache
 from app.commands import weather_by_city, weather_by_coords
+from app.geocoding import clear_memo
+from tests.test_database import DatabaseTestCase
 
 
-class TestCommands(unittest.TestCase):
+class TestCommands(DatabaseTestCase):
 
     def setUp(self):
-        # ← Гарантируем, что таблицы существуют
-        init_db()
-        # ← ОЧИЩАЕМ кэш перед каждым тестом — это главное!
-        from app.database import get_conn
-        conn = get_conn()
-        conn.execute("DELETE FROM cache")
-        conn.commit()
-        conn.close()
+        # Временная база уже пуста; очищаем кэш в памяти и память геокодера
+        super().setUp()
+        clear_cache()
+        clear_memo()
 
-    @patch('app.api.get_weather_by_city')
-    def test_weather_by_city_from_api(self, mock_get):
+    def tearDown(self):
+        clear_cache(persistent=False)
+        clear_memo()
+        super().tearDown()
+
+    @patch('app.api.get_weather_by_coordinates')
+    @patch('app.api.search_city')
+    def test_weather_by_city_from_api(self, mock_geo, mock_get):
         # open‑meteo возвращает русское название
-        mock_get.return_value = {
-            "meta": {"name": "Москва", "latitude": 55.75, "longitude": 37.62},
-            "data": {"current_weather": {"temperature": 15.0, "windspeed": 5.0, "winddirection": 180}}
-        }
+        mock_geo.return_value = {"name": "Москва", "latitude": 55.75, "longitude": 37.62}
+        mock_get.return_value = {"current_weather": {"temperature": 15.0, "windspeed": 5.0, "winddirection": 180}}
         result = weather_by_city("Moscow")
         self.assertEqual(result["source"], "api")
         self.assertEqual(result["result"]["meta"]["name"], "Москва")   # ← теперь ожидается русский
 
-    @patch('app.api.get_weather_by_city')
-    def test_weather_by_city_from_cache(self, mock_get):
-        mock_get.return_value = {
-            "meta": {"name": "Москва"},
-            "data": {"current_weather": {"temperature": 20.0, "windspeed": 3.0, "winddirection": 90}}
-        }
+    @patch('app.api.get_weather_by_coordinates')
+    @patch('app.api.search_city')
+    def test_weather_by_city_from_cache(self, mock_geo, mock_get):
+        mock_geo.return_value = {"name": "Москва", "latitude": 55.75, "longitude": 37.62}
+        mock_get.return_value = {"current_weather": {"temperature": 20.0, "windspeed": 3.0, "winddirection": 90}}
         weather_by_city("Moscow")          # первый → из API
         result = weather_by_city("Moscow") # второй → из кэша
         self.assertEqual(result["source"], "cache")
 
-    @patch('app.api.get_weather_by_city')
-    def test_weather_by_city_strip_lowercase(self, mock_get):
-        mock_get.return_value = {
-            "meta": {"name": "Москва", "latitude": 55.75, "longitude": 37.62},
-            "data": {"current_weather": {"temperature": 15.0, "windspeed": 5.0, "winddirection": 180}}
-        }
+    @patch('app.api.get_weather_by_coordinates')
+    @patch('app.api.search_city')
+    def test_weather_by_city_strip_lowercase(self, mock_geo, mock_get):
+        mock_geo.return_value = {"name": "Москва", "latitude": 55.75, "longitude": 37.62}
+        mock_get.return_value = {"current_weather": {"temperature": 15.0, "windspeed": 5.0, "winddirection": 180}}
 
         result1 = weather_by_city("  Moscow  ")
         result2 = weather_by_city("moscow")
@@ -53,6 +56,64 @@ class TestCommands(unittest.TestCase):
         self.assertEqual(result1["source"], "api")    # первый — из API
         self.assertEqual(result2["source"], "cache")  # остальные — из кэша
         self.assertEqual(result3["source"], "cache")
+        mock_geo.assert_called_once()                 # геокодер вызван один раз
+
+    @patch('app.api.get_weather_by_coordinates')
+    @patch('app.api.search_city')
+    def test_weather_by_city_spellings_share_forecast(self, mock_geo, mock_get):
+        mock_geo.return_value = {"name": "Москва", "latitude": 55.75, "longitude": 37.62}
+        mock_get.return_value = {"current_weather": {"temperature": 15.0}}
+
+        weather_by_city("Москва")
+        result = weather_by_city("Moscow")   # другое название → те же координаты
+
+        self.assertEqual(result["source"], "cache")
+        mock_get.assert_called_once()
+
+    @patch('app.api.get_weather_by_coordinates')
+    @patch('app.api.search_city')
+    def test_weather_by_city_saves_series(self, mock_geo, mock_get):
+        from app.commands import get_city_series
+        mock_geo.return_value = {"name": "Москва", "latitude": 55.75, "longitude": 37.62}
+        mock_get.return_value = {
+            "utc_offset_seconds": 10800,
+            "current_weather": {"time": "2020-06-01T01:00", "temperature": 15.0, "weathercode": 2, "is_day": 0},
+            "hourly": {
+                "time": ["2020-06-01T00:00", "2020-06-01T01:00"],
+                "temperature_2m": [14.0, 15.0],
+                "relative_humidity_2m": [70, 72],
+                "pressure_msl": [1012.4, 1012.6],
+                "weather_code": [1, 2],
+            }
+        }
+        weather_by_city("Moscow")
+
+        series = get_city_series("moscow", since="2020-05-31 21:00:00", until="2020-05-31 22:00:00",
+                                 columns=["temperature", "humidity"])
+        self.assertEqual(series["series"], [
+            {"time": "2020-05-31 21:00:00", "temperature": 14.0, "humidity": 70},
+            {"time": "2020-05-31 22:00:00", "temperature": 15.0, "humidity": 72},
+        ])
+        from app.database import get_conn
+        conn = get_conn()
+        record = conn.execute("""
+            SELECT humidity, pressure, weather_code, is_day FROM history ORDER BY id DESC LIMIT 1
+        """).fetchone()
+        conn.close()
+        self.assertEqual(tuple(record), (72, 1013, 2, 0))
+
+    @patch('app.api.search_city')
+    def test_weather_by_city_not_found_is_cached(self, mock_geo):
+        mock_geo.return_value = None
+
+        result1 = weather_by_city("Nowhere")
+        from app.geocoding import clear_memo
+        clear_memo()
+        result2 = weather_by_city("nowhere")  # ответ «не найдено» берётся из таблицы geocode
+
+        self.assertIn("не найден", result1["result"]["error"])
+        self.assertIn("не найден", result2["result"]["error"])
+        mock_geo.assert_called_once()
 
     @patch('app.api.get_weather_by_coordinates')
     def test_weather_by_coords_from_api(self, mock_get):
@@ -65,4 +126,119 @@ class TestCommands(unittest.TestCase):
         mock_get.return_value = {"current_weather": {"temperature": 12.0}}
         weather_by_coords(55.75, 37.62)
         result = weather_by_coords(55.75, 37.62)
-        self.assertEqual(result["source"], "cache")
\ No newline at end of file
+        self.assertEqual(result["source"], "cache")
+    @patch('app.api.get_weather_by_coordinates')
+    def test_weather_by_coords_nearby_in_grid_mode(self, mock_get):
+        from app.cache import configure_coords_key
+        mock_get.return_value = {"current_weather": {"temperature": 12.0}}
+        configure_coords_key("grid", resolution=0.1)
+        try:
+            weather_by_coords(55.7558, 37.6173)
+            result = weather_by_coords(55.7559, 37.6172)   # та же ячейка сетки
+        finally:
+            configure_coords_key(None)
+        self.assertEqual(result["source"], "cache")
+        mock_get.assert_called_once()
+
+    @patch('app.api.get_weather_by_coordinates')
+    def test_weather_by_coords_stale_while_revalidate(self, mock_get):
+        from datetime import timedelta
+        from app import refresh
+        from app.cache import configure_cache
+        mock_get.return_value = {"current_weather": {"temperature": 12.0}}
+        configure_cache(ttl=timedelta(0), stale_ttl=timedelta(minutes=5))
+        try:
+            weather_by_coords(55.75, 37.62)
+            result = weather_by_coords(55.75, 37.62)   # срок истёк → устаревшие данные
+            refresh.wait_idle()
+        finally:
+            configure_cache(ttl=timedelta(minutes=30), stale_ttl=timedelta(0))
+        self.assertEqual(result["source"], "stale")
+        self.assertEqual(mock_get.call_count, 2)       # второй вызов — фоновое обновление
+
+
+class TestWeatherByCoordsMany(DatabaseTestCase):
+    """Тесты пакетного запроса погоды по набору точек"""
+
+    def setUp(self):
+        super().setUp()
+        clear_cache()
+
+    def tearDown(self):
+        clear_cache(persistent=False)
+        super().tearDown()
+
+    @staticmethod
+    def forecast(lat, lon):
+        return {"latitude": lat, "longitude": lon, "current_weather": {"temperature": lat}}
+
+    def fake_batch(self, points):
+        return [self.forecast(lat, lon) for lat, lon in points]
+
+    @patch('app.api.get_weather_by_coordinates_batch')
+    @patch('app.api.get_weather_by_coordinates')
+    def test_cache_hits_not_requested(self, mock_get, mock_batch):
+        """Тест что из API запрашиваются только промахи кэша"""
+        from app.commands import weather_by_coords_many
+        mock_get.return_value = self.forecast(55.75, 37.62)
+        mock_batch.side_effect = self.fake_batch
+        weather_by_coords(55.75, 37.62)
+
+        results = weather_by_coords_many([(55.75, 37.62), (59.94, 30.31)])
+
+        mock_batch.assert_called_once_with([(59.94, 30.31)])
+        self.assertEqual([r["source"] for r in results], ["cache", "api"])
+        self.assertEqual(results[1]["result"]["data"]["latitude"], 59.94)
+
+    @patch('app.api.get_weather_by_coordinates_batch')
+    def test_duplicate_points_requested_once(self, mock_batch):
+        """Тест что повторяющиеся точки запрашиваются один раз"""
+        from app.commands import weather_by_coords_many
+        mock_batch.side_effect = self.fake_batch
+
+        results = weather_by_coords_many([(55.75, 37.62), (59.94, 30.31), (55.75, 37.62)])
+
+        mock_batch.assert_called_once_with([(55.75, 37.62), (59.94, 30.31)])
+        self.assertEqual([r["result"]["data"]["latitude"] for r in results], [55.75, 59.94, 55.75])
+
+    @patch('app.api.get_client')
+    def test_long_list_split_into_chunks(self, mock_client):
+        """Тест деления длинного списка точек на несколько запросов"""
+        from urllib.parse import urlencode
+        from app import api
+        from app.commands import weather_by_coords_many
+
+        def fake_get(url, params=None):
+            self.assertLessEqual(len(url) + 1 + len(urlencode(params)), api.MAX_URL_LENGTH)
+            lats = params["latitude"].split(",")
+            lons = params["longitude"].split(",")
+            self.assertLessEqual(len(lats), api.MAX_BATCH_POINTS)
+            response = Mock()
+            response.json.return_value = [self.forecast(float(lat), float(lon)) for lat, lon in zip(lats, lons)]
+            return response
+
+        mock_client.return_value.get.side_effect = fake_get
+        points = [(round(40 + i * 0.01, 2), round(30 + i * 0.01, 2)) for i in range(250)]
+
+        results = weather_by_coords_many(points)
+
+        self.assertEqual(mock_client.return_value.get.call_count, len(api._chunk_points(points)))
+        self.assertGreaterEqual(mock_client.return_value.get.call_count, 3)
+        self.assertEqual([r["result"]["data"]["latitude"] for r in results], [lat for lat, _ in points])
+
+    @patch('app.api.get_weather_by_coordinates_batch')
+    def test_error_point_keeps_position(self, mock_batch):
+        """Тест что ошибка точки остаётся на её месте и не кэшируется"""
+        from app.commands import weather_by_coords_many
+        points = [(55.75, 37.62), (0.0, 0.0), (59.94, 30.31)]
+        mock_batch.side_effect = lambda pts: [
+            {"error": "Ошибка запроса"} if pt == (0.0, 0.0) else self.forecast(*pt) for pt in pts
+        ]
+
+        results = weather_by_coords_many(points)
+        self.assertEqual(results[1]["result"]["data"], {"error": "Ошибка запроса"})
+        self.assertEqual([results[0]["result"]["data"]["latitude"], results[2]["result"]["data"]["latitude"]],
+                         [55.75, 59.94])
+
+        weather_by_coords_many(points)
+        mock_batch.assert_called_with([(0.0, 0.0)])
@@ -0,0 +1,128 @@
+import time
+import unittest
+from datetime import timedelta
+from unittest.mock import patch
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import cache, commands, database, geocoding
+from app.daemon import TokenBucket, WatchRefresher
+from tests.test_database import DatabaseTestCase
+
+WEATHER = {"current_weather": {"temperature": 15.0, "windspeed": 5.0, "winddirection": 180}}
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Тесты ограничителя частоты запросов"""
+
+    def test_burst_then_rate(self):
+        """Тест запаса токенов и пополнения со временем"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2.0, burst=2, clock=clock)
+
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertAlmostEqual(bucket.try_acquire(), 0.5)
+
+        clock.now += 0.5
+        self.assertEqual(bucket.try_acquire(), 0)
+        clock.now += 10
+        # Больше burst не накапливается
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertGreater(bucket.try_acquire(), 0)
+
+    def test_invalid_rate(self):
+        """Тест проверки частоты"""
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+
+
+class TestWatchRefresher(DatabaseTestCase):
+    """Тесты обновления списка наблюдения"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear_cache()
+        geocoding.clear_memo()
+
+    def tearDown(self):
+        cache.clear_cache(persistent=False)
+        geocoding.clear_memo()
+        super().tearDown()
+
+    def test_schedule_spread_over_ttl(self):
+        """Тест равномерного распределения обновлений по периоду"""
+        clock = FakeClock()
+        refresher = WatchRefresher([("city", f"c{i}") for i in range(4)], ttl=timedelta(seconds=40),
+                                   margin=0.0, clock=clock)
+        refresher._initial_schedule()
+        self.assertEqual(sorted(due - clock.now for due, _ in refresher._schedule), [0, 10, 20, 30])
+
+    @patch('app.api.get_weather_by_coordinates')
+    @patch('app.api.search_city')
+    def test_watched_locations_hit_cache(self, mock_geo, mock_get):
+        """Тест что после обновления запросы мест из списка попадают в кэш"""
+        mock_geo.return_value = {"name": "Москва", "latitude": 55.75, "longitude": 37.62}
+        mock_get.return_value = WEATHER
+
+        refresher = WatchRefresher([("city", "Moscow"), ("coords", 59.94, 30.31)],
+                                   bucket=TokenBucket(rate=100, burst=10))
+        stats = refresher.run_once()
+
+        self.assertEqual((stats["refreshed"], stats["failed"]), (2, 0))
+        self.assertEqual(commands.weather_by_city("Moscow")["source"], "cache")
+        self.assertEqual(commands.weather_by_coords(59.94, 30.31)["source"], "cache")
+        self.assertEqual(mock_get.call_count, 2)
+        sources = [r["source"] for r in database.get_recent_history(10)]
+        self.assertEqual(sources.count("refresh"), 2)
+
+    @patch('app.api.get_weather_by_coordinates')
+    def test_refresh_bypasses_fresh_cache(self, mock_get):
+        """Тест что обновление запрашивает API, даже если запись свежая"""
+        mock_get.return_value = WEATHER
+        commands.weather_by_coords(1.0, 2.0)
+        mock_get.return_value = {"current_weather": {"temperature": 30.0}}
+
+        WatchRefresher([("coords", 1.0, 2.0)], history=False).run_once()
+
+        cached = commands.weather_by_coords(1.0, 2.0)
+        self.assertEqual(cached["result"]["data"]["current_weather"]["temperature"], 30.0)
+
+    @patch('app.api.get_weather_by_coordinates')
+    def test_errors_counted(self, mock_get):
+        """Тест учёта неудачных обновлений"""
+        mock_get.return_value = {"error": "Ошибка запроса: down"}
+        stats = WatchRefresher([("coords", 1.0, 2.0)]).run_once()
+        self.assertEqual(stats["failed"], 1)
+        self.assertEqual(database.count_history(), 0)
+
+    @patch('app.api.get_weather_by_coordinates')
+    def test_background_loop(self, mock_get):
+        """Тест периодического обновления в фоновом потоке"""
+        mock_get.return_value = WEATHER
+        refresher = WatchRefresher([("coords", 1.0, 2.0), ("coords", 3.0, 4.0)],
+                                   ttl=timedelta(seconds=0.1), history=False,
+                                   bucket=TokenBucket(rate=1000, burst=10))
+        refresher.start()
+        deadline = time.monotonic() + 5
+        while refresher.stats()["refreshed"] < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        refresher.stop()
+
+        self.assertGreaterEqual(refresher.stats()["refreshed"], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
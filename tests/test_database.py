@@ -0,0 +1,422 @@
+import json
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import database
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """База данных во временном каталоге, чтобы не трогать настоящую"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmp.name) / "test.db"
+        self.patcher = patch.object(database, "DB_PATH", self.db_path)
+        self.patcher.start()
+        database.init_db()
+
+    def tearDown(self):
+        database.close_conn()
+        self.patcher.stop()
+        self.tmp.cleanup()
+
+
+class TestConnection(DatabaseTestCase):
+    """Тесты управляемых соединений"""
+
+    def test_wal_mode(self):
+        """Тест что база переведена в режим WAL"""
+        mode = database._conn().execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+
+    def test_connection_reused_in_thread(self):
+        """Тест что поток переиспользует одно соединение"""
+        self.assertIs(database._conn(), database._conn())
+
+    def test_connection_per_thread(self):
+        """Тест что у разных потоков разные соединения"""
+        other = []
+        t = threading.Thread(target=lambda: other.append(database._conn()))
+        t.start()
+        t.join()
+        self.assertIsNot(other[0], database._conn())
+
+    def test_reopen_after_file_replaced(self):
+        """Тест что после удаления файла базы соединение открывается заново"""
+        database.save_to_history(city="Moscow")
+        old = database._conn()
+        self.db_path.unlink()
+        database.init_db()
+
+        self.assertIsNot(database._conn(), old)
+        self.assertEqual(database.get_history_stats()["total_requests"], 0)
+
+    def test_init_db_skips_ddl_when_current(self):
+        """Тест что повторная инициализация не выполняет DDL"""
+        conn = database._conn()
+        statements = []
+        conn.set_trace_callback(statements.append)
+        try:
+            database.init_db()
+        finally:
+            conn.set_trace_callback(None)
+        self.assertEqual(statements, ["PRAGMA user_version"])
+
+    def test_read_while_writing(self):
+        """Тест что чтение не блокируется параллельной записью"""
+        errors = []
+
+        def writer():
+            try:
+                for i in range(200):
+                    database.save_to_history(city=f"city-{i % 7}", temperature=i)
+            except Exception as e:
+                errors.append(e)
+
+        t = threading.Thread(target=writer)
+        t.start()
+        while t.is_alive():
+            database.get_recent_history(5)
+            database.get_history_stats()
+        t.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(database.get_history_stats()["total_requests"], 200)
+
+
+
+class TestHistoryPage(DatabaseTestCase):
+    """Тесты постраничного вывода истории"""
+
+    def setUp(self):
+        super().setUp()
+        for i in range(25):
+            database.save_to_history(city="Moscow" if i % 2 else "Kazan", temperature=i,
+                                     raw_data={"i": i})
+
+    def test_schema_version(self):
+        """Тест что миграции применены"""
+        version = database._conn().execute("PRAGMA user_version").fetchone()[0]
+        self.assertEqual(version, database.SCHEMA_VERSION)
+
+    def test_pages_cover_history(self):
+        """Тест что страницы по ключу покрывают всю историю без повторов"""
+        ids, before_id = [], None
+        while True:
+            page = database.get_history_page(before_id=before_id, limit=10)
+            if not page:
+                break
+            ids += [row["id"] for row in page]
+            before_id = page[-1]["id"]
+
+        self.assertEqual(len(ids), 25)
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertNotIn("raw_data", database.get_history_page(limit=1)[0])
+
+    def test_filter_by_city(self):
+        """Тест фильтра по городу"""
+        page = database.get_history_page(limit=100, city="Moscow")
+        self.assertEqual(len(page), 12)
+        self.assertTrue(all(row["city"] == "Moscow" for row in page))
+
+    def test_filter_since(self):
+        """Тест фильтра по времени"""
+        self.assertEqual(len(database.get_history_page(limit=100, since="2000-01-01 00:00:00")), 25)
+        self.assertEqual(database.get_history_page(limit=100, since="2999-01-01 00:00:00"), [])
+
+    def test_after_id(self):
+        """Тест выборки записей, добавленных после известной"""
+        newest = database.get_history_page(limit=1)[0]["id"]
+        self.assertEqual(database.get_history_page(after_id=newest), [])
+        database.save_to_history(city="Kazan", temperature=100)
+        self.assertEqual([r["temperature"] for r in database.get_history_page(after_id=newest)], [100])
+
+    def test_window_sorted(self):
+        """Тест окна истории с сортировкой и смещением"""
+        window = database.get_history_window(offset=5, limit=3, order_by="temperature", descending=False)
+        self.assertEqual([r["temperature"] for r in window], [5, 6, 7])
+        window = database.get_history_window(limit=2, order_by="temperature", city="Kazan")
+        self.assertEqual([r["temperature"] for r in window], [24, 22])
+        with self.assertRaises(ValueError):
+            database.get_history_window(order_by="raw_data")
+
+    def test_count(self):
+        """Тест числа записей с фильтрами"""
+        self.assertEqual(database.count_history(), 25)
+        self.assertEqual(database.count_history(city="Moscow"), 12)
+        self.assertEqual(database.count_history(city="Kazan", since="2000-01-01 00:00:00"), 13)
+
+
+class TestStats(DatabaseTestCase):
+    """Тесты сводной статистики, обновляемой триггерами"""
+
+    def setUp(self):
+        super().setUp()
+        for city, temp in [("Moscow", -5.0), ("Moscow", 3.0), ("Kazan", 10.0), (None, 7.0), ("Kazan", None)]:
+            database.save_to_history(city=city, temperature=temp)
+
+    def full_scan(self):
+        """Статистика прямым запросом к history, как считалась раньше"""
+        row = database._conn().execute("""
+            SELECT COUNT(*), COUNT(DISTINCT city), AVG(temperature), MIN(temperature), MAX(temperature)
+            FROM history
+        """).fetchone()
+        return {
+            'total_requests': row[0],
+            'unique_cities': row[1],
+            'avg_temperature': round(row[2], 1) if row[2] else None,
+            'min_temperature': round(row[3], 1) if row[3] else None,
+            'max_temperature': round(row[4], 1) if row[4] else None,
+        }
+
+    def test_matches_full_scan(self):
+        """Тест что сводная статистика совпадает с подсчётом по всей таблице"""
+        self.assertEqual(database.get_history_stats(), self.full_scan())
+        self.assertEqual(database.get_history_stats()["unique_cities"], 2)
+
+    def test_by_city(self):
+        """Тест статистики по одному городу"""
+        stats = database.get_history_stats(city="Moscow")
+        self.assertEqual(stats["total_requests"], 2)
+        self.assertEqual(stats["min_temperature"], -5.0)
+        self.assertEqual(stats["max_temperature"], 3.0)
+        self.assertEqual(database.get_history_stats(city="Nowhere")["total_requests"], 0)
+
+    def test_by_period(self):
+        """Тест статистики за период"""
+        self.assertEqual(database.get_history_stats(since="2000-01-01"), self.full_scan())
+        self.assertEqual(database.get_history_stats(until="2000-01-01")["total_requests"], 0)
+        self.assertEqual(database.get_history_stats(city="Kazan", since="2000-01-01")["total_requests"], 2)
+
+    def test_delete_extreme_value(self):
+        """Тест что после удаления минимума он пересчитывается"""
+        conn = database._conn()
+        with conn:
+            conn.execute("DELETE FROM history WHERE temperature = -5.0")
+            conn.execute("DELETE FROM history WHERE city = 'Kazan'")
+
+        self.assertEqual(database.get_history_stats(), self.full_scan())
+        self.assertEqual(database.get_history_stats(city="Moscow")["min_temperature"], 3.0)
+        self.assertEqual(database.get_history_stats(since="2000-01-01")["min_temperature"], 3.0)
+        self.assertEqual(database.get_history_stats()["unique_cities"], 1)
+
+    def test_rebuild(self):
+        """Тест пересчёта статистики по всей истории"""
+        database.rebuild_stats()
+        self.assertEqual(database.get_history_stats(), self.full_scan())
+
+    def test_clear_history(self):
+        """Тест что очистка истории обнуляет статистику"""
+        database.clear_history()
+        self.assertEqual(database.get_history_stats()["total_requests"], 0)
+        self.assertIsNone(database.get_history_stats()["min_temperature"])
+        self.assertEqual(database.get_history_stats(city="Moscow")["total_requests"], 0)
+
+        # Триггеры статистики после очистки снова работают
+        database.save_to_history(city="Moscow", temperature=1.0)
+        database.save_to_history(city="Kazan", temperature=2.0)
+        conn = database._conn()
+        with conn:
+            conn.execute("DELETE FROM history WHERE city = 'Kazan'")
+        self.assertEqual(database.get_history_stats(), self.full_scan())
+
+
+class TestRawPayloads(DatabaseTestCase):
+    """Тесты хранения сырых ответов API"""
+
+    payload = {"current_weather": {"temperature": 5.0}, "hourly": {"temperature_2m": [1.5] * 24}}
+
+    def count_payloads(self):
+        return database._conn().execute("SELECT COUNT(*) FROM raw_payloads").fetchone()[0]
+
+    def test_identical_payloads_stored_once(self):
+        """Тест что одинаковые ответы хранятся один раз"""
+        for _ in range(3):
+            database.save_to_history(city="Moscow", raw_data=self.payload)
+        database.save_to_history(city="Kazan", raw_data={"other": 1})
+
+        self.assertEqual(self.count_payloads(), 2)
+        history = database.get_recent_history(10)
+        self.assertEqual(len(history), 4)
+        self.assertEqual([r["raw_data"] for r in history].count(self.payload), 3)
+
+    def test_concurrent_identical_saves(self):
+        """Тест что одновременные сохранения одного ответа не теряют записи"""
+        threads_count, saves = 8, 200
+        ids = []
+        lock = threading.Lock()
+
+        def worker():
+            own = [database.save_to_history(city="Moscow", raw_data=self.payload) for _ in range(saves)]
+            database.close_conn()
+            with lock:
+                ids.extend(own)
+
+        threads = [threading.Thread(target=worker) for _ in range(threads_count)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(ids), threads_count * saves)
+        self.assertTrue(all(i > 0 for i in ids))
+        self.assertEqual(database.count_history(), threads_count * saves)
+        self.assertEqual(self.count_payloads(), 1)
+
+    def test_write_behind_payloads(self):
+        """Тест сохранения ответов при отложенной записи"""
+        database.enable_write_behind(batch_size=10, flush_interval=0.05)
+        try:
+            for _ in range(5):
+                database.save_to_history(city="Moscow", raw_data=self.payload)
+            database.flush_history()
+        finally:
+            database.disable_write_behind()
+
+        self.assertEqual(self.count_payloads(), 1)
+        self.assertEqual(database.get_recent_history(1)[0]["raw_data"], self.payload)
+
+    def test_lazy_decode(self):
+        """Тест что ответ распаковывается только при обращении"""
+        database.save_to_history(city="Moscow", raw_data=self.payload)
+        database.save_to_history(city="Kazan")
+
+        with patch.object(database, "_decode_payload", wraps=database._decode_payload) as decode:
+            history = database.get_recent_history(10)
+            self.assertEqual(history[0]["city"], "Kazan")
+            decode.assert_not_called()
+
+            self.assertIsNone(history[0].get("raw_data"))
+            self.assertEqual(history[1]["raw_data"], self.payload)
+            self.assertEqual(history[1]["raw_data"], self.payload)
+            self.assertEqual(decode.call_count, 1)
+
+    def test_record_serializes_like_dict(self):
+        """Тест что запись с отложенной распаковкой ведёт себя как обычный словарь"""
+        database.save_to_history(city="Moscow", raw_data=self.payload)
+
+        record = database.get_recent_history(1)[0]
+        self.assertNotIn("raw_hash", record)
+        self.assertIn("raw_data", record.keys())
+        self.assertEqual(json.loads(json.dumps(record))["raw_data"], self.payload)
+        self.assertEqual(dict(database.get_recent_history(1)[0])["raw_data"], self.payload)
+        self.assertEqual(dict(database.get_recent_history(1)[0].items())["raw_data"], self.payload)
+
+    def test_migrate_legacy_rows(self):
+        """Тест переноса ответов, сохранённых текстом до миграции"""
+        conn = database._conn()
+        with conn:
+            conn.execute("DROP INDEX idx_history_raw_hash")
+            conn.execute("ALTER TABLE history DROP COLUMN raw_hash")
+            conn.execute("DROP TABLE raw_payloads")
+            conn.execute("PRAGMA user_version = 2")
+            for _ in range(2):
+                conn.execute("INSERT INTO history (city, raw_data) VALUES ('Moscow', ?)",
+                             (json.dumps(self.payload),))
+            conn.execute("INSERT INTO history (city, raw_data) VALUES ('Kazan', 'not json')")
+
+        database._migrate(conn)
+
+        self.assertEqual(self.count_payloads(), 1)
+        history = database.get_recent_history(10)
+        self.assertEqual([r["raw_data"] for r in history], [None, self.payload, self.payload])
+        migrated = conn.execute("SELECT COUNT(*) FROM history WHERE raw_data IS NOT NULL").fetchone()[0]
+        self.assertEqual(migrated, 1)
+
+
+class TestMigrations(DatabaseTestCase):
+    """Тесты миграций схемы"""
+
+    payload = {"current_weather": {"temperature": 5.0}}
+
+    def make_legacy_db(self, path):
+        """База без миграций: исходные таблицы и ответы, сохранённые текстом"""
+        conn = sqlite3.connect(path)
+        database._create_tables(conn.cursor())
+        with conn:
+            for i in range(50):
+                conn.execute("INSERT INTO history (city, temperature, raw_data) VALUES (?, ?, ?)",
+                             (f"city-{i % 5}", float(i), json.dumps(self.payload)))
+        conn.close()
+
+    def test_concurrent_init_db_on_legacy_db(self):
+        """Тест что init_db из нескольких процессов сразу применяет миграции один раз"""
+        code = ("import sys; from pathlib import Path; from app import database; "
+                "database.DB_PATH = Path(sys.argv[1]); database.init_db()")
+        root = os.path.join(os.path.dirname(__file__), '..')
+        for attempt in range(3):
+            path = Path(self.tmp.name) / f"legacy-{attempt}.db"
+            self.make_legacy_db(path)
+            procs = [subprocess.Popen([sys.executable, "-c", code, str(path)], cwd=root,
+                                      stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                     for _ in range(4)]
+            for proc in procs:
+                _, err = proc.communicate(timeout=60)
+                self.assertEqual(proc.returncode, 0, err)
+
+            conn = sqlite3.connect(path)
+            try:
+                self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], database.SCHEMA_VERSION)
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM raw_payloads").fetchone()[0], 1)
+                self.assertEqual(conn.execute("SELECT total, unique_cities FROM stats_summary").fetchone(), (50, 5))
+            finally:
+                conn.close()
+
+    def test_rerun_after_partial_migration(self):
+        """Тест что миграция 3 завершается, если колонка raw_hash уже добавлена"""
+        conn = database._conn()
+        with conn:
+            conn.execute("DROP INDEX idx_history_raw_hash")
+            conn.execute("DROP TABLE raw_payloads")
+            conn.execute("PRAGMA user_version = 2")
+
+        database._migrate(conn)
+
+        self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], database.SCHEMA_VERSION)
+
+
+class TestForecastSeries(DatabaseTestCase):
+    """Тесты почасового и дневного прогноза"""
+
+    def setUp(self):
+        super().setUp()
+        hourly = [(f"2025-01-01 {h:02d}:00:00", float(h), 80, 1015.0, 3) for h in range(24)]
+        daily = [("2025-01-01", 3, 23.0, 0.0, 1.5)]
+        database.save_forecast(55.75, 37.62, hourly, daily)
+
+    def test_range_query(self):
+        """Тест выборки за период"""
+        series = database.get_hourly_series(55.75, 37.62, since="2025-01-01 10:00:00",
+                                            until="2025-01-01 12:00:00", columns=["temperature"])
+        self.assertEqual(series, [
+            {"time": "2025-01-01 10:00:00", "temperature": 10.0},
+            {"time": "2025-01-01 11:00:00", "temperature": 11.0},
+            {"time": "2025-01-01 12:00:00", "temperature": 12.0},
+        ])
+        self.assertEqual(database.get_hourly_series(59.94, 30.31), [])
+        self.assertEqual(database.get_daily_series(55.75, 37.62)[0]["temperature_max"], 23.0)
+
+    def test_newer_forecast_replaces(self):
+        """Тест что новый прогноз заменяет значения за те же часы"""
+        database.save_forecast(55.75, 37.62, [("2025-01-01 10:00:00", -1.0, 90, 1000.0, 61)], [])
+        series = database.get_hourly_series(55.75, 37.62)
+        self.assertEqual(len(series), 24)
+        self.assertEqual(series[10]["temperature"], -1.0)
+
+    def test_unknown_column(self):
+        """Тест что произвольные колонки не попадают в запрос"""
+        with self.assertRaises(ValueError):
+            database.get_hourly_series(55.75, 37.62, columns=["temperature; DROP TABLE history"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import database
+from app.history_writer import HistoryWriter
+
+
+class TestHistoryWriter(unittest.TestCase):
+    """Тесты отложенной пакетной записи истории"""
+
+    def test_batches_by_size(self):
+        """Тест что записи сохраняются пачками не больше batch_size"""
+        batches = []
+        writer = HistoryWriter(batches.append, batch_size=10, flush_interval=5)
+
+        for i in range(25):
+            writer.put((i,))
+        writer.flush()
+        writer.close()
+
+        self.assertEqual(sum(len(b) for b in batches), 25)
+        self.assertTrue(all(len(b) <= 10 for b in batches))
+
+    def test_flush_by_interval(self):
+        """Тест что неполная пачка сохраняется по таймеру"""
+        batches = []
+        writer = HistoryWriter(batches.append, batch_size=1000, flush_interval=0.05)
+
+        writer.put((1,))
+        writer.flush()
+
+        self.assertEqual(batches, [[(1,)]])
+        writer.close()
+
+    def test_close_writes_pending(self):
+        """Тест что при закрытии оставшиеся записи сохраняются"""
+        batches = []
+        writer = HistoryWriter(batches.append, batch_size=1000, flush_interval=60)
+
+        writer.put((1,))
+        writer.put((2,))
+        writer.close()
+
+        self.assertEqual(sum(batches, []), [(1,), (2,)])
+        with self.assertRaises(RuntimeError):
+            writer.put((3,))
+
+    def test_put_racing_close(self):
+        """Тест что записи, принятые до закрытия, сохраняются, а flush не зависает"""
+        batches = []
+
+        def slow_write(batch):
+            time.sleep(0.001)
+            batches.append(batch)
+
+        # Маленькая очередь: производители ждут в put, пока идёт закрытие
+        writer = HistoryWriter(slow_write, batch_size=2, flush_interval=0.01, max_queue=2)
+        accepted = []
+
+        def producer(n):
+            for i in range(200):
+                try:
+                    writer.put((n, i))
+                except RuntimeError:
+                    return
+                accepted.append((n, i))
+
+        threads = [threading.Thread(target=producer, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        time.sleep(0.01)
+        writer.close()
+        for t in threads:
+            t.join()
+
+        writer.flush()
+        self.assertEqual(sorted(sum(batches, [])), sorted(accepted))
+
+
+class TestWriteBehindDatabase(unittest.TestCase):
+    """Тесты отложенной записи через app.database"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.patcher = patch.object(database, "DB_PATH", Path(self.tmp.name) / "test.db")
+        self.patcher.start()
+        database.init_db()
+
+    def tearDown(self):
+        database.disable_write_behind()
+        self.patcher.stop()
+        self.tmp.cleanup()
+
+    def test_save_to_history_write_behind(self):
+        """Тест что записи из очереди попадают в таблицу history"""
+        database.enable_write_behind(batch_size=50, flush_interval=0.05)
+
+        for i in range(120):
+            self.assertEqual(database.save_to_history(city=f"city-{i}", temperature=i), 0)
+        database.flush_history()
+
+        self.assertEqual(database.get_history_stats()["total_requests"], 120)
+
+    def test_disable_flushes_queue(self):
+        """Тест что выключение отложенной записи сохраняет очередь"""
+        database.enable_write_behind(batch_size=1000, flush_interval=60)
+        database.save_to_history(city="Moscow")
+        database.disable_write_behind()
+
+        self.assertEqual(database.get_history_stats()["total_requests"], 1)
+        self.assertGreater(database.save_to_history(city="Moscow"), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import json
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import requests
+
+from app import api, cache, database, metrics
+from tests.test_database import DatabaseTestCase
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        metrics.enable()
+
+    def tearDown(self):
+        metrics.disable()
+        metrics.reset()
+
+
+class TestRegistry(MetricsTestCase):
+    """Тесты счётчиков, гистограмм и выгрузки"""
+
+    def test_counter_labels(self):
+        """Тест счётчика с метками"""
+        c = metrics.counter("test_events_total", "События")
+        c.inc(kind="a")
+        c.inc(2, kind="a")
+        c.inc(kind="b")
+        self.assertEqual(c.value(kind="a"), 3)
+        self.assertEqual(c.value(kind="b"), 1)
+        self.assertIs(metrics.counter("test_events_total"), c)
+
+    def test_type_conflict(self):
+        """Тест повторной регистрации имени с другим типом"""
+        metrics.counter("test_conflict_total")
+        with self.assertRaises(ValueError):
+            metrics.histogram("test_conflict_total")
+
+    def test_disabled_records_nothing(self):
+        """Тест что выключенные метрики ничего не записывают"""
+        metrics.disable()
+        calls = []
+
+        @metrics.timed("test_disabled_seconds")
+        def work(x):
+            calls.append(x)
+            return x * 2
+
+        self.assertEqual(work(2), 4)
+        metrics.counter("test_disabled_total").inc()
+        self.assertEqual(calls, [2])
+        self.assertIsNone(metrics.histogram("test_disabled_seconds").value())
+        self.assertEqual(metrics.counter("test_disabled_total").value(), 0)
+
+    def test_timed_records_errors_too(self):
+        """Тест что время учитывается и при исключении"""
+        @metrics.timed("test_failing_seconds", op="x")
+        def fail():
+            raise RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            fail()
+        self.assertEqual(metrics.histogram("test_failing_seconds").value(op="x")["count"], 1)
+
+    def test_prometheus_text(self):
+        """Тест текстового формата Prometheus"""
+        h = metrics.histogram("test_latency_seconds", "Задержка", buckets=(0.1, 1.0))
+        h.observe(0.05)
+        h.observe(0.5)
+        h.observe(5)
+        metrics.counter("test_requests_total", "Запросы").inc(path='a"b')
+
+        text = metrics.to_prometheus()
+        self.assertIn("# TYPE test_latency_seconds histogram", text)
+        self.assertIn('test_latency_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('test_latency_seconds_bucket{le="1.0"} 2', text)
+        self.assertIn('test_latency_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn("test_latency_seconds_count 3", text)
+        self.assertIn('test_requests_total{path="a\\"b"} 1', text)
+
+    def test_json(self):
+        """Тест выгрузки в JSON"""
+        metrics.histogram("test_json_seconds", buckets=(1.0,)).observe(0.5, op="read")
+        data = json.loads(metrics.to_json())["test_json_seconds"]
+        self.assertEqual(data["type"], "histogram")
+        self.assertEqual(data["values"][0]["labels"], {"op": "read"})
+        self.assertEqual(data["values"][0]["buckets"], {"1.0": 1, "+Inf": 0})
+
+
+class TestInstrumentation(MetricsTestCase, DatabaseTestCase):
+    """Тесты метрик горячих путей"""
+
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
+        MetricsTestCase.setUp(self)
+        cache.clear_cache()
+
+    def tearDown(self):
+        MetricsTestCase.tearDown(self)
+        cache.clear_cache(persistent=False)
+        DatabaseTestCase.tearDown(self)
+
+    def test_cache_hits_and_misses(self):
+        """Тест счётчиков попаданий и промахов кэша"""
+        cache.get_from_cache("coords:1,2")
+        cache.set_to_cache("coords:1,2", {"v": 1})
+        cache.get_from_cache("coords:1,2")
+        cache.clear_cache(persistent=False)
+        cache.get_from_cache("coords:1,2")
+
+        self.assertEqual(cache.CACHE_LOOKUPS.value(result="miss", tier="disk"), 1)
+        self.assertEqual(cache.CACHE_LOOKUPS.value(result="hit", tier="memory"), 1)
+        self.assertEqual(cache.CACHE_LOOKUPS.value(result="hit", tier="disk"), 1)
+        self.assertEqual(metrics.histogram("weather_cache_get_seconds").value()["count"], 3)
+
+    def test_database_timings(self):
+        """Тест времени записи истории и расчёта статистики"""
+        database.save_to_history(city="Moscow", temperature=1.0)
+        database.get_history_stats()
+        self.assertEqual(metrics.histogram("weather_db_save_history_seconds").value()["count"], 1)
+        self.assertEqual(metrics.histogram("weather_db_history_stats_seconds").value()["count"], 1)
+
+    @patch("app.api.get_client")
+    def test_upstream_errors(self, mock_client):
+        """Тест счётчика ошибок запросов к API"""
+        mock_client.return_value.get.side_effect = requests.ConnectionError("down")
+        self.assertIn("error", api.get_weather_by_coordinates(55.0, 37.0))
+        self.assertIsNone(api.geocode_city("Moscow"))
+
+        self.assertEqual(api.UPSTREAM_ERRORS.value(endpoint="forecast"), 1)
+        self.assertEqual(api.UPSTREAM_ERRORS.value(endpoint="geocode"), 1)
+        self.assertEqual(metrics.histogram("weather_api_forecast_seconds").value()["count"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -62,6 +62,37 @@ class TestParser(unittest.TestCase):
         
         with self.assertRaises(SystemExit):
             parser.parse_args(['--coords', 'not_a_number', '37.6173'])
+    
+    def test_parser_batch(self):
+        """Тест пакетного режима с числом потоков"""
+        parser = build_parser()
+        args = parser.parse_args(['--batch', 'cities.txt', '--workers', '8'])
+        
+        self.assertEqual(args.batch, 'cities.txt')
+        self.assertEqual(args.workers, 8)
+        self.assertIsNone(args.city)
+    
+    def test_parser_batch_stdin_default_workers(self):
+        """Тест чтения списка из stdin и числа потоков по умолчанию"""
+        parser = build_parser()
+        args = parser.parse_args(['--batch', '-'])
+        
+        self.assertEqual(args.batch, '-')
+        self.assertEqual(args.workers, 4)
+    
+    def test_parser_batch_exclusive_with_city(self):
+        """Тест что --batch нельзя совмещать с --city"""
+        parser = build_parser()
+        
+        with self.assertRaises(SystemExit):
+            parser.parse_args(['--batch', '-', '--city', 'Moscow'])
+    
+    def test_parser_workers_positive(self):
+        """Тест что число потоков должно быть положительным"""
+        parser = build_parser()
+        
+        with self.assertRaises(SystemExit):
+            parser.parse_args(['--batch', '-', '--workers', '0'])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,112 @@
+import json
+import time
+import unittest
+from datetime import timedelta
+from unittest.mock import patch
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import requests
+
+from app import api, cache, commands, database, geocoding
+from app.client import configure_client
+from app.replay import ReplayStore, request_key
+from tests.test_database import DatabaseTestCase
+
+WEATHER = {"latitude": 55.75, "longitude": 37.62,
+           "current_weather": {"temperature": -5.0, "windspeed": 3.6, "winddirection": 180}}
+GEOCODE = {"results": [{"name": "Москва", "latitude": 55.75, "longitude": 37.62, "country": "Россия"}]}
+
+
+def fake_send(adapter, request, **kwargs):
+    """Ответ «сети»: геокодер или прогноз в зависимости от адреса"""
+    response = requests.Response()
+    response.status_code = 200
+    response.headers["Content-Type"] = "application/json"
+    payload = GEOCODE if "/search" in request.url else WEATHER
+    response._content = json.dumps(payload).encode("utf-8")
+    response.url = request.url
+    response.request = request
+    response.elapsed = timedelta(seconds=0.05)
+    return response
+
+
+class TestReplay(DatabaseTestCase):
+    """Тесты записи и воспроизведения ответов API"""
+
+    def setUp(self):
+        super().setUp()
+        self.store_path = str(self.db_path.with_name("responses.db"))
+        cache.clear_cache()
+        geocoding.clear_memo()
+
+    def tearDown(self):
+        configure_client()
+        cache.clear_cache(persistent=False)
+        geocoding.clear_memo()
+        super().tearDown()
+
+    def record(self):
+        """Записать ответы для погоды в Москве и забыть их в кэшах"""
+        configure_client(record=self.store_path)
+        with patch("requests.adapters.HTTPAdapter.send", autospec=True, side_effect=fake_send):
+            self.assertEqual(commands.weather_by_city("Moscow")["source"], "api")
+        cache.clear_cache()
+        geocoding.clear_memo()
+        conn = database._conn()
+        with conn:
+            conn.execute("DELETE FROM geocode")
+
+    def test_request_key_sorted(self):
+        """Тест что ключ не зависит от порядка параметров"""
+        self.assertEqual(request_key("get", "https://x.org/v1/forecast?b=2&a=1"),
+                         request_key("GET", "https://x.org/v1/forecast?a=1&b=2"))
+
+    def test_record_compressed(self):
+        """Тест что записываются все ответы в сжатом виде"""
+        self.record()
+        configure_client()
+
+        store = ReplayStore(self.store_path)
+        try:
+            self.assertEqual(len(store), 2)
+            key = [k for k in store.keys() if "/forecast" in k][0]
+            recorded = store.get(key)
+            self.assertEqual(json.loads(recorded["body"]), WEATHER)
+            self.assertEqual(recorded["latency"], 0.05)
+        finally:
+            store.close()
+
+    def test_replay_full_path_offline(self):
+        """Тест прогона команд, кэша и базы на записанных ответах"""
+        self.record()
+        configure_client(replay=self.store_path)
+
+        with patch("requests.adapters.HTTPAdapter.send", side_effect=AssertionError("сеть")):
+            result = commands.weather_by_city("Moscow")
+
+        self.assertEqual(result["source"], "api")
+        self.assertEqual(result["result"]["data"]["current_weather"]["temperature"], -5.0)
+        self.assertEqual(database.count_history(), 2)
+
+    def test_replay_missing_is_network_error(self):
+        """Тест что незаписанный запрос ведёт себя как недоступная сеть"""
+        self.record()
+        configure_client(replay=self.store_path)
+        self.assertIn("error", api.get_weather_by_coordinates(1.0, 2.0))
+        with self.assertRaises(requests.ConnectionError):
+            api.search_city("Kazan")
+
+    def test_replay_latency(self):
+        """Тест воспроизведения с записанной задержкой"""
+        self.record()
+        configure_client(replay=self.store_path, replay_latency=1.0)
+        start = time.perf_counter()
+        api.get_weather_by_coordinates(55.75, 37.62)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
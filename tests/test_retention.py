@@ -0,0 +1,149 @@
+import unittest
+from datetime import datetime, timezone
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import database, retention
+from tests.test_database import DatabaseTestCase
+
+NOW = datetime(2025, 3, 15, 12, 0, tzinfo=timezone.utc)
+
+
+class RetentionTestCase(DatabaseTestCase):
+
+    def add(self, requested_at, city="Moscow", temperature=None, raw_data=None):
+        record_id = database.save_to_history(city=city, temperature=temperature, raw_data=raw_data)
+        conn = database._conn()
+        with conn:
+            conn.execute("UPDATE history SET requested_at = ? WHERE id = ?", (requested_at, record_id))
+        return record_id
+
+    def count(self, table):
+        return database._conn().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+class TestRetention(RetentionTestCase):
+    """Тесты удаления и свёртки старой истории"""
+
+    def setUp(self):
+        super().setUp()
+        self.add("2025-01-10 08:30:00", temperature=-10.0)
+        self.add("2025-01-10 20:00:00", temperature=-4.0)
+        self.add("2025-01-10 21:00:00", city="Kazan", temperature=-8.0)
+        self.add("2025-02-20 10:00:00", temperature=1.0)
+        self.add("2025-03-14 10:00:00", temperature=5.0)
+
+    def test_old_rows_rolled_up(self):
+        """Тест что старые записи удаляются и сворачиваются по дням"""
+        report = retention.apply_retention(retention.RetentionPolicy(raw_days=7, batch_size=2), now=NOW)
+
+        self.assertEqual(report["history"], 4)
+        self.assertEqual(self.count("history"), 1)
+        rollup = retention.get_rollup("Moscow")
+        self.assertEqual([r["period"] for r in rollup], ["2025-01-10", "2025-02-20"])
+        self.assertEqual(rollup[0]["requests"], 2)
+        self.assertEqual(rollup[0]["avg_temperature"], -7.0)
+        self.assertEqual(rollup[0]["min_temperature"], -10.0)
+        self.assertEqual(retention.get_rollup("Kazan")[0]["max_temperature"], -8.0)
+        self.assertEqual(database.get_history_stats()["total_requests"], 1)
+
+    def test_hourly_rollup_and_expiry(self):
+        """Тест свёртки по часам и удаления старых агрегатов"""
+        retention.apply_retention(retention.RetentionPolicy(raw_days=7, rollup="hour"), now=NOW)
+        self.assertEqual(len(retention.get_rollup("Moscow", bucket="hour")), 3)
+
+        retention.apply_retention(retention.RetentionPolicy(raw_days=7, rollup="hour", rollup_days=30),
+                                  now=NOW)
+        self.assertEqual([r["period"] for r in retention.get_rollup(bucket="hour")],
+                         ["2025-02-20 10:00:00"])
+
+    def test_without_rollup(self):
+        """Тест удаления без агрегатов"""
+        retention.apply_retention(retention.RetentionPolicy(raw_days=7, rollup=None), now=NOW)
+        self.assertEqual(self.count("history"), 1)
+        self.assertEqual(self.count("history_rollup"), 0)
+
+    def test_invalid_rollup(self):
+        """Тест проверки периода свёртки"""
+        with self.assertRaises(ValueError):
+            retention.RetentionPolicy(rollup="week")
+
+
+class TestPartitions(RetentionTestCase):
+    """Тесты помесячных архивов"""
+
+    def test_archive_and_drop(self):
+        """Тест переноса старых записей в архив и удаления архива файлом"""
+        payload = {"current_weather": {"temperature": -10.0}}
+        self.add("2025-01-10 08:30:00", temperature=-10.0, raw_data=payload)
+        self.add("2025-02-20 10:00:00", city="Kazan", temperature=1.0)
+        self.add("2025-03-14 10:00:00", temperature=5.0, raw_data=payload)
+
+        policy = retention.RetentionPolicy(raw_days=7, archive=True)
+        retention.apply_retention(policy, now=NOW)
+
+        self.assertEqual(retention.list_partitions(), ["2025_01", "2025_02"])
+        archived = retention.get_archived_history("2025_02")
+        self.assertEqual([r["city"] for r in archived], ["Kazan"])
+        self.assertEqual(retention.get_archived_history("2025_01", city="Moscow")[0]["temperature"], -10.0)
+
+        dropped = retention.drop_partitions(keep_months=2, now=NOW)
+        self.assertEqual(dropped, ["2025_01"])
+        self.assertFalse(retention.partition_path("2025_01").exists())
+        self.assertEqual(retention.list_partitions(), ["2025_02"])
+
+
+class TestCleanup(RetentionTestCase):
+    """Тесты очистки сырых ответов, прогнозов и освобождения места"""
+
+    def test_orphan_payloads_removed(self):
+        """Тест удаления сырых ответов без ссылок из истории"""
+        self.add("2025-01-10 08:30:00", raw_data={"old": 1})
+        self.add("2025-03-14 10:00:00", raw_data={"new": 1})
+
+        report = retention.apply_retention(retention.RetentionPolicy(raw_days=7), now=NOW)
+
+        self.assertEqual(report["payloads"], 1)
+        self.assertEqual(database.get_recent_history(10)[0]["raw_data"], {"new": 1})
+
+    def test_old_forecast_removed(self):
+        """Тест удаления старого прогноза"""
+        database.save_forecast(55.75, 37.62,
+                               [("2024-11-01 00:00:00", 1.0, 80, 1000.0, 3),
+                                ("2025-03-14 00:00:00", 2.0, 80, 1000.0, 3)],
+                               [("2024-11-01", 3, 2.0, 0.0, 0.0)])
+
+        report = retention.apply_retention(retention.RetentionPolicy(forecast_days=90), now=NOW)
+
+        self.assertEqual(report["forecast"], 2)
+        self.assertEqual(len(database.get_hourly_series(55.75, 37.62)), 1)
+
+    def test_incremental_vacuum(self):
+        """Тест что освободившиеся страницы возвращаются системе"""
+        for i in range(200):
+            database.save_to_history(city=f"city-{i}", raw_data={"i": i, "pad": "x" * 2000})
+        conn = database._conn()
+        with conn:
+            conn.execute("DELETE FROM history")
+            conn.execute("DELETE FROM raw_payloads")
+
+        self.assertEqual(conn.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+        self.assertEqual(retention.incremental_vacuum(pages=2), 2)
+        self.assertGreater(retention.incremental_vacuum(), 0)
+        self.assertEqual(conn.execute("PRAGMA freelist_count").fetchone()[0], 0)
+
+    def test_clear_history_reclaims_space(self):
+        """Тест что очистка истории освобождает место"""
+        for i in range(200):
+            database.save_to_history(city=f"city-{i}", raw_data={"i": i, "pad": "x" * 2000})
+        database.clear_history()
+
+        conn = database._conn()
+        self.assertEqual(conn.execute("PRAGMA freelist_count").fetchone()[0], 0)
+        self.assertEqual(self.count("raw_payloads"), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import http.client
+import json
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import cache, geocoding, server as server_module
+from app.server import WeatherServer
+from tests.test_database import DatabaseTestCase
+
+WEATHER = {"current_weather": {"temperature": 15.0, "windspeed": 5.0, "winddirection": 180}}
+
+
+class TestServer(DatabaseTestCase):
+    """Тесты локального HTTP-сервера"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear_cache()
+        geocoding.clear_memo()
+        self.server = WeatherServer(("127.0.0.1", 0)).start()
+        host, port = self.server.server_address[:2]
+        self.conn = http.client.HTTPConnection(host, port, timeout=5)
+
+    def tearDown(self):
+        self.conn.close()
+        self.server.stop()
+        cache.clear_cache(persistent=False)
+        geocoding.clear_memo()
+        super().tearDown()
+
+    def get(self, path):
+        self.conn.request("GET", path)
+        resp = self.conn.getresponse()
+        body = resp.read()
+        return resp.status, body
+
+    @patch('app.api.get_weather_by_coordinates')
+    @patch('app.api.search_city')
+    def test_weather_by_city_keep_alive(self, mock_geo, mock_get):
+        """Тест погоды по городу: второй запрос по тому же соединению — из кэша"""
+        mock_geo.return_value = {"name": "Москва", "latitude": 55.75, "longitude": 37.62}
+        mock_get.return_value = WEATHER
+
+        status, body = self.get("/weather?city=Moscow")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["source"], "api")
+
+        sock = self.conn.sock
+        status, body = self.get("/weather?city=Moscow")
+        self.assertIs(self.conn.sock, sock)
+        data = json.loads(body)
+        self.assertEqual(data["source"], "cache")
+        self.assertEqual(data["result"]["meta"]["name"], "Москва")
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch('app.api.get_weather_by_coordinates')
+    def test_cache_hit_bytes_reused(self, mock_get):
+        """Тест что ответ из кэша сериализуется один раз"""
+        mock_get.return_value = WEATHER
+        self.get("/weather?lat=55.75&lon=37.62")
+
+        with patch('app.server._dumps', wraps=server_module._dumps) as dumps:
+            _, first = self.get("/weather?lat=55.75&lon=37.62")
+            _, second = self.get("/weather?lat=55.75&lon=37.62")
+        self.assertEqual(first, second)
+        self.assertEqual(dumps.call_count, 1)
+
+    def test_history_and_stats(self):
+        """Тест эндпоинтов истории и статистики"""
+        from app import database
+        database.save_to_history(city="Moscow", temperature=10.0)
+        database.save_to_history(city="Kazan", temperature=20.0)
+
+        status, body = self.get("/history?limit=1")
+        self.assertEqual(status, 200)
+        self.assertEqual([r["city"] for r in json.loads(body)["items"]], ["Kazan"])
+
+        status, body = self.get("/stats")
+        self.assertEqual(json.loads(body)["total_requests"], 2)
+
+    def test_stop_with_idle_keep_alive(self):
+        """Тест что остановка не ждёт простаивающих keep-alive соединений"""
+        import time
+        self.assertEqual(self.get("/health")[0], 200)
+
+        start = time.perf_counter()
+        self.server.stop()
+        self.assertLess(time.perf_counter() - start, 5)
+
+    def test_stop_waits_for_running_request(self):
+        """Тест что остановка дожидается начатого запроса"""
+        import threading
+        import time
+        from app import commands
+        done = []
+
+        def slow_weather(lat, lon):
+            time.sleep(0.3)
+            done.append(True)
+            return {"source": "api", "result": {"data": WEATHER}}
+
+        with patch.object(commands, "weather_by_coords", side_effect=slow_weather):
+            client = threading.Thread(target=self.get, args=("/weather?lat=1&lon=2",))
+            client.start()
+            time.sleep(0.1)
+            self.server.stop()
+            self.assertEqual(done, [True])
+            client.join()
+
+    def test_errors(self):
+        """Тест ответов на неверные запросы"""
+        self.assertEqual(self.get("/weather")[0], 400)
+        self.assertEqual(self.get("/weather?lat=abc&lon=1")[0], 400)
+        self.assertEqual(self.get("/nowhere")[0], 404)
+        self.assertEqual(self.get("/health"), (200, b'{"status": "ok"}'))
+
+
+if __name__ == '__main__':
+    unittest.main()